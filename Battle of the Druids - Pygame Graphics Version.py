@@ -12,16 +12,45 @@ https://github.com/sunstar2423/titanblade-games
 """
 
 import pygame
+import argparse
+import atexit
+import csv
+import json
+import multiprocessing
+import os
 import random
+import signal
+import struct
 import sys
 import math
+import time
+import tracemalloc
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple, Optional, Union
 
-# Initialize Pygame
+try:
+    import numpy as np  # Optional: only the vectorized balance tools need it
+except ImportError:
+    np = None
+
+# Command-line tools that never open a window or play audio
+HEADLESS_FLAGS = ("--simulate", "--duels", "--build-atlas", "--benchmark", "--export-save", "--verify-replay")
+if any(flag in sys.argv for flag in HEADLESS_FLAGS):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# Audio format; a small buffer keeps input-to-sound latency low (--audio-buffer changes it)
+AUDIO_FREQUENCY = 44100
+AUDIO_BUFFER = 512  # Samples per mixer callback, about 12 ms at 44.1 kHz
+
+# Initialize Pygame (the mixer picks up pre_init, and stays off if there is no audio device)
+pygame.mixer.pre_init(AUDIO_FREQUENCY, -16, 2, AUDIO_BUFFER)
 pygame.init()
-pygame.mixer.init()
 
 # ==================== ENEMY IMAGE REFERENCE ====================
 # To add custom enemy images, create 120x120 PNG files with these exact names:
@@ -41,7 +70,8 @@ pygame.mixer.init()
 # ==================== CONSTANTS ====================
 SCREEN_WIDTH = 1400
 SCREEN_HEIGHT = 900
-FPS = 60
+FPS = 60            # Render rate cap (--fps), gameplay speed does not depend on it
+SIMULATION_HZ = 60  # Fixed gameplay steps per second
 
 # Colors
 BLACK = (0, 0, 0)
@@ -88,9 +118,105 @@ class Location:
     unlock_requirements: Optional[List[str]] = None
     background_color: Tuple[int, int, int] = (40, 40, 40)
     special_effect: Optional[str] = None
+    wave_size: Tuple[int, int] = (1, 1)  # Enemies per battle (min, max), more than one makes a wave battle
 
 # ==================== GAME SETUP ====================
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+class GameDisplay:
+    """The window, and the fixed SCREEN_WIDTH x SCREEN_HEIGHT canvas every screen draws on
+    
+    All layout is in these logical coordinates. The window uses pygame's SCALED
+    mode, so SDL's renderer stretches the canvas to whatever size the window is
+    (on the GPU where available) and maps mouse positions back. Drawing therefore
+    costs the same on a 720p kiosk as on a 4K display. With a render scale below 1
+    the canvas is an offscreen surface and only what changed is shrunk (nearest
+    neighbour) into a smaller display texture. Drawing still happens at full
+    size; what shrinks is the texture SDL uploads and scales every frame.
+    """
+    
+    def __init__(self):
+        self.window = None   # The display surface
+        self.canvas = None   # What the game draws on (the window itself at render scale 1)
+        self.render_scale = 1.0
+    
+    def open(self, window_size: Optional[Tuple[int, int]] = None, fullscreen: bool = False,
+             render_scale: float = 1.0) -> pygame.Surface:
+        """(Re)create the window, returns the canvas to draw on"""
+        self.render_scale = min(1.0, max(0.25, render_scale))
+        internal = (round(SCREEN_WIDTH * self.render_scale), round(SCREEN_HEIGHT * self.render_scale))
+        if os.environ.get("SDL_VIDEODRIVER") == "dummy":
+            self.window = pygame.display.set_mode(internal)  # Headless tools have no renderer to scale with
+        else:
+            flags = pygame.SCALED | (pygame.FULLSCREEN if fullscreen else pygame.RESIZABLE)
+            try:
+                self.window = pygame.display.set_mode(internal, flags)
+            except pygame.error as e:
+                print(f"⚠️  Scaled display unavailable ({e}), using a fixed-size window")
+                self.window = pygame.display.set_mode(internal)
+            if not fullscreen:
+                self._resize_window(window_size or self._fit_desktop())
+        
+        if self.render_scale < 1.0:
+            self.canvas = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        else:
+            self.canvas = self.window
+        return self.canvas
+    
+    @staticmethod
+    def _fit_desktop() -> Optional[Tuple[int, int]]:
+        """Largest window with the game's aspect ratio that fits the desktop, if it is smaller than the game"""
+        desktop_w, desktop_h = pygame.display.get_desktop_sizes()[0]
+        desktop_h -= 80  # Room for title bar and taskbar
+        if desktop_w >= SCREEN_WIDTH and desktop_h >= SCREEN_HEIGHT:
+            return None
+        scale = min(desktop_w / SCREEN_WIDTH, desktop_h / SCREEN_HEIGHT)
+        return int(SCREEN_WIDTH * scale), int(SCREEN_HEIGHT * scale)
+    
+    @staticmethod
+    def _resize_window(size: Optional[Tuple[int, int]]):
+        if not size:
+            return
+        try:
+            from pygame._sdl2.video import Window
+            Window.from_display_module().size = size
+        except (ImportError, AttributeError, pygame.error) as e:
+            print(f"⚠️  Could not resize the window to {size[0]}x{size[1]} ({e})")
+    
+    def to_logical(self, pos: Tuple[int, int]) -> Tuple[int, int]:
+        """Map a mouse position from the display into canvas coordinates"""
+        if self.render_scale == 1.0:
+            return pos
+        return int(pos[0] / self.render_scale), int(pos[1] / self.render_scale)
+    
+    def present(self, rects: Optional[List[pygame.Rect]] = None):
+        """Show the frame, only the given canvas regions when rects is passed"""
+        if self.canvas is not self.window:
+            if rects is None:
+                pygame.transform.scale(self.canvas, self.window.get_size(), self.window)
+                pygame.display.flip()
+            else:
+                pygame.display.update([self._shrink(rect) for rect in rects])
+        elif rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+    
+    def _shrink(self, rect: pygame.Rect) -> pygame.Rect:
+        """Copy one canvas region into the smaller window, returns the window region it covers"""
+        scale = self.render_scale
+        window_rect = self.window.get_rect()
+        left, top = int(rect.left * scale), int(rect.top * scale)
+        target = pygame.Rect(left, top, math.ceil(rect.right * scale) - left,
+                             math.ceil(rect.bottom * scale) - top).clip(window_rect)
+        # Read back the canvas area that maps onto the whole target, so neighbouring regions line up
+        source = pygame.Rect(int(target.left / scale), int(target.top / scale),
+                             math.ceil(target.width / scale), math.ceil(target.height / scale)).clip(self.canvas.get_rect())
+        if target.width and target.height and source.width and source.height:
+            pygame.transform.scale(self.canvas.subsurface(source), target.size, self.window.subsurface(target))
+        return target
+
+# Create global display; screen is the logical canvas every drawing function uses
+game_display = GameDisplay()
+screen = game_display.open()
 pygame.display.set_caption("Battle of the Druids")
 clock = pygame.time.Clock()
 
@@ -100,262 +226,1181 @@ button_font = pygame.font.Font(None, 40)
 text_font = pygame.font.Font(None, 32)
 small_font = pygame.font.Font(None, 28)
 
+# ==================== TEXT CACHE ====================
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, antialias, color)"""
+    
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def render(self, font: pygame.font.Font, text: str, antialias: bool, color: Tuple[int, int, int]) -> pygame.Surface:
+        """Drop-in replacement for font.render that reuses identical surfaces"""
+        if profiler.frame_start:
+            start = time.perf_counter()
+            surface = self._lookup(font, text, antialias, color)
+            profiler.add_text_time(time.perf_counter() - start)
+            return surface
+        return self._lookup(font, text, antialias, color)
+    
+    def _lookup(self, font: pygame.font.Font, text: str, antialias: bool, color: Tuple[int, int, int]) -> pygame.Surface:
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def hit_rate(self) -> float:
+        """Fraction of render calls served from the cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def clear(self):
+        """Drop all cached surfaces and reset counters"""
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Create global text cache
+text_cache = TextCache()
+
+# ==================== DIRTY RECT RENDERING ====================
+class DirtyRectRenderer:
+    """Opt-in renderer that only pushes the regions that changed to the display
+    
+    Screens that support it draw their static layer once, capture it, and on
+    later frames only redraw dynamic elements. Elements register the areas they
+    touch with mark(); those areas are restored from the captured layer on the
+    next frame and pushed with game_display.present(rects).
+    """
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.snapshot = None
+        self.rects = []
+        self.previous_rects = []
+        self.full_update = True
+    
+    def begin_frame(self) -> bool:
+        """Start a frame, returns True if the static layer must be (re)drawn"""
+        if not self.enabled or self.snapshot is None:
+            return True
+        
+        # Erase last frame's dynamic elements
+        for rect in self.previous_rects:
+            screen.blit(self.snapshot, rect, rect)
+        return False
+    
+    def capture(self):
+        """Remember the freshly drawn static layer as the restore source"""
+        if self.enabled:
+            self.snapshot = screen.copy()
+            self.full_update = True
+            self.previous_rects = []
+            self.rects = []
+    
+    def invalidate(self):
+        """Force the static layer to be redrawn (screen change or new content)"""
+        self.snapshot = None
+        self.full_update = True
+    
+    def mark(self, rect):
+        """Register a screen region touched this frame"""
+        if self.enabled:
+            clipped = pygame.Rect(rect).clip(screen.get_rect())
+            if clipped.width and clipped.height:
+                self.rects.append(clipped)
+    
+    def present(self):
+        """Push the frame - the dirty regions only, or a full flip when needed"""
+        if not self.enabled or self.full_update:
+            game_display.present()
+        elif self.rects or self.previous_rects:
+            game_display.present(self.previous_rects + self.rects)
+        self.previous_rects = self.rects
+        self.rects = []
+        self.full_update = False
+
+# Create global dirty rect renderer (enabled with --dirty-rects)
+dirty_rects = DirtyRectRenderer()
+
+# ==================== FRAME PROFILER ====================
+PROFILE_PHASES = ("events", "update", "background", "characters", "effects", "text", "ui", "hud", "flip", "idle")
+
+class FrameProfiler:
+    """Per-phase frame timings for the game loops, shown as a HUD and recorded as a trace
+    
+    A loop calls begin_frame(name), then lap(phase) after each block of work, and
+    end_frame() after clock.tick. A lap is charged the time since the previous one.
+    Text rendering is timed inside TextCache and subtracted from the phase that
+    asked for it. Everything is skipped while the HUD and recording are both off.
+    """
+    
+    HUD_KEY = pygame.K_F3
+    TRACE_KEY = pygame.K_F4
+    
+    def __init__(self, history: int = 240):
+        self.show_hud = False
+        self.recording = False
+        self.trace_path = "frame_trace.csv"
+        self.trace = []
+        self.history = deque(maxlen=history)  # (screen name, frame ms, phase ms)
+        self.screen_name = ""
+        self.frame_start = 0.0
+        self.last_lap = 0.0
+        self.nested = 0.0
+        self.phases = {}
+        self.hud_surface = None
+        self.hud_updated = 0.0
+    
+    @property
+    def active(self) -> bool:
+        return self.show_hud or self.recording
+    
+    def handle_event(self, event):
+        """F3 toggles the HUD, F4 starts/stops trace recording"""
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == self.HUD_KEY:
+            self.show_hud = not self.show_hud
+            self.hud_surface = None
+            dirty_rects.invalidate()
+        elif event.key == self.TRACE_KEY:
+            if self.recording:
+                self.stop_recording()
+            else:
+                self.start_recording()
+    
+    def begin_frame(self, screen_name: str):
+        if not self.active:
+            return
+        self.screen_name = screen_name
+        self.frame_start = self.last_lap = time.perf_counter()
+        self.nested = 0.0
+        self.phases = {}
+    
+    def lap(self, phase: str):
+        """Charge the time since the previous lap to phase"""
+        if not self.frame_start:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last_lap - self.nested) * 1000
+        self.last_lap = now
+        self.nested = 0.0
+    
+    def add_text_time(self, seconds: float):
+        self.nested += seconds
+        self.phases["text"] = self.phases.get("text", 0.0) + seconds * 1000
+    
+    def end_frame(self):
+        if not self.frame_start:
+            return
+        self.lap("idle")
+        frame_ms = (self.last_lap - self.frame_start) * 1000
+        self.history.append((self.screen_name, frame_ms, self.phases))
+        if self.recording:
+            self.trace.append((self.screen_name, frame_ms, self.phases))
+        self.frame_start = 0.0
+    
+    def summary(self) -> Dict[str, float]:
+        """FPS, frame time percentiles and mean per-phase ms over the recent history"""
+        if not self.history:
+            return {}
+        frame_times = sorted(frame_ms for _, frame_ms, _ in self.history)
+        count = len(frame_times)
+        mean = sum(frame_times) / count
+        result = {
+            "fps": 1000 / mean if mean else 0.0,
+            "p50": frame_times[count // 2],
+            "p95": frame_times[min(count - 1, int(count * 0.95))],
+            "p99": frame_times[min(count - 1, int(count * 0.99))],
+        }
+        for phase in PROFILE_PHASES:
+            result[phase] = sum(phases.get(phase, 0.0) for _, _, phases in self.history) / count
+        return result
+    
+    def draw_hud(self, surface: pygame.Surface):
+        """Draw the stats panel in the top-right corner (redrawn a few times a second)"""
+        if not self.show_hud:
+            return
+        self.lap("ui")
+        now = time.perf_counter()
+        if self.hud_surface is None or now - self.hud_updated > 0.25:
+            self.hud_updated = now
+            stats = self.summary()
+            lines = [f"{self.screen_name}  {stats.get('fps', 0):.0f} FPS"]
+            if stats:
+                lines.append(f"p50 {stats['p50']:.1f}  p95 {stats['p95']:.1f}  p99 {stats['p99']:.1f} ms")
+                lines += [f"{phase:<11}{stats[phase]:6.2f} ms" for phase in PROFILE_PHASES]
+            lines.append(quality.label())
+            if self.recording:
+                lines.append(f"REC {len(self.trace)} frames")
+            
+            # Rendered straight from the font so the HUD doesn't churn the text cache
+            rendered = [small_font.render(line, True, GREEN) for line in lines]
+            self.hud_surface = pygame.Surface((max(r.get_width() for r in rendered) + 20, len(rendered) * 22 + 12))
+            self.hud_surface.set_alpha(210)
+            for i, line_surface in enumerate(rendered):
+                self.hud_surface.blit(line_surface, (10, 6 + i * 22))
+        
+        dirty_rects.mark(surface.blit(self.hud_surface, (SCREEN_WIDTH - self.hud_surface.get_width() - 10, 10)))
+        self.lap("hud")
+    
+    def start_recording(self, path: Optional[str] = None):
+        if path:
+            self.trace_path = path
+        self.trace = []
+        self.recording = True
+        print(f"✅ Recording frame trace (F4 or quit to write {self.trace_path})")
+    
+    def stop_recording(self):
+        if not self.recording:
+            return
+        self.recording = False
+        self.frame_start = 0.0
+        self.save_trace()
+    
+    def save_trace(self, path: Optional[str] = None):
+        """Write the recorded frames as CSV, or JSON when the path ends in .json"""
+        path = path or self.trace_path
+        if path.endswith(".json"):
+            frames = [{"screen": name, "frame_ms": round(frame_ms, 3),
+                       **{phase: round(phases.get(phase, 0.0), 3) for phase in PROFILE_PHASES}}
+                      for name, frame_ms, phases in self.trace]
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"phases": list(PROFILE_PHASES), "frames": frames}, f, indent=1)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "screen", "frame_ms"] + list(PROFILE_PHASES))
+                for i, (name, frame_ms, phases) in enumerate(self.trace):
+                    writer.writerow([i, name, f"{frame_ms:.3f}"] +
+                                    [f"{phases.get(phase, 0.0):.3f}" for phase in PROFILE_PHASES])
+        print(f"✅ Wrote {len(self.trace)} frames to {path}")
+
+# Create global frame profiler (F3 for the HUD, F4 or --profile-trace to record)
+profiler = FrameProfiler()
+
+# ==================== FIXED TIMESTEP ====================
+MAX_FRAME_MS = 250  # Longer frames (window drags, breakpoints) are clamped so catch-up cannot spiral
+
+class FixedTimestep:
+    """Turns measured frame times into whole gameplay steps of 1/SIMULATION_HZ seconds
+    
+    Animations and timers count steps, not frames, so they run at the same speed
+    whatever the render rate. advance(frame_ms) returns how many steps to run
+    for the time the last frame took; alpha is the fraction of a step left over,
+    used to draw moving things between their previous and current positions.
+    """
+    
+    def __init__(self, hz: int = SIMULATION_HZ):
+        self.step_ms = 1000 / hz
+        self.accumulator = 0.0
+        self.alpha = 0.0
+    
+    def advance(self, frame_ms: float) -> int:
+        self.accumulator += min(frame_ms, MAX_FRAME_MS)
+        steps = int(self.accumulator // self.step_ms)
+        self.accumulator -= steps * self.step_ms
+        self.alpha = self.accumulator / self.step_ms
+        return steps
+
+# ==================== IDLE SCREENS ====================
+IDLE_WAKE_MS = 250  # How often a waiting screen wakes up to refresh the profiler HUD
+
+def wait_for_events(timeout_ms: int = IDLE_WAKE_MS) -> List[pygame.event.Event]:
+    """Sleep until there is input, then return every pending event
+    
+    Screens with nothing animated call this instead of clock.tick(FPS), so they
+    only redraw when something happens and an idle game uses next to no CPU.
+    The tick still caps the redraw rate while input is streaming in.
+    """
+    clock.tick(FPS)
+    quality.was_idle = True  # The next clock.tick's raw time covers this wait
+    while True:
+        event = pygame.event.wait(timeout_ms)
+        if event.type != pygame.NOEVENT:
+            events = [event] + pygame.event.get()
+            if any(e.type == pygame.WINDOWEXPOSED for e in events):
+                dirty_rects.invalidate()  # The window contents must be pushed again in full
+            return events
+        if profiler.show_hud:
+            return []
+
 # ==================== COMBAT EFFECTS CLASSES ====================
-class DamageNumber:
-    """Floating damage numbers that appear during combat"""
-    def __init__(self, x, y, damage, is_special=False, is_heal=False):
-        self.x = x
-        self.y = y
-        self.damage = damage
-        self.timer = 60  # 1 second at 60 FPS
-        self.is_special = is_special
-        self.is_heal = is_heal
-        self.float_speed = 2
+# Particle burst per attack effect: (count, position spread, max speed, color cycle)
+EFFECT_PARTICLES = {
+    "slash": (8, 20, 3, (YELLOW,)),
+    "magic": (12, 30, 4, (PURPLE, TURQUOISE)),
+    "special": (15, 40, 5, (GOLD, RED, RED)),
+}
+EFFECT_LIFETIME = 30  # Simulation steps
+PARTICLE_GRAVITY = 0.2
+PARTICLE_RADIUS = 3
+
+class ParticlePool:
+    """Fixed-capacity particle storage in parallel columns, with dead slots recycled
+    
+    Columns are NumPy arrays when NumPy is installed, so integration is a handful
+    of vectorized operations regardless of particle count; otherwise they are
+    array('f') columns updated in a loop. Each particle is drawn by blitting a
+    pre-rendered dot, in a single screen.blits() call.
+    """
+    
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity or (8192 if np is not None else 1024)
+        self.density = 1.0  # Particle count multiplier for every burst
+        if np is not None:
+            self.x = np.zeros(self.capacity, np.float32)
+            self.y = np.zeros(self.capacity, np.float32)
+            self.prev_x = np.zeros(self.capacity, np.float32)  # Position before the last step
+            self.prev_y = np.zeros(self.capacity, np.float32)
+            self.vx = np.zeros(self.capacity, np.float32)
+            self.vy = np.zeros(self.capacity, np.float32)
+            self.life = np.zeros(self.capacity, np.int32)
+            self.color = np.zeros(self.capacity, np.int32)
+            self.rng = np.random.default_rng()
+        else:
+            self.x = array("f", bytes(4 * self.capacity))
+            self.y = array("f", bytes(4 * self.capacity))
+            self.prev_x = array("f", bytes(4 * self.capacity))
+            self.prev_y = array("f", bytes(4 * self.capacity))
+            self.vx = array("f", bytes(4 * self.capacity))
+            self.vy = array("f", bytes(4 * self.capacity))
+            self.life = array("i", bytes(4 * self.capacity))
+            self.color = array("i", bytes(4 * self.capacity))
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.palette = {}  # Color -> palette index
+        self.dots = []     # Pre-rendered dot surface per palette index
+    
+    @property
+    def active(self) -> int:
+        return self.capacity - len(self.free)
+    
+    def _palette_index(self, color: Tuple[int, int, int]) -> int:
+        if color not in self.palette:
+            size = PARTICLE_RADIUS * 2 + 1
+            dot = pygame.Surface((size, size))
+            dot.set_colorkey(BLACK)
+            pygame.draw.circle(dot, color, (PARTICLE_RADIUS, PARTICLE_RADIUS), PARTICLE_RADIUS)
+            self.palette[color] = len(self.dots)
+            self.dots.append(dot.convert())
+        return self.palette[color]
+    
+    def clear(self):
+        """Kill every particle"""
+        if np is not None:
+            self.life.fill(0)
+        else:
+            self.life = array("i", bytes(4 * self.capacity))
+        self.free = list(range(self.capacity - 1, -1, -1))
+    
+    def spawn(self, x: float, y: float, effect_type: str):
+        """Emit the particle burst for an attack effect (dropped if the pool is full)"""
+        count, spread, speed, colors = EFFECT_PARTICLES[effect_type]
+        count = min(int(count * self.density), len(self.free))
+        if count <= 0:
+            return
+        slots = self.free[-count:]
+        del self.free[-count:]
+        color_ids = [self._palette_index(color) for color in colors]
+        
+        if np is not None:
+            idx = np.array(slots)
+            self.x[idx] = self.prev_x[idx] = x + self.rng.integers(-spread, spread + 1, count)
+            self.y[idx] = self.prev_y[idx] = y + self.rng.integers(-spread, spread + 1, count)
+            self.vx[idx] = self.rng.integers(-speed, speed + 1, count)
+            self.vy[idx] = self.rng.integers(-speed, speed + 1, count)
+            self.life[idx] = EFFECT_LIFETIME
+            self.color[idx] = np.array(color_ids)[np.arange(count) % len(color_ids)]
+        else:
+            for i, slot in enumerate(slots):
+                self.x[slot] = self.prev_x[slot] = x + random.randint(-spread, spread)
+                self.y[slot] = self.prev_y[slot] = y + random.randint(-spread, spread)
+                self.vx[slot] = random.randint(-speed, speed)
+                self.vy[slot] = random.randint(-speed, speed)
+                self.life[slot] = EFFECT_LIFETIME
+                self.color[slot] = color_ids[i % len(color_ids)]
     
     def update(self):
-        self.y -= self.float_speed
-        self.timer -= 1
-        return self.timer > 0
+        """Advance every live particle one step and recycle the ones that expire"""
+        if not self.active:
+            return
+        if np is not None:
+            live = self.life > 0
+            np.copyto(self.prev_x, self.x)
+            np.copyto(self.prev_y, self.y)
+            self.x += self.vx
+            self.y += self.vy
+            self.vy += PARTICLE_GRAVITY
+            self.free.extend(np.flatnonzero(self.life == 1).tolist())
+            np.subtract(self.life, 1, out=self.life, where=live)
+        else:
+            for i in range(self.capacity):
+                if self.life[i] > 0:
+                    self.prev_x[i] = self.x[i]
+                    self.prev_y[i] = self.y[i]
+                    self.x[i] += self.vx[i]
+                    self.y[i] += self.vy[i]
+                    self.vy[i] += PARTICLE_GRAVITY
+                    self.life[i] -= 1
+                    if self.life[i] == 0:
+                        self.free.append(i)
     
-    def draw(self, screen):
-        if self.is_heal:
-            color = GREEN
-            font = text_font
-            prefix = "+"
-        elif self.is_special:
-            color = GOLD if (self.timer // 5) % 2 == 0 else YELLOW  # Flashing gold
-            font = button_font
-            prefix = ""
+    def draw(self, screen, alpha: float = 1.0):
+        """Blit every live, on-screen particle in one call, alpha of the way through the current step"""
+        if not self.active:
+            return
+        if np is not None:
+            visible = np.flatnonzero((self.life > 0) & (self.x >= 0) & (self.x <= SCREEN_WIDTH) &
+                                     (self.y >= 0) & (self.y <= SCREEN_HEIGHT))
+            prev_x, prev_y = self.prev_x[visible], self.prev_y[visible]
+            xs = (prev_x + (self.x[visible] - prev_x) * alpha - PARTICLE_RADIUS).astype(np.int32).tolist()
+            ys = (prev_y + (self.y[visible] - prev_y) * alpha - PARTICLE_RADIUS).astype(np.int32).tolist()
+            colors = self.color[visible].tolist()
         else:
-            alpha = int(255 * (self.timer / 60))
-            color = (255, min(255, alpha), min(255, alpha))  # Fading white to red
-            font = text_font
-            prefix = ""
-        
-        damage_text = font.render(f"{prefix}{self.damage}", True, color)
-        damage_rect = damage_text.get_rect(center=(self.x, self.y))
-        screen.blit(damage_text, damage_rect)
-
-class AttackEffect:
-    """Particle effects for attacks"""
-    def __init__(self, x, y, effect_type):
-        self.x = x
-        self.y = y
-        self.effect_type = effect_type
-        self.timer = 30
-        self.particles = []
-        
-        # Create particles based on effect type
-        if effect_type == "slash":
-            for i in range(8):
-                self.particles.append({
-                    'x': x + random.randint(-20, 20),
-                    'y': y + random.randint(-20, 20),
-                    'vx': random.randint(-3, 3),
-                    'vy': random.randint(-3, 3),
-                    'color': YELLOW
-                })
-        elif effect_type == "magic":
-            for i in range(12):
-                self.particles.append({
-                    'x': x + random.randint(-30, 30),
-                    'y': y + random.randint(-30, 30),
-                    'vx': random.randint(-4, 4),
-                    'vy': random.randint(-4, 4),
-                    'color': PURPLE if i % 2 == 0 else TURQUOISE
-                })
-        elif effect_type == "special":
-            for i in range(15):
-                self.particles.append({
-                    'x': x + random.randint(-40, 40),
-                    'y': y + random.randint(-40, 40),
-                    'vx': random.randint(-5, 5),
-                    'vy': random.randint(-5, 5),
-                    'color': GOLD if i % 3 == 0 else RED
-                })
+            x, y, prev_x, prev_y = self.x, self.y, self.prev_x, self.prev_y
+            visible = [i for i in range(self.capacity) if self.life[i] > 0 and
+                       0 <= x[i] <= SCREEN_WIDTH and 0 <= y[i] <= SCREEN_HEIGHT]
+            xs = [int(prev_x[i] + (x[i] - prev_x[i]) * alpha) - PARTICLE_RADIUS for i in visible]
+            ys = [int(prev_y[i] + (y[i] - prev_y[i]) * alpha) - PARTICLE_RADIUS for i in visible]
+            colors = [self.color[i] for i in visible]
+        if not colors:
+            return
+        
+        dots = self.dots
+        screen.blits([(dots[c], (px, py)) for c, px, py in zip(colors, xs, ys)], False)
+        if dirty_rects.enabled:
+            left, top = min(xs), min(ys)
+            size = PARTICLE_RADIUS * 2 + 1
+            dirty_rects.mark((left, top, max(xs) - left + size, max(ys) - top + size))
+
+class DamageNumberPool:
+    """Floating damage numbers in fixed-capacity array columns, with dead slots recycled"""
+    
+    NORMAL, SPECIAL, HEAL = 0, 1, 2
+    
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.x = array("f", bytes(4 * capacity))
+        self.y = array("f", bytes(4 * capacity))
+        self.value = [0] * capacity  # Amounts can be floats, shown as-is
+        self.timer = array("i", bytes(4 * capacity))  # Steps left, 60 = 1 second
+        self.kind = array("b", bytes(capacity))
+        self.free = list(range(capacity - 1, -1, -1))
+        self.live = []  # Slots in spawn order, so newer numbers draw on top
+        self.float_speed = 2
+    
+    def clear(self):
+        self.free.extend(self.live)
+        self.live = []
+    
+    def spawn(self, x: float, y: float, damage: int, is_special: bool = False, is_heal: bool = False):
+        """Add a floating number (the oldest one is recycled if the pool is full)"""
+        slot = self.free.pop() if self.free else self.live.pop(0)
+        self.x[slot] = x
+        self.y[slot] = y
+        self.value[slot] = damage
+        self.timer[slot] = 60
+        self.kind[slot] = self.HEAL if is_heal else self.SPECIAL if is_special else self.NORMAL
+        self.live.append(slot)
     
     def update(self):
-        self.timer -= 1
-        for particle in self.particles:
-            particle['x'] += particle['vx']
-            particle['y'] += particle['vy']
-            particle['vy'] += 0.2  # Gravity
-        return self.timer > 0
+        expired = []
+        for slot in self.live:
+            self.y[slot] -= self.float_speed
+            self.timer[slot] -= 1
+            if self.timer[slot] <= 0:
+                expired.append(slot)
+        if expired:
+            self.live = [slot for slot in self.live if self.timer[slot] > 0]
+            self.free.extend(expired)
     
-    def draw(self, screen):
-        for particle in self.particles:
-            if 0 <= particle['x'] <= SCREEN_WIDTH and 0 <= particle['y'] <= SCREEN_HEIGHT:
-                pygame.draw.circle(screen, particle['color'], (int(particle['x']), int(particle['y'])), 3)
+    def draw(self, screen, alpha: float = 1.0):
+        # Numbers drift up every step, so draw them alpha of the way from their last position
+        lag = self.float_speed * (1 - alpha)
+        for slot in self.live:
+            timer = self.timer[slot]
+            kind = self.kind[slot]
+            if kind == self.HEAL:
+                color = GREEN
+                font = text_font
+                prefix = "+"
+            elif kind == self.SPECIAL:
+                color = GOLD if (timer // 5) % 2 == 0 else YELLOW  # Flashing gold
+                font = button_font
+                prefix = ""
+            else:
+                alpha = int(255 * (timer / 60))
+                color = (255, min(255, alpha), min(255, alpha))  # Fading white to red
+                font = text_font
+                prefix = ""
+            
+            damage_text = text_cache.render(font, f"{prefix}{self.value[slot]}", True, color)
+            damage_rect = damage_text.get_rect(center=(int(self.x[slot]), int(self.y[slot] + lag)))
+            screen.blit(damage_text, damage_rect)
+            dirty_rects.mark(damage_rect)
+
+# Create global effect pools (shared by every battle, cleared when one starts)
+particles = ParticlePool()
+damage_numbers = DamageNumberPool()
+
+# ==================== QUALITY SCALER ====================
+QUALITY_LEVELS = ("low", "medium", "high")
+# Per level: (particle density, background dots, screen shake, store glow, smooth sprite scaling)
+QUALITY_PRESETS = {
+    "high": (1.0, True, True, True, True),
+    "medium": (0.5, True, True, False, True),
+    "low": (0.25, False, False, False, False),
+}
+QUALITY_WINDOW = 90        # Frames averaged for each decision
+QUALITY_DOWN_RATIO = 0.9   # Step down when mean work time is above this fraction of the frame budget
+QUALITY_UP_RATIO = 0.5     # Step back up when it is below this fraction
+
+class QualityScaler:
+    """Lowers visual quality while frames run over budget and restores it when there is headroom
+    
+    Loops report each frame's work time (clock.get_rawtime(), which leaves out the
+    time clock.tick spent waiting). Every QUALITY_WINDOW frames the mean is compared
+    with the budget at the current FPS cap. A level that had to be abandoned right
+    after stepping up needs twice as long a spell of headroom before it is tried again.
+    Time spent idle in wait_for_events is not work, so the first frame after it is
+    dropped. An override (--quality) pins the level.
+    """
+    
+    def __init__(self):
+        self.level = len(QUALITY_LEVELS) - 1
+        self.override = None
+        self.samples = []
+        self.headroom_windows = 0
+        self.patience = 2  # Headroom windows needed before stepping up
+        self.last_step = 0
+        self.was_idle = False  # Next sample includes a wait_for_events sleep
+        self.apply()
+    
+    @property
+    def name(self) -> str:
+        return QUALITY_LEVELS[self.level]
+    
+    def label(self) -> str:
+        return f"Quality: {self.name.title()} ({'fixed' if self.override else 'auto'})"
+    
+    def set_override(self, level: Optional[str]):
+        """Pin quality to a level name, or pass None/"auto" to let it adapt"""
+        self.override = None if level in (None, "auto") else level
+        if self.override:
+            self.level = QUALITY_LEVELS.index(self.override)
+        self.samples = []
+        self.headroom_windows = 0
+        self.apply()
+    
+    def apply(self):
+        """Push the current level's settings to the systems that read them"""
+        (particles.density, self.background_dots, self.screen_shake,
+         self.store_glow, self.smooth_scaling) = QUALITY_PRESETS[self.name]
+        dirty_rects.invalidate()
+    
+    def end_frame(self, work_ms: float):
+        """Record a frame's work time and change level at the end of each window"""
+        if self.override:
+            return
+        if self.was_idle:
+            self.was_idle = False
+            return
+        self.samples.append(min(work_ms, MAX_FRAME_MS))
+        if len(self.samples) < QUALITY_WINDOW:
+            return
+        mean = sum(self.samples) / len(self.samples)
+        self.samples = []
+        budget = 1000 / FPS
+        
+        if mean > budget * QUALITY_DOWN_RATIO and self.level > 0:
+            if self.last_step > 0:
+                self.patience = min(self.patience * 2, 64)
+            self.step(-1)
+        elif mean < budget * QUALITY_UP_RATIO and self.level < len(QUALITY_LEVELS) - 1:
+            self.headroom_windows += 1
+            if self.headroom_windows >= self.patience:
+                self.step(1)
+        else:
+            self.headroom_windows = 0
+            self.last_step = 0
+    
+    def step(self, direction: int):
+        self.level += direction
+        self.last_step = direction
+        self.headroom_windows = 0
+        self.apply()
+
+# Create global quality scaler (adapts unless --quality pins a level)
+quality = QualityScaler()
+
+# ==================== AUDIO ====================
+AUDIO_CHANNELS = {"ui": 2, "combat": 4, "ambience": 2}  # Mixer channels reserved for each category
+SOUND_CATEGORIES = {
+    'attack': "combat",
+    'special': "combat",
+    'heal': "combat",
+    'victory': "ui",
+    'defeat': "ui",
+    'buy': "ui",
+    'click': "ui"
+}
+# Sound -> (max copies playing at once, cooldown in ms between plays)
+SOUND_LIMITS = {
+    'click': (1, 60),
+    'attack': (2, 80),
+    'special': (1, 150),
+    'heal': (1, 150)
+}
+DEFAULT_SOUND_LIMIT = (2, 50)
+SOUND_VOLUME = 0.7
+
+class AudioManager:
+    """Sound effects on reserved per-category mixer channels
+    
+    Each category owns a fixed block of channels, so a burst of combat
+    sounds can never cut off a UI click. A play over the sound's voice cap,
+    inside its cooldown or with no free channel is dropped and counted.
+    """
+    
+    def __init__(self):
+        self.sounds: Dict[str, pygame.mixer.Sound] = {}
+        self.missing: List[str] = []
+        self.channels: Dict[str, List[pygame.mixer.Channel]] = {}
+        self.last_played: Dict[str, int] = {}
+        self.buffer = AUDIO_BUFFER
+        self.plays = 0
+        self.dropped: Dict[str, int] = {}
+        self.play_time = 0.0      # Seconds spent starting sounds
+        self.max_play_time = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return pygame.mixer.get_init() is not None
+    
+    def open(self, buffer: int = AUDIO_BUFFER):
+        """Reopen the mixer with another buffer size (before load_sounds, it drops loaded sounds)"""
+        self.buffer = buffer
+        pygame.mixer.quit()
+        try:
+            pygame.mixer.init(AUDIO_FREQUENCY, -16, 2, buffer)
+        except pygame.error as e:
+            print(f"⚠️  Could not open the audio device: {e}")
+    
+    def latency_ms(self) -> float:
+        """Output delay added by the mixer buffer at the negotiated sample rate"""
+        mixer = pygame.mixer.get_init()
+        return self.buffer / mixer[0] * 1000 if mixer else 0.0
+    
+    def _reserve_channels(self):
+        total = sum(AUDIO_CHANNELS.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+        pygame.mixer.set_reserved(total)
+        first = 0
+        for category, count in AUDIO_CHANNELS.items():
+            self.channels[category] = [pygame.mixer.Channel(i) for i in range(first, first + count)]
+            first += count
+    
+    def load_sounds(self):
+        """Load each sound effect on its own, so a missing file only silences that sound"""
+        if not self.enabled:
+            print("⚠️  No audio device found, sound is off")
+            return
+        self._reserve_channels()
+        for key, filename in SOUND_FILES.items():
+            try:
+                sound = pygame.mixer.Sound(filename)
+            except (pygame.error, FileNotFoundError):
+                self.missing.append(filename)
+                continue
+            sound.set_volume(SOUND_VOLUME)
+            self.sounds[key] = sound
+        
+        if not self.missing:
+            print("✅ All sound effects loaded successfully!")
+        else:
+            print(f"⚠️  Could not load {', '.join(self.missing)} - those effects stay silent")
+            print("Add .wav sound files to enable audio effects!")
+    
+    def _drop(self, reason: str) -> bool:
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        return False
+    
+    def play(self, name: str) -> bool:
+        """Play a sound effect on its category's channels; False if it was dropped"""
+        sound = self.sounds.get(name)
+        if sound is None:
+            return False
+        
+        start = time.perf_counter()
+        now = pygame.time.get_ticks()
+        max_voices, cooldown = SOUND_LIMITS.get(name, DEFAULT_SOUND_LIMIT)
+        last = self.last_played.get(name)
+        if last is not None and now - last < cooldown:
+            return self._drop("cooldown")
+        
+        free = None
+        voices = 0
+        for channel in self.channels[SOUND_CATEGORIES.get(name, "ui")]:
+            if not channel.get_busy():
+                if free is None:
+                    free = channel
+            elif channel.get_sound() is sound:
+                voices += 1
+        if voices >= max_voices:
+            return self._drop("voice limit")
+        if free is None:
+            return self._drop("no free channel")
+        
+        free.play(sound)
+        self.last_played[name] = now
+        self.plays += 1
+        elapsed = time.perf_counter() - start
+        self.play_time += elapsed
+        self.max_play_time = max(self.max_play_time, elapsed)
+        return True
+    
+    def report(self) -> str:
+        """Summary for --audio-stats"""
+        mixer = pygame.mixer.get_init()
+        if not mixer:
+            return "Audio: no device"
+        dropped = sum(self.dropped.values())
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(self.dropped.items()))
+        mean_us = self.play_time / self.plays * 1e6 if self.plays else 0.0
+        return (f"Audio: {mixer[0]} Hz, {self.buffer}-sample buffer ({self.latency_ms():.1f} ms buffer latency)\n"
+                f"  {self.plays} sounds played, {dropped} dropped{f' ({reasons})' if reasons else ''}\n"
+                f"  starting a sound took {mean_us:.0f} us on average, {self.max_play_time * 1e6:.0f} us at most")
+
+# Create global audio manager (the mixer is opened at import, load_sounds runs with the startup assets)
+audio = AudioManager()
+
+# ==================== MUSIC ====================
+MUSIC_VOLUME = 0.3
+MUSIC_FADE_MS = 800
+# Screen (or "battle_<special_effect>") -> track streamed from disk, None fades to silence.
+# Battles at locations without their own entry use "battle".
+MUSIC_TRACKS = {
+    "menu": "background_music2.wav",
+    "world_map": "background_music2.wav",
+    "store": "music3.mp3",
+    "battle": "music3.mp3",
+    "battle_magical": "background_music2.wav",
+    "battle_tech": "background_music2.wav",
+    "victory": "victory-fanfare.wav",
+    "defeat": None
+}
+MUSIC_STINGERS = {"victory", "defeat"}  # Played once instead of looping
+
+class MusicPlayer:
+    """Streams one track at a time through pygame.mixer.music
+    
+    Tracks are decoded a block at a time by the mixer, so even the large
+    WAV never sits in memory. Switching fades the old track out and queues
+    the new one to start when the fade ends; nothing here waits on it.
+    Screens that share a track keep it playing without a restart.
+    """
+    
+    def __init__(self):
+        self.key: Optional[str] = None
+        self.path: Optional[str] = None
+        self.missing = set()
+    
+    def _resolve(self, key: str) -> Optional[str]:
+        if key not in MUSIC_TRACKS and key.startswith("battle_"):
+            key = "battle"
+        path = MUSIC_TRACKS.get(key)
+        if path and not os.path.exists(path):
+            if path not in self.missing:
+                self.missing.add(path)
+                print(f"⚠️  Music file not found. Add '{path}' for music!")
+            return None
+        return path
+    
+    def check_tracks(self):
+        """Report which music files are present (run with the startup assets)"""
+        for key in MUSIC_TRACKS:
+            self._resolve(key)
+        found = {path for path in MUSIC_TRACKS.values() if path} - self.missing
+        if found:
+            print(f"✅ Streaming music from {len(found)} tracks")
+    
+    def play(self, key: str):
+        """Switch to the track for a screen, crossfading from whatever is playing"""
+        if not audio.enabled:
+            return
+        stinger = key in MUSIC_STINGERS
+        if key == self.key and (not stinger or pygame.mixer.music.get_busy()):
+            return
+        
+        path = self._resolve(key)
+        self.key = key
+        if path == self.path and path and not stinger and pygame.mixer.music.get_busy():
+            return  # Same file on the next screen, keep playing
+        self.path = path
+        
+        loops = 0 if stinger else -1
+        try:
+            if path is None:
+                pygame.mixer.music.fadeout(MUSIC_FADE_MS)
+            elif pygame.mixer.music.get_busy():
+                # The queued track takes over as soon as the fade-out finishes
+                pygame.mixer.music.fadeout(MUSIC_FADE_MS)
+                pygame.mixer.music.queue(path, loops=loops)
+            else:
+                pygame.mixer.music.load(path)
+                pygame.mixer.music.set_volume(MUSIC_VOLUME)
+                pygame.mixer.music.play(loops, fade_ms=MUSIC_FADE_MS)
+        except pygame.error as e:
+            print(f"⚠️  Could not play music '{path}': {e}")
+    
+    def stop(self):
+        self.key = self.path = None
+        if audio.enabled:
+            pygame.mixer.music.stop()
+
+# Create global music player
+music_player = MusicPlayer()
 
 # ==================== ASSET MANAGEMENT ====================
+# Sprite files by image key (all scaled to CHARACTER_SPRITE_SIZE)
+CHARACTER_SPRITE_SIZE = (120, 120)
+CHARACTER_IMAGE_FILES = {
+    # Player characters
+    'knight': "knight.png",
+    'wizard': "wizard.png",
+    'rogue': "rogue.png",
+    'soldier': "soldier.png",
+    
+    # Basic enemies
+    'goblin': "goblin.png",
+    'dark_mage': "dark_mage.png",
+    'skeleton': "skeleton.png",
+    'orc': "orc.png",
+    
+    # Haunted Mansion enemies
+    'ghost': "ghost.png",
+    'vampire': "vampire.png",
+    'lich': "lich.png",
+    'banshee': "banshee.png",
+    
+    # Pirate Dock enemies
+    'pirate': "pirate.png",
+    'sea_serpent': "sea_serpent.png",
+    'kraken_spawn': "kraken_spawn.png",
+    'ghost_ship': "ghost_ship.png",
+    
+    # Ancient City enemies
+    'city_guard': "city_guard.png",
+    'assassin': "assassin.png",
+    'golem': "golem.png",
+    'ancient_warrior': "ancient_warrior.png",
+    
+    # Sacred Shrine enemies
+    'temple_guardian': "temple_guardian.png",
+    'spirit_monk': "spirit_monk.png",
+    'divine_beast': "divine_beast.png",
+    'celestial': "celestial.png",
+    
+    # Volcanic Caves enemies
+    'fire_elemental': "fire_elemental.png",
+    'lava_beast': "lava_beast.png",
+    'dragon_whelp': "dragon_whelp.png",
+    'magma_golem': "magma_golem.png",
+    
+    # Maze enemies
+    'minotaur': "minotaur.png",
+    'lost_soul': "lost_soul.png",
+    
+    # Castle enemies
+    'druid_lord': "druid_lord.png",
+    'ancient_guardian': "ancient_guardian.png",
+    
+    # Bot Attack enemies
+    'mech_dragon': "mech_dragon.png",
+    'war_machine': "war_machine.png",
+    
+    # Additional/Elite enemies
+    'elite_dark_mage': "elite_dark_mage.png",
+}
+
+PLAYER_IMAGE_KEYS = ["knight", "wizard", "rogue", "soldier"]
+
+SOUND_FILES = {
+    'attack': "attack.wav",
+    'special': "special.wav",
+    'heal': "heal.wav",
+    'victory': "victory.wav",
+    'defeat': "defeat.wav",
+    'buy': "buy.wav",
+    'click': "click.wav"
+}
+
+# Pre-scaled sprite atlas written by --build-atlas
+ATLAS_IMAGE_FILE = "character_atlas.png"
+ATLAS_INDEX_FILE = "character_atlas.json"
+ATLAS_COLUMNS = 8
+
+def _decode_image(filename: str, size: Tuple[int, int]) -> Optional[pygame.Surface]:
+    """Load and scale one image (runs on the loader thread pool)"""
+    try:
+        return pygame.transform.scale(pygame.image.load(filename), size)
+    except (pygame.error, FileNotFoundError):
+        return None
+
+def build_character_atlas(image_path: str = ATLAS_IMAGE_FILE, index_path: str = ATLAS_INDEX_FILE) -> int:
+    """Pack every character sprite into one pre-scaled atlas image plus a JSON index
+    
+    Returns the number of sprites packed. Sprites whose source file is missing
+    are listed in the index so the game doesn't look for them at runtime.
+    """
+    width, height = CHARACTER_SPRITE_SIZE
+    sprites = {}
+    missing = []
+    for key, filename in CHARACTER_IMAGE_FILES.items():
+        image = _decode_image(filename, CHARACTER_SPRITE_SIZE)
+        if image is None:
+            missing.append(key)
+        else:
+            sprites[key] = image
+    
+    rows = max(1, -(-len(sprites) // ATLAS_COLUMNS))
+    atlas = pygame.Surface((width * ATLAS_COLUMNS, height * rows), pygame.SRCALPHA)
+    index = {"cell": [width, height], "sprites": {}, "missing": missing}
+    for slot, (key, image) in enumerate(sprites.items()):
+        x, y = (slot % ATLAS_COLUMNS) * width, (slot // ATLAS_COLUMNS) * height
+        atlas.blit(image, (x, y))
+        index["sprites"][key] = [x, y, width, height]
+    
+    pygame.image.save(atlas, image_path)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    return len(sprites)
+
+class ScaledSurfaceCache:
+    """LRU cache of resized surfaces keyed by (image key, size), bounded by pixel memory"""
+    
+    def __init__(self, budget_bytes: int = 16 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _surface_bytes(surface: pygame.Surface) -> int:
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+    
+    def get(self, key: str, source: pygame.Surface, size: Tuple[int, int], smooth: bool = True) -> pygame.Surface:
+        """Return source resized to size, computing it at most once while cached"""
+        cache_key = (key, size, smooth)
+        surface = self.surfaces.get(cache_key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(cache_key)
+            return surface
+        
+        self.misses += 1
+        if smooth and source.get_bytesize() in (3, 4):
+            surface = pygame.transform.smoothscale(source, size)
+        else:
+            surface = pygame.transform.scale(source, size)
+        self.surfaces[cache_key] = surface
+        self.used_bytes += self._surface_bytes(surface)
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while self.used_bytes > self.budget_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.used_bytes -= self._surface_bytes(evicted)
+        return surface
+    
+    def clear(self):
+        """Drop all cached surfaces and reset counters"""
+        self.surfaces.clear()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
 class AssetManager:
-    """Manages game assets like images and sounds"""
+    """Manages game assets like images and sounds
+    
+    Nothing is loaded at import time. load_startup_assets() decodes what the
+    first screens need on a thread pool while a progress bar is shown; enemy
+    sprites and the large backgrounds are requested on demand and decoded in
+    the background.
+    """
     
     def __init__(self):
         self.character_images = {}
-        self.sounds = {}
+        self.missing_images = set()
         self.shop_background = None
         self.world_map_background = None
-        self.load_all_assets()
+        self.pending = {}  # Image key -> Future
+        self.executor = None
+        self.atlas = None
+        self.scaled_images = ScaledSurfaceCache()
+    
+    def load_atlas(self, image_path: str = ATLAS_IMAGE_FILE, index_path: str = ATLAS_INDEX_FILE) -> bool:
+        """Load the pre-scaled sprite atlas once and slice it into subsurfaces"""
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            atlas = pygame.image.load(image_path).convert_alpha()
+        except (pygame.error, OSError, ValueError):
+            return False
+        
+        if list(index.get("cell", [])) != list(CHARACTER_SPRITE_SIZE):
+            print(f"⚠️  {ATLAS_IMAGE_FILE} was built for another sprite size. Run --build-atlas to rebuild it.")
+            return False
+        
+        atlas_mtime = os.path.getmtime(image_path)
+        if any(os.path.exists(filename) and os.path.getmtime(filename) > atlas_mtime
+               for filename in CHARACTER_IMAGE_FILES.values()):
+            print(f"⚠️  {ATLAS_IMAGE_FILE} is older than some sprites, loading them one by one. "
+                  f"Run --build-atlas to refresh it.")
+            return False
+        
+        self.atlas = atlas
+        for key, rect in index["sprites"].items():
+            self.character_images[key] = atlas.subsurface(pygame.Rect(rect))
+        self.missing_images.update(key for key in index.get("missing", []) if key not in self.character_images)
+        return True
+    
+    def _submit(self, key: str, filename: str, size: Tuple[int, int]):
+        """Queue an image for decoding unless it is loaded, pending or known missing"""
+        if key in self.pending or key in self.character_images or key in self.missing_images:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4),
+                                               thread_name_prefix="asset-loader")
+        self.pending[key] = self.executor.submit(_decode_image, filename, size)
+    
+    def _collect(self, key: str, wait: bool = False) -> Optional[pygame.Surface]:
+        """Move a finished decode into the cache, optionally blocking until it is done"""
+        future = self.pending.get(key)
+        if future is None or (not wait and not future.done()):
+            return None
+        del self.pending[key]
+        image = future.result()
+        if image is None:
+            self.missing_images.add(key)
+            return None
+        # Pixel-format conversion needs the display, so it happens here on the main thread
+        return image.convert_alpha()
+    
+    def request_character_image(self, key: str):
+        """Start decoding a character sprite in the background"""
+        if key in CHARACTER_IMAGE_FILES:
+            self._submit(key, CHARACTER_IMAGE_FILES[key], CHARACTER_SPRITE_SIZE)
     
-    def load_all_assets(self):
-        """Load all game assets"""
-        self.load_character_images()
+    def get_character_image(self, key: str, wait: bool = False) -> Optional[pygame.Surface]:
+        """Return a sprite if it has finished loading, requesting it on first use
+        
+        With wait=True the call blocks until the decode is done.
+        """
+        image = self.character_images.get(key)
+        if image is None:
+            self.request_character_image(key)
+            image = self._collect(key, wait)
+            if image is not None:
+                self.character_images[key] = image
+        return image
+    
+    def get_scaled_image(self, key: str, size: Tuple[int, int], smooth: bool = True) -> Optional[pygame.Surface]:
+        """Character sprite resized to size (thumbnails, map icons), cached by key and size"""
+        image = self.get_character_image(key)
+        if image is None:
+            return None
+        if image.get_size() == tuple(size):
+            return image
+        return self.scaled_images.get(key, image, tuple(size), smooth)
+    
+    def request_location_sprites(self, location: Location):
+        """Start decoding the enemy sprites for a location"""
+        for enemy_name in location.enemies:
+            self.request_character_image(enemy_name.lower().replace(" ", "_"))
+    
+    def ensure_location_sprites(self, location: Location):
+        """Block until a location's enemy sprites are decoded"""
+        for enemy_name in location.enemies:
+            self.get_character_image(enemy_name.lower().replace(" ", "_"), wait=True)
+    
+    def load_startup_assets(self, progress=None):
+        """Load the assets needed before the first screen, reporting progress(done, total)"""
+        if self.load_atlas():
+            print(f"✅ Loaded {len(self.character_images)} character sprites from {ATLAS_IMAGE_FILE}")
+        
+        startup_keys = PLAYER_IMAGE_KEYS + ["goblin"]
+        for key in startup_keys:
+            self.request_character_image(key)
+        
+        # Large backgrounds keep decoding in the background after startup
+        self._submit("shop_background", "shop_background.png", (SCREEN_WIDTH, SCREEN_HEIGHT))
+        self._submit("world_map_background", "world_map.png", (SCREEN_WIDTH, SCREEN_HEIGHT))
+        
+        total = len(startup_keys) + 1
+        done = 0
+        for key in startup_keys:
+            self.get_character_image(key, wait=True)
+            done += 1
+            if progress:
+                progress(done, total)
+        
         self.load_sounds()
-        self.load_shop_background()
-        self.load_world_map_background()
-    
-    def load_character_images(self):
-        """Load character sprite images"""
-        image_files = {
-            # Player characters
-            'knight': "knight.png",
-            'wizard': "wizard.png",
-            'rogue': "rogue.png",
-            'soldier': "soldier.png",
-            
-            # Basic enemies
-            'goblin': "goblin.png",
-            'dark_mage': "dark_mage.png",
-            'skeleton': "skeleton.png",
-            'orc': "orc.png",
-            
-            # Haunted Mansion enemies
-            'ghost': "ghost.png",
-            'vampire': "vampire.png",
-            'lich': "lich.png",
-            'banshee': "banshee.png",
-            
-            # Pirate Dock enemies
-            'pirate': "pirate.png",
-            'sea_serpent': "sea_serpent.png",
-            'kraken_spawn': "kraken_spawn.png",
-            'ghost_ship': "ghost_ship.png",
-            
-            # Ancient City enemies
-            'city_guard': "city_guard.png",
-            'assassin': "assassin.png",
-            'golem': "golem.png",
-            'ancient_warrior': "ancient_warrior.png",
-            
-            # Sacred Shrine enemies
-            'temple_guardian': "temple_guardian.png",
-            'spirit_monk': "spirit_monk.png",
-            'divine_beast': "divine_beast.png",
-            'celestial': "celestial.png",
-            
-            # Volcanic Caves enemies
-            'fire_elemental': "fire_elemental.png",
-            'lava_beast': "lava_beast.png",
-            'dragon_whelp': "dragon_whelp.png",
-            'magma_golem': "magma_golem.png",
-            
-            # Maze enemies
-            'minotaur': "minotaur.png",
-            'lost_soul': "lost_soul.png",
-            
-            # Castle enemies
-            'druid_lord': "druid_lord.png",
-            'ancient_guardian': "ancient_guardian.png",
-            
-            # Bot Attack enemies
-            'mech_dragon': "mech_dragon.png",
-            'war_machine': "war_machine.png",
-            
-            # Additional/Elite enemies
-            'elite_dark_mage': "elite_dark_mage.png",
-        }
+        if progress:
+            progress(total, total)
         
-        # Try to load all images
-        loaded_count = 0
-        for key, filename in image_files.items():
-            try:
-                image = pygame.image.load(filename)
-                self.character_images[key] = pygame.transform.scale(image, (120, 120))
-                loaded_count += 1
-            except pygame.error:
-                # Silently skip missing files
-                pass
-        
-        if loaded_count > 0:
-            print(f"✅ Loaded {loaded_count} character images successfully!")
-            if loaded_count < len(image_files):
-                print(f"ℹ️  {len(image_files) - loaded_count} images not found - will use simple shapes for those.")
+        loaded = [key for key in startup_keys if key in self.character_images]
+        if loaded:
+            print(f"✅ Loaded {len(loaded)} character images, enemy sprites load on demand")
         else:
             print(f"⚠️  No character images found. Using simple shapes instead.")
             print("Add .png files for any of these enemies to use custom graphics:")
-            print(", ".join(image_files.keys()))
-            self.character_images = None
+            print(", ".join(CHARACTER_IMAGE_FILES.keys()))
     
     def load_sounds(self):
-        """Load sound effects and music"""
-        sound_files = {
-            'attack': "attack.wav",
-            'special': "special.wav",
-            'heal': "heal.wav",
-            'victory': "victory.wav",
-            'defeat': "defeat.wav",
-            'buy': "buy.wav",
-            'click': "click.wav"
-        }
-        
-        try:
-            for key, filename in sound_files.items():
-                sound = pygame.mixer.Sound(filename)
-                sound.set_volume(0.7)
-                self.sounds[key] = sound
-            print("✅ All sound effects loaded successfully!")
-            
-            # Load background music
-            try:
-                pygame.mixer.music.load("background_music.wav")
-                pygame.mixer.music.set_volume(0.3)
-                print("✅ Background music loaded successfully!")
-            except pygame.error:
-                print("⚠️  Background music file not found. Add 'background_music.wav' for music!")
-                
-        except pygame.error as e:
-            print(f"⚠️  Could not load some sound files: {e}")
-            print("Add .wav sound files to enable audio effects!")
-            self.sounds = None
+        """Load sound effects and check the music tracks (music is streamed, never loaded up front)"""
+        audio.load_sounds()
+        if audio.enabled:
+            music_player.check_tracks()
     
-    def load_shop_background(self):
-        """Load shop background image"""
-        try:
-            self.shop_background = pygame.image.load("shop_background.png")
-            self.shop_background = pygame.transform.scale(self.shop_background, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            print("✅ Shop background loaded successfully!")
-        except pygame.error as e:
-            print(f"⚠️  Could not load shop background: {e}")
-            print("Add 'shop_background.png' for custom shop background!")
-            self.shop_background = None
+    def get_shop_background(self) -> Optional[pygame.Surface]:
+        """Shop background image, waiting for the background decode if needed"""
+        if "shop_background" in self.pending:
+            self.shop_background = self._collect("shop_background", wait=True)
+            if self.shop_background is None:
+                print("⚠️  Could not load shop background. Add 'shop_background.png' for custom shop background!")
+        return self.shop_background
     
-    def load_world_map_background(self):
-        """Load world map background image"""
-        try:
-            self.world_map_background = pygame.image.load("world_map.png")
-            self.world_map_background = pygame.transform.scale(self.world_map_background, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            print("✅ World map background loaded successfully!")
-        except pygame.error as e:
-            print(f"⚠️  Could not load world map background: {e}")
-            print("Add 'world_map.png' for custom world map background!")
-            self.world_map_background = None
+    def get_world_map_background(self) -> Optional[pygame.Surface]:
+        """World map background image, waiting for the background decode if needed"""
+        if "world_map_background" in self.pending:
+            self.world_map_background = self._collect("world_map_background", wait=True)
+            if self.world_map_background is None:
+                print("⚠️  Could not load world map background. Add 'world_map.png' for custom world map background!")
+        return self.world_map_background
     
     def play_sound(self, sound_name: str):
-        """Play a sound effect if available"""
-        if self.sounds and sound_name in self.sounds:
-            self.sounds[sound_name].play()
+        """Play a sound effect if available (see AudioManager.play)"""
+        audio.play(sound_name)
     
-    def start_music(self):
-        """Start background music"""
-        try:
-            pygame.mixer.music.play(-1)  # Loop forever
-        except pygame.error:
-            pass
+    def start_music(self, key: str = "menu"):
+        """Start (or crossfade to) the music for a screen, see MUSIC_TRACKS"""
+        music_player.play(key)
     
     def stop_music(self):
         """Stop background music"""
-        pygame.mixer.music.stop()
+        music_player.stop()
 
 # Create global asset manager
 assets = AssetManager()
@@ -414,138 +1459,58 @@ class Character:
             self.speed = 10
             self.weapon = "Crude Weapon"
             self.special = "Basic Attack"
-            
-            # Set enemy-specific colors for visual distinction
-            if name == "Ghost":
-                self.color = (200, 200, 255)  # Pale blue
-            elif name == "Vampire":
-                self.color = (100, 0, 0)  # Dark red
-            elif name == "Skeleton":
-                self.color = WHITE
-            elif name == "Orc":
-                self.color = (0, 100, 0)  # Dark green
-            elif name in ["Fire Elemental", "Lava Beast", "Magma Golem"]:
-                self.color = (255, 100, 0)  # Orange
-            elif name in ["Sea Serpent", "Kraken Spawn"]:
-                self.color = (0, 150, 150)  # Teal
-            elif name == "Dark Mage":
-                self.color = (50, 0, 50)  # Dark purple
-            elif name == "Golem":
-                self.color = (100, 100, 100)  # Gray
-            elif name in ["Mech Dragon", "War Machine"]:
-                self.color = SILVER
+        
+        # Looked up once here so drawing never has to parse names
+        self.base_name = name
+        self.enemy_type = get_enemy_type(name) if char_type == "Enemy" else None
+        if self.enemy_type:
+            self.color = self.enemy_type.color
+            self.image_key = self.enemy_type.sprite
+        else:
+            self.image_key = char_type.lower()
     
     def draw(self, screen):
         """Draw the character on screen"""
         body_x = self.x + self.animation_offset
         
-        # Try to draw character image
-        if assets.character_images:
-            image_key = self.char_type.lower()
-            if self.char_type == "Enemy":
-                # Map all enemy names to image files
-                enemy_map = {
-                    # Basic enemies
-                    "Goblin": "goblin",
-                    "Dark Mage": "dark_mage",
-                    "Skeleton": "skeleton",
-                    "Orc": "orc",
-                    
-                    # Haunted Mansion enemies
-                    "Ghost": "ghost",
-                    "Vampire": "vampire",
-                    "Lich": "lich",
-                    "Banshee": "banshee",
-                    
-                    # Pirate Dock enemies
-                    "Pirate": "pirate",
-                    "Sea Serpent": "sea_serpent",
-                    "Kraken Spawn": "kraken_spawn",
-                    "Ghost Ship": "ghost_ship",
-                    
-                    # Ancient City enemies
-                    "City Guard": "city_guard",
-                    "Assassin": "assassin",
-                    "Golem": "golem",
-                    "Ancient Warrior": "ancient_warrior",
-                    
-                    # Sacred Shrine enemies
-                    "Temple Guardian": "temple_guardian",
-                    "Spirit Monk": "spirit_monk",
-                    "Divine Beast": "divine_beast",
-                    "Celestial": "celestial",
-                    
-                    # Volcanic Caves enemies
-                    "Fire Elemental": "fire_elemental",
-                    "Lava Beast": "lava_beast",
-                    "Dragon Whelp": "dragon_whelp",
-                    "Magma Golem": "magma_golem",
-                    
-                    # Special/Elite enemies
-                    "Elite Dark Mage": "elite_dark_mage",
-                    "Minotaur": "minotaur",
-                    "Lost Soul": "lost_soul",
-                    "Druid Lord": "druid_lord",
-                    "Ancient Guardian": "ancient_guardian",
-                    "Mech Dragon": "mech_dragon",
-                    "War Machine": "war_machine",
-                }
-                
-                # Extract base enemy name (remove prefixes like "Elite", "Veteran", "Tough")
-                base_name = self.name
-                for prefix in ["Elite ", "Veteran ", "Tough "]:
-                    if base_name.startswith(prefix):
-                        base_name = base_name[len(prefix):]
-                        break
-                
-                # Try to find the correct image key
-                image_key = enemy_map.get(base_name)
-                
-                # If not found, try converting the name to lowercase with underscores
-                if not image_key:
-                    image_key = base_name.lower().replace(" ", "_")
-                
-                # If still not found, default to goblin
-                if image_key and image_key not in assets.character_images:
-                    image_key = "goblin"
-            
-            if image_key and image_key in assets.character_images:
-                image = assets.character_images[image_key]
-                image_rect = image.get_rect(center=(body_x, self.y))
-                screen.blit(image, image_rect)
-            else:
-                self._draw_simple_character(screen, body_x)
+        # Try to draw character image, enemies without a sprite file fall back to the goblin
+        image_key = self.image_key
+        if self.enemy_type and image_key in assets.missing_images:
+            image_key = "goblin"
+        
+        image = assets.get_character_image(image_key)
+        if image:
+            image_rect = image.get_rect(center=(body_x, self.y))
+            screen.blit(image, image_rect)
         else:
             self._draw_simple_character(screen, body_x)
         
         # Draw name
-        name_text = text_font.render(self.name, True, WHITE)
+        name_text = text_cache.render(text_font, self.name, True, WHITE)
         name_rect = name_text.get_rect(center=(body_x, self.y + 80))
         screen.blit(name_text, name_rect)
         
+        # Sprite/shape area (weapons and heads reach ~90px above center) plus the name label
+        dirty_rects.mark(pygame.Rect(body_x - 70, self.y - 95, 140, 160).union(name_rect))
+        
         # Draw health bar
         self._draw_health_bar(screen, body_x)
     
     def _draw_simple_character(self, screen, body_x: int):
         """Draw simple shape representation of character"""
         # Different visual styles for different enemy types when no image is available
-        if self.char_type == "Enemy":
-            # Extract base enemy name
-            base_name = self.name
-            for prefix in ["Elite ", "Veteran ", "Tough "]:
-                if base_name.startswith(prefix):
-                    base_name = base_name[len(prefix):]
-                    break
+        if self.enemy_type:
+            shape = self.enemy_type.shape
             
             # Custom simple shapes for different enemy types
-            if base_name == "Ghost":
+            if shape == "ghost":
                 # Translucent white circle
                 pygame.draw.circle(screen, (200, 200, 255), (body_x, self.y), 35)
                 pygame.draw.circle(screen, (150, 150, 200), (body_x, self.y), 35, 3)
                 # Ghost eyes
                 pygame.draw.circle(screen, BLACK, (body_x - 10, self.y - 10), 5)
                 pygame.draw.circle(screen, BLACK, (body_x + 10, self.y - 10), 5)
-            elif base_name == "Skeleton":
+            elif shape == "skeleton":
                 # White bones
                 pygame.draw.circle(screen, WHITE, (body_x, self.y - 20), 20)  # Skull
                 pygame.draw.rect(screen, WHITE, (body_x - 20, self.y - 10, 40, 30))  # Ribcage
@@ -554,7 +1519,7 @@ class Character:
                 # Skull details
                 pygame.draw.circle(screen, BLACK, (body_x - 8, self.y - 25), 4)
                 pygame.draw.circle(screen, BLACK, (body_x + 8, self.y - 25), 4)
-            elif base_name in ["Fire Elemental", "Lava Beast", "Magma Golem"]:
+            elif shape == "fire":
                 # Fire/lava colors
                 pygame.draw.circle(screen, (255, 100, 0), (body_x, self.y), 45)
                 pygame.draw.circle(screen, (255, 50, 0), (body_x, self.y), 35)
@@ -562,7 +1527,7 @@ class Character:
                 # Eyes
                 pygame.draw.circle(screen, WHITE, (body_x - 10, self.y - 5), 5)
                 pygame.draw.circle(screen, WHITE, (body_x + 10, self.y - 5), 5)
-            elif base_name in ["Sea Serpent", "Kraken Spawn"]:
+            elif shape == "aquatic":
                 # Aquatic blue-green
                 pygame.draw.ellipse(screen, (0, 150, 150), (body_x - 30, self.y - 40, 60, 80))
                 pygame.draw.circle(screen, (0, 100, 100), (body_x, self.y - 30), 25)
@@ -571,7 +1536,7 @@ class Character:
                     pygame.draw.arc(screen, (0, 100, 100), 
                                    (body_x - 30 + i*20, self.y + 10, 20, 30), 
                                    0, 3.14, 3)
-            elif base_name == "Vampire":
+            elif shape == "vampire":
                 # Black with red accents
                 pygame.draw.circle(screen, BLACK, (body_x, self.y), 35)
                 pygame.draw.polygon(screen, (100, 0, 0), 
@@ -582,14 +1547,14 @@ class Character:
                 # Red eyes
                 pygame.draw.circle(screen, RED, (body_x - 8, self.y - 55), 3)
                 pygame.draw.circle(screen, RED, (body_x + 8, self.y - 55), 3)
-            elif base_name == "Golem":
+            elif shape == "golem":
                 # Stone gray blocky shape
                 pygame.draw.rect(screen, (100, 100, 100), (body_x - 30, self.y - 40, 60, 80))
                 pygame.draw.rect(screen, (80, 80, 80), (body_x - 35, self.y - 50, 70, 20))  # Head
                 # Eyes
                 pygame.draw.circle(screen, TURQUOISE, (body_x - 10, self.y - 40), 4)
                 pygame.draw.circle(screen, TURQUOISE, (body_x + 10, self.y - 40), 4)
-            elif base_name in ["Druid Lord", "Ancient Guardian"]:
+            elif shape == "mystic":
                 # Mystical purple/gold
                 pygame.draw.circle(screen, PURPLE, (body_x, self.y), 40)
                 pygame.draw.circle(screen, GOLD, (body_x, self.y), 40, 3)
@@ -601,7 +1566,7 @@ class Character:
                 # Glowing eyes
                 pygame.draw.circle(screen, WHITE, (body_x - 10, self.y - 55), 5)
                 pygame.draw.circle(screen, WHITE, (body_x + 10, self.y - 55), 5)
-            elif base_name in ["Mech Dragon", "War Machine"]:
+            elif shape == "mech":
                 # Metallic/mechanical
                 pygame.draw.rect(screen, SILVER, (body_x - 35, self.y - 30, 70, 60))
                 pygame.draw.rect(screen, (150, 150, 150), (body_x - 40, self.y - 40, 80, 20))
@@ -671,37 +1636,38 @@ class Character:
         pygame.draw.rect(screen, WHITE, bar_rect, 2)
         
         # Health text
-        health_text = small_font.render(f"{max(0, self.health)}/{self.max_health}", True, WHITE)
+        health_text = text_cache.render(small_font, f"{max(0, self.health)}/{self.max_health}", True, WHITE)
         health_rect = health_text.get_rect(center=(body_x, self.y + 120))
         screen.blit(health_text, health_rect)
+        dirty_rects.mark(bar_rect.union(health_rect))
     
-    def attack_enemy(self, enemy) -> int:
-        """Perform basic attack"""
+    def attack_enemy(self, enemy, rng=random) -> int:
+        """Perform basic attack (rng: the random module or a seeded random.Random)"""
         self.is_attacking = True
         self.attack_timer = 30
-        damage = random.randint(int(self.attack * 0.8), int(self.attack * 1.2))
+        damage = rng.randint(int(self.attack * 0.8), int(self.attack * 1.2))
         final_damage = max(1, damage - enemy.defense)
         enemy.health -= final_damage
         return final_damage
     
-    def special_attack(self, enemy) -> int:
+    def special_attack(self, enemy, rng=random) -> int:
         """Perform special attack"""
         self.is_attacking = True
         self.attack_timer = 30
-        damage = random.randint(int(self.attack * 1.2), int(self.attack * 1.5))
+        damage = rng.randint(int(self.attack * 1.2), int(self.attack * 1.5))
         final_damage = max(1, damage - enemy.defense)
         enemy.health -= final_damage
         return final_damage
     
-    def heal(self) -> int:
+    def heal(self, rng=random) -> int:
         """Heal character"""
-        heal_amount = random.randint(15, 25)
+        heal_amount = rng.randint(15, 25)
         old_health = self.health
         self.health = min(self.max_health, self.health + heal_amount)
         return self.health - old_health
     
     def update_animation(self):
-        """Update character animation"""
+        """Advance the attack animation one simulation step"""
         if self.is_attacking and self.attack_timer > 0:
             self.animation_offset = random.randint(-5, 5)
             self.attack_timer -= 1
@@ -718,6 +1684,7 @@ class Button:
         self.color = color
         self.hover_color = tuple(min(255, c + 30) for c in color)
         self.is_hovered = False
+        self.drawn_hovered = None  # Hover state at the last draw, for dirty rects
     
     def draw(self, screen):
         """Draw button"""
@@ -725,16 +1692,21 @@ class Button:
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, WHITE, self.rect, 2)
         
-        text_surface = button_font.render(self.text, True, WHITE)
+        text_surface = text_cache.render(button_font, self.text, True, WHITE)
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
+        
+        # The button repaints its own background, so it only needs pushing when it changes
+        if self.is_hovered != self.drawn_hovered:
+            dirty_rects.mark(self.rect.union(text_rect))
+            self.drawn_hovered = self.is_hovered
     
     def handle_event(self, event) -> bool:
         """Handle mouse events"""
         if event.type == pygame.MOUSEMOTION:
-            self.is_hovered = self.rect.collidepoint(event.pos)
+            self.is_hovered = self.rect.collidepoint(game_display.to_logical(event.pos))
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            if self.rect.collidepoint(event.pos):
+            if self.rect.collidepoint(game_display.to_logical(event.pos)):
                 assets.play_sound('click')
                 return True
         return False
@@ -788,6 +1760,139 @@ def get_store_items() -> List[Dict]:
          "attack_boost": 35, "defense_boost": 35, "speed_boost": 20, "max_health_boost": 100, "tier": ItemTier.MYTHIC.value},
     ]
 
+def buy_item(player: Character, item: Dict) -> Optional[List[str]]:
+    """Buy a store item and apply its effects, returns the benefits or None if unaffordable"""
+    if player.dragon_shards < item["cost_shards"] or player.gold < item["cost_gold"]:
+        return None
+    
+    player.dragon_shards -= item["cost_shards"]
+    player.gold -= item["cost_gold"]
+    
+    # Apply item effects
+    benefits = []
+    if "attack_boost" in item:
+        player.attack += item["attack_boost"]
+        benefits.append(f"ATK+{item['attack_boost']}")
+    if "defense_boost" in item:
+        player.defense += item["defense_boost"]
+        benefits.append(f"DEF+{item['defense_boost']}")
+    if "speed_boost" in item:
+        player.speed += item["speed_boost"]
+        benefits.append(f"SPD+{item['speed_boost']}")
+    if "max_health_boost" in item:
+        player.max_health += item["max_health_boost"]
+        player.health += item["max_health_boost"]
+        benefits.append(f"MaxHP+{item['max_health_boost']}")
+    if "heal" in item:
+        heal_amount = min(item["heal"], player.max_health - player.health)
+        player.health += heal_amount
+        benefits.append(f"Healed {heal_amount}HP")
+    if "special_power" in item:
+        player.special = item["special_power"]
+        benefits.append("New Special Power!")
+    
+    if item["type"] == "weapon":
+        player.weapon = item["name"]
+    
+    return benefits
+
+# Item stats in display order, with their labels
+STORE_STAT_ICONS = {
+    "attack_boost": "⚔️ ATK",
+    "defense_boost": "🛡️ DEF",
+    "speed_boost": "⚡ SPD",
+    "max_health_boost": "💪 MaxHP",
+    "heal": "💚 Heal",
+    "special_power": "✨"
+}
+STORE_STAT_NAMES = {
+    "attack_boost": "ATK",
+    "defense_boost": "DEF",
+    "speed_boost": "SPD",
+    "max_health_boost": "MaxHP",
+    "heal": "Heal",
+    "special_power": "Special"
+}
+
+# Sort key -> (label, item key function); value sorts put the most stat per shard first
+STORE_SORTS = {
+    "catalog": ("Catalog", None),
+    "cost": ("Cost", lambda item: (item["cost_shards"], item["cost_gold"])),
+    "attack_value": ("ATK/Shard", lambda item: -item.get("attack_boost", 0) / max(1, item["cost_shards"])),
+    "defense_value": ("DEF/Shard", lambda item: -item.get("defense_boost", 0) / max(1, item["cost_shards"]))
+}
+
+class StoreCatalog:
+    """Store items indexed for the store's filters, sorts and search
+    
+    Each tier, type and stat maps to the positions of the items that have it,
+    and every sort order is computed once up front. A query intersects the
+    index lists it needs and orders the survivors by their precomputed rank,
+    so switching filters never re-sorts or re-reads the item dicts.
+    """
+    
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.by_tier: Dict[str, List[int]] = {}
+        self.by_type: Dict[str, List[int]] = {}
+        self.by_stat: Dict[str, List[int]] = {}
+        for i, item in enumerate(items):
+            self.by_tier.setdefault(item["tier"], []).append(i)
+            self.by_type.setdefault(item["type"], []).append(i)
+            for stat in STORE_STAT_ICONS:
+                if stat in item:
+                    self.by_stat.setdefault(stat, []).append(i)
+        
+        self.tiers = [tier.value for tier in ItemTier if tier.value in self.by_tier]
+        self.types = list(self.by_type)
+        self.stats = [stat for stat in STORE_STAT_ICONS if stat in self.by_stat]
+        self.search_text = [" ".join(str(item.get(key, "")) for key in ("name", "type", "tier", "special_power")).lower()
+                            for item in items]
+        
+        self.orders: Dict[str, List[int]] = {}
+        self.ranks: Dict[str, List[int]] = {}
+        for sort, (_, key) in STORE_SORTS.items():
+            order = list(range(len(items)))
+            if key:
+                order.sort(key=lambda i: key(items[i]))
+            rank = [0] * len(items)
+            for position, i in enumerate(order):
+                rank[i] = position
+            self.orders[sort] = order
+            self.ranks[sort] = rank
+    
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    def query(self, tier: Optional[str] = None, item_type: Optional[str] = None, stat: Optional[str] = None,
+              text: str = "", sort: str = "catalog") -> List[int]:
+        """Positions of the items matching every given filter, in sort order"""
+        indexes = [index.get(value, []) for index, value in
+                   ((self.by_tier, tier), (self.by_type, item_type), (self.by_stat, stat)) if value is not None]
+        if indexes:
+            indexes.sort(key=len)
+            keep = set(indexes[0])
+            for index in indexes[1:]:
+                keep.intersection_update(index)
+            matches = sorted(keep, key=self.ranks[sort].__getitem__)
+        else:
+            matches = self.orders[sort]
+        
+        text = text.strip().lower()
+        if text:
+            search_text = self.search_text
+            matches = [i for i in matches if text in search_text[i]]
+        return list(matches)
+
+_store_catalog: Optional[StoreCatalog] = None
+
+def get_store_catalog() -> StoreCatalog:
+    """Indexed catalog of get_store_items(), built on first use"""
+    global _store_catalog
+    if _store_catalog is None:
+        _store_catalog = StoreCatalog(get_store_items())
+    return _store_catalog
+
 # ==================== WORLD MAP LOCATIONS ====================
 def get_world_locations() -> Dict[str, Location]:
     """Get all world map locations based on the provided map"""
@@ -847,7 +1952,8 @@ def get_world_locations() -> Dict[str, Location]:
             description="The ultimate druid battle awaits!",
             unlock_requirements=["arena", "docks", "city", "shrine", "mansion", "maze"],
             background_color=(30, 30, 50),
-            special_effect="magical"
+            special_effect="magical",
+            wave_size=(3, 6)
         ),
         "bot_attack": Location(
             name="Bot Attack",  # The locked bottom area
@@ -856,137 +1962,1316 @@ def get_world_locations() -> Dict[str, Location]:
             description="Futuristic enemies from another dimension!",
             unlock_requirements=["arena", "docks", "city", "shrine", "mansion", "maze"],
             background_color=(40, 40, 60),
-            special_effect="tech"
+            special_effect="tech",
+            wave_size=(5, 20)
         )
     }
 
-# ==================== DRAWING FUNCTIONS ====================
-def draw_background():
-    """Draw gradient background"""
-    for y in range(SCREEN_HEIGHT):
-        color_ratio = y / SCREEN_HEIGHT
+def _victory_key(location_key: str) -> str:
+    """Key a location's wins are stored under in player.location_victories"""
+    return location_key.replace(" ", "_").replace("_track", "")
+
+def is_location_unlocked(location: Location, player: Character) -> bool:
+    """Check if a location is unlocked"""
+    if not location.unlock_requirements:
+        return True
+    
+    # Check if player has victories from all required locations
+    for req_loc in location.unlock_requirements:
+        if player.location_victories.get(_victory_key(req_loc), 0) == 0:
+            return False
+    return True
+
+LOCATION_RADIUS = 60   # How close the map marker has to be to a location to enter it
+MAP_GRID_CELL = 128    # Spatial grid cell size in map pixels
+
+class WorldMap:
+    """Locations indexed for proximity queries, with unlock state cached per player
+    
+    Locations are bucketed into a uniform grid of MAP_GRID_CELL squares, so a
+    query only looks at the few cells its radius overlaps, however many locations
+    the map has. Requirement and victory keys are normalized once up front, and
+    unlock state is recomputed only after invalidate_unlocks() (call it whenever
+    player.location_victories may have changed).
+    """
+    
+    def __init__(self, locations: Dict[str, Location], cell_size: int = MAP_GRID_CELL):
+        self.locations = locations
+        self.keys = list(locations)
+        self.entries = list(locations.values())
+        self.cell_size = cell_size
+        self.victory_keys = {key: _victory_key(key) for key in self.keys}
+        self.requirements = {key: [_victory_key(req) for req in location.unlock_requirements or []]
+                             for key, location in locations.items()}
+        self.grid = {}  # (cell x, cell y) -> location indices in map order
+        for index, location in enumerate(self.entries):
+            self.grid.setdefault((location.x // cell_size, location.y // cell_size), []).append(index)
+        self.unlocked = None
+    
+    def location_at(self, x: int, y: int, radius: int = LOCATION_RADIUS) -> Optional[str]:
+        """Key of the first location (in map order) within radius of (x, y), if any"""
+        cell_size = self.cell_size
+        radius_sq = radius * radius
+        best = None
+        for cell_x in range((x - radius) // cell_size, (x + radius) // cell_size + 1):
+            for cell_y in range((y - radius) // cell_size, (y + radius) // cell_size + 1):
+                for index in self.grid.get((cell_x, cell_y), ()):
+                    if best is not None and index >= best:
+                        continue
+                    location = self.entries[index]
+                    dx = x - location.x
+                    dy = y - location.y
+                    if dx * dx + dy * dy < radius_sq:
+                        best = index
+        return None if best is None else self.keys[best]
+    
+    def invalidate_unlocks(self):
+        self.unlocked = None
+    
+    def unlock_state(self, player: Character) -> Dict[str, bool]:
+        """Location key -> unlocked, recomputed only after invalidate_unlocks()"""
+        if self.unlocked is None:
+            won = {victory_key for victory_key, count in player.location_victories.items() if count > 0}
+            self.unlocked = {location_key: all(req in won for req in requirements)
+                             for location_key, requirements in self.requirements.items()}
+        return self.unlocked
+
+# ==================== BACKGROUND CACHE ====================
+class BackgroundCache:
+    """Pre-rendered full-screen gradients keyed by style and screen size"""
+    
+    def __init__(self):
+        self.surfaces = {}
+    
+    def get(self, key: Tuple, render_func) -> pygame.Surface:
+        """Return the cached surface for key, rendering it on first use"""
+        size = screen.get_size()
+        cache_key = key + (size,)
+        surface = self.surfaces.get(cache_key)
+        if surface is None:
+            surface = pygame.Surface(size).convert()
+            render_func(surface)
+            self.surfaces[cache_key] = surface
+        return surface
+    
+    def clear(self):
+        """Drop all cached backgrounds (e.g. after a resolution change)"""
+        self.surfaces.clear()
+
+# Create global background cache
+background_cache = BackgroundCache()
+
+def _render_default_gradient(surface: pygame.Surface):
+    """Render the default purple gradient"""
+    width, height = surface.get_size()
+    for y in range(height):
+        color_ratio = y / height
         r = int(20 * (1 - color_ratio) + 60 * color_ratio)
         g = int(10 * (1 - color_ratio) + 30 * color_ratio)
         b = int(40 * (1 - color_ratio) + 80 * color_ratio)
-        pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+        pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+
+def _render_location_gradient(surface: pygame.Surface, location: Location):
+    """Render the gradient for a location's special effect"""
+    width, height = surface.get_size()
+    bg_color = location.background_color
+    
+    for y in range(height):
+        color_ratio = y / height
+        if location.special_effect == "haunted":
+            # Dark, spooky gradient
+            r = int(bg_color[0] * (1 - color_ratio * 0.5))
+            g = int(bg_color[1] * (1 - color_ratio * 0.5))
+            b = int(bg_color[2] * (1 + color_ratio * 0.3))
+        elif location.special_effect == "water":
+            # Blue water gradient
+            r = int(bg_color[0])
+            g = int(bg_color[1] + 20 * color_ratio)
+            b = int(bg_color[2] + 40 * color_ratio)
+        elif location.special_effect == "fire":
+            # Red/orange fire gradient
+            r = int(bg_color[0] + 40 * color_ratio)
+            g = int(bg_color[1] + 20 * color_ratio)
+            b = int(bg_color[2])
+        elif location.special_effect == "divine":
+            # Purple mystical gradient
+            r = int(bg_color[0] + 30 * math.sin(color_ratio * 3.14))
+            g = int(bg_color[1])
+            b = int(bg_color[2] + 40 * color_ratio)
+        else:
+            # Default background for other locations
+            r = int(bg_color[0] * (1 - color_ratio * 0.3) + 20 * color_ratio)
+            g = int(bg_color[1] * (1 - color_ratio * 0.3) + 15 * color_ratio)
+            b = int(bg_color[2] * (1 - color_ratio * 0.3) + 25 * color_ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+
+def _render_shop_gradient(surface: pygame.Surface):
+    """Render the fallback shop background"""
+    width, height = surface.get_size()
+    for y in range(height // 2, height):
+        color_ratio = (y - height // 2) / (height // 2)
+        r = int(101 + 20 * color_ratio)
+        g = int(67 + 15 * color_ratio)
+        b = int(33 + 10 * color_ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+    
+    for y in range(0, height // 2):
+        color_ratio = y / (height // 2)
+        r = g = int(80 + 30 * color_ratio)
+        b = int(90 + 20 * color_ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+
+def _render_world_map_fallback(surface: pygame.Surface):
+    """Render the fallback world map style background"""
+    width, height = surface.get_size()
+    # Ocean blue gradient
+    for y in range(height):
+        color_ratio = y / height
+        r = int(0 + 30 * color_ratio)
+        g = int(50 + 70 * color_ratio)
+        b = int(100 + 55 * color_ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+    
+    # Draw some land masses
+    pygame.draw.ellipse(surface, (34, 139, 34), (100, 150, 300, 200))  # Forest green
+    pygame.draw.ellipse(surface, (160, 82, 45), (500, 100, 400, 300))  # Brown mountains
+    pygame.draw.ellipse(surface, (34, 139, 34), (800, 350, 350, 250))  # More forest
+    pygame.draw.ellipse(surface, (244, 164, 96), (200, 450, 250, 150))  # Sandy area
+
+# ==================== DRAWING FUNCTIONS ====================
+def draw_background():
+    """Draw gradient background"""
+    screen.blit(background_cache.get(("default",), _render_default_gradient), (0, 0))
+
+def draw_location_background(location: Optional[Location]):
+    """Draw location-specific background"""
+    if location is None:
+        draw_background()
+        return
+    
+    cache_key = ("location", location.special_effect, location.background_color)
+    gradient = background_cache.get(cache_key, lambda surface: _render_location_gradient(surface, location))
+    screen.blit(gradient, (0, 0))
+    
+    if quality.background_dots:
+        draw_location_particles(location)
+
+def draw_location_particles(location: Location):
+    """Draw the randomized particle layer on top of a location background"""
+    if location.special_effect == "haunted":
+        # Add spooky effects
+        for i in range(10):
+            x = random.randint(0, SCREEN_WIDTH)
+            y = random.randint(0, SCREEN_HEIGHT // 2)
+            pygame.draw.circle(screen, (100, 100, 150), (x, y), random.randint(2, 5))
+    
+    elif location.special_effect == "water":
+        # Add water effects
+        for i in range(15):
+            x = random.randint(0, SCREEN_WIDTH)
+            y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT)
+            pygame.draw.circle(screen, (30, 50, 100), (x, y), random.randint(3, 8))
+    
+    elif location.special_effect == "fire":
+        # Add lava bubbles
+        for i in range(8):
+            x = random.randint(0, SCREEN_WIDTH)
+            y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT)
+            pygame.draw.circle(screen, (255, 100, 0), (x, y), random.randint(4, 10))
+    
+    elif location.special_effect == "divine":
+        # Add divine light effects
+        for i in range(12):
+            x = random.randint(0, SCREEN_WIDTH)
+            y = random.randint(0, SCREEN_HEIGHT // 3)
+            pygame.draw.circle(screen, (200, 200, 255), (x, y), random.randint(2, 6))
+
+def draw_shop_background():
+    """Draw shop background"""
+    shop_background = assets.get_shop_background()
+    if shop_background:
+        screen.blit(shop_background, (0, 0))
+    else:
+        # Fallback shop background
+        screen.blit(background_cache.get(("shop",), _render_shop_gradient), (0, 0))
+
+def draw_world_map_background():
+    """Draw world map background"""
+    world_map_background = assets.get_world_map_background()
+    if world_map_background:
+        screen.blit(world_map_background, (0, 0))
+    else:
+        # Fallback world map style background
+        screen.blit(background_cache.get(("world_map",), _render_world_map_fallback), (0, 0))
+
+# Store row look by item tier
+STORE_TIER_COLORS = {
+    ItemTier.BASIC.value: (40, 60, 40),
+    ItemTier.INTERMEDIATE.value: (40, 40, 80),
+    ItemTier.ADVANCED.value: (80, 40, 80),
+    ItemTier.LEGENDARY.value: (100, 50, 0),
+    ItemTier.MYTHIC.value: (120, 0, 120)
+}
+STORE_TIER_BADGE_COLORS = {
+    ItemTier.BASIC.value: GRAY,
+    ItemTier.INTERMEDIATE.value: BLUE,
+    ItemTier.ADVANCED.value: PURPLE,
+    ItemTier.LEGENDARY.value: GOLD,
+    ItemTier.MYTHIC.value: TURQUOISE
+}
+STORE_GLOW_TIERS = (ItemTier.LEGENDARY.value, ItemTier.MYTHIC.value)
+STORE_GLOW_PHASES = 8       # Pre-rendered steps of one glow cycle
+STORE_ROW_SIZE = (SCREEN_WIDTH - 100, 70)
+STORE_ROW_NAME_POS = (150, 10)  # Item name inside a row
+STORE_ROW_CACHE_SIZE = 64   # Items whose rows are kept
+
+def store_glow_phase() -> int:
+    """Glow phase for this frame (phase 0 has no glow, used when the effect is off)"""
+    if not quality.store_glow:
+        return 0
+    cycle = pygame.time.get_ticks() * 0.01 / (2 * math.pi)
+    return int(cycle * STORE_GLOW_PHASES) % STORE_GLOW_PHASES
+
+def render_store_name(item: Dict, phase: int = 0) -> pygame.Surface:
+    """An item's name in its tier colour, brightened by the glow phase for the top tiers"""
+    name_color = STORE_TIER_BADGE_COLORS.get(item["tier"], WHITE)
+    if item["tier"] in STORE_GLOW_TIERS:
+        glow = int(5 * math.sin(2 * math.pi * phase / STORE_GLOW_PHASES))
+        name_color = tuple(min(255, max(0, c + glow)) for c in name_color[:3])  # Only RGB, no alpha
+    return button_font.render(item["name"], True, name_color)
+
+def render_store_row(item: Dict, affordable: bool) -> pygame.Surface:
+    """Composite one store row: background, tier badge, name, stats and cost"""
+    row = pygame.Surface(STORE_ROW_SIZE).convert()
+    row_rect = row.get_rect()
+    row.fill(STORE_TIER_COLORS.get(item["tier"], (30, 30, 30)))
+    pygame.draw.rect(row, WHITE, row_rect, 3)
+    
+    # Tier badge
+    tier_color = STORE_TIER_BADGE_COLORS.get(item["tier"], WHITE)
+    tier_badge = pygame.Rect(row_rect.right - 100, 5, 80, 25)
+    pygame.draw.rect(row, tier_color, tier_badge)
+    pygame.draw.rect(row, WHITE, tier_badge, 2)
+    tier_text = small_font.render(item["tier"], True, BLACK)
+    row.blit(tier_text, tier_text.get_rect(center=tier_badge.center))
+    
+    # Item name (glowing names are left out and drawn per frame, see StoreRowCache)
+    if item["tier"] not in STORE_GLOW_TIERS:
+        row.blit(render_store_name(item), STORE_ROW_NAME_POS)
+    
+    # Item stats
+    desc_parts = []
+    for stat, icon in STORE_STAT_ICONS.items():
+        if stat in item:
+            if stat == "special_power":
+                desc_parts.append(f"{icon} {item[stat]}")
+            else:
+                desc_parts.append(f"{icon}+{item[stat]}")
+    desc = " | ".join(desc_parts) if desc_parts else "Special Item"
+    row.blit(small_font.render(desc, True, WHITE), (150, 40))
+    
+    # Cost, greyed out when the player can't pay it
+    cost_color = YELLOW if affordable else GRAY
+    row.blit(text_font.render(f"💎 {item['cost_shards']} + 🪙 {item['cost_gold']}", True, cost_color), (660, 25))
+    return row
+
+class StoreRowCache:
+    """Pre-rendered store rows, so a store frame is one blit per visible row
+    
+    Each item keeps one static row, re-rendered only when set_funds() finds
+    the player can no longer, or now can, afford it. Glowing tiers also keep
+    a small name surface per glow phase that is blitted over the row.
+    """
+    
+    def __init__(self, items: List[Dict], max_items: int = STORE_ROW_CACHE_SIZE):
+        self.items = items
+        self.max_items = max_items
+        self.rows = OrderedDict()  # Item position -> static row surface
+        self.names: Dict[int, List[Optional[pygame.Surface]]] = {}  # Item position -> name by glow phase
+        self.affordable: Dict[int, bool] = {}
+        self.shards = 0
+        self.gold = 0
+        self.renders = 0
+    
+    def _can_afford(self, index: int) -> bool:
+        item = self.items[index]
+        return self.shards >= item["cost_shards"] and self.gold >= item["cost_gold"]
+    
+    def set_funds(self, shards: int, gold: int):
+        """Update the player's funds, dropping rows whose affordability changed"""
+        self.shards, self.gold = shards, gold
+        for index in [index for index in self.rows if self._can_afford(index) != self.affordable[index]]:
+            del self.rows[index]
+            del self.affordable[index]
+    
+    def get(self, index: int) -> pygame.Surface:
+        """The static row for an item, rendered on first use"""
+        row = self.rows.get(index)
+        if row is None:
+            self.affordable[index] = self._can_afford(index)
+            row = self.rows[index] = render_store_row(self.items[index], self.affordable[index])
+            self.renders += 1
+            if len(self.rows) > self.max_items:
+                oldest, _ = self.rows.popitem(last=False)
+                del self.affordable[oldest]
+                self.names.pop(oldest, None)
+        else:
+            self.rows.move_to_end(index)
+        return row
+    
+    def glow_name(self, index: int, phase: int) -> Optional[pygame.Surface]:
+        """Name surface to blit over the row at this glow phase (None for tiers that don't glow)"""
+        if self.items[index]["tier"] not in STORE_GLOW_TIERS:
+            return None  # The name is part of the row
+        names = self.names.setdefault(index, [None] * STORE_GLOW_PHASES)
+        if names[phase] is None:
+            names[phase] = render_store_name(self.items[index], phase)
+        return names[phase]
+    
+    def draw(self, screen, index: int, pos: Tuple[int, int], phase: int):
+        screen.blit(self.get(index), pos)
+        name = self.glow_name(index, phase)
+        if name:
+            screen.blit(name, (pos[0] + STORE_ROW_NAME_POS[0], pos[1] + STORE_ROW_NAME_POS[1]))
+
+# ==================== BATTLE ENGINE ====================
+class BattleAction(Enum):
+    ATTACK = "attack"
+    SPECIAL = "special"
+    HEAL = "heal"
+
+class BattleOutcome(Enum):
+    VICTORY = "victory"
+    DEFEAT = "defeat"
+
+@dataclass
+class BattleEvent:
+    """Something that happened during a battle turn"""
+    kind: str  # "attack", "special", "heal", "location", "enemy_attack" or "ability"
+    message: str
+    amount: int = 0
+    source: Optional[str] = None  # Location special effect or enemy ability
+    target: Optional[int] = None  # Wave enemy the event hit
+
+def create_enemy(player: Character, location: Optional[Location] = None, rng=random) -> Character:
+    """Create enemy scaled to player's progress (rng: the random module or a seeded random.Random)"""
+    if location and location.enemies:
+        enemy_name = rng.choice(location.enemies)
+    else:
+        enemy_name = rng.choice(BASIC_ENEMIES)
+    
+    enemy = Character(enemy_name, "Enemy", 700, 400)
+    enemy.health, enemy.attack, enemy.defense = roll_enemy_stats(player, location, enemy.enemy_type, rng)
+    enemy.max_health = enemy.health
+    enemy.weapon = enemy.enemy_type.weapon
+    enemy.name = enemy_title(player) + enemy_name
+    return enemy
+
+def roll_enemy_stats(player: Character, location: Optional[Location], enemy_type: "EnemyType",
+                     rng=random) -> Tuple[float, float, float]:
+    """Health, attack and defense for one enemy, scaled to the player's progress"""
+    # Scale enemy strength
+    level_multiplier = 1 + (player.victories * 0.05)
+    victory_bonus = player.victories * 1.5
+    
+    # Extra difficulty for locked locations
+    if location and location.name in ["Battle of Druids", "Bot Attack"]:
+        level_multiplier *= 1.5
+        victory_bonus += 20
+    
+    # Base stats plus the enemy type's modifiers
+    base_health = rng.randint(60, 80) + enemy_type.health
+    base_attack = rng.randint(15, 25) + enemy_type.attack
+    base_defense = rng.randint(8, 15) + enemy_type.defense
+    
+    # Apply scaling
+    return (int(base_health * level_multiplier) + victory_bonus,
+            int(base_attack * level_multiplier) + (victory_bonus // 2),
+            int(base_defense * level_multiplier) + (victory_bonus // 3))
+
+def enemy_title(player: Character) -> str:
+    """Name prefix enemies get as the player racks up victories"""
+    if player.victories >= 10:
+        return "Elite "
+    elif player.victories >= 5:
+        return "Veteran "
+    elif player.victories >= 2:
+        return "Tough "
+    return ""
+
+def create_encounter(player: Character, location: Optional[Location] = None,
+                     rng=random) -> Union[Character, "EnemyWave"]:
+    """The opposition for a battle: one enemy, or a wave at locations with a wave_size above one"""
+    if location and location.wave_size[1] > 1:
+        return create_wave(player, location, rng)
+    return create_enemy(player, location, rng)
+
+def award_victory(player: Character, location: Optional[Location] = None, rng=random) -> Tuple[int, int]:
+    """Grant victory rewards to the player, returns (shards, gold)"""
+    player.victories += 1
+    base_shards = rng.randint(20, 35)
+    base_gold = rng.randint(15, 25)
+    
+    # Victory bonus based on total victories
+    victory_bonus_shards = player.victories * 2
+    victory_bonus_gold = player.victories
+    
+    # Location bonus for special areas
+    location_multiplier = 1.0
+    if location and location.name in ["Battle of Druids", "Bot Attack"]:
+        location_multiplier = 2.0
+    elif location and location.name in ["Mansion", "Maze"]:
+        location_multiplier = 1.5
+    
+    total_shards = int((base_shards + victory_bonus_shards) * location_multiplier)
+    total_gold = int((base_gold + victory_bonus_gold) * location_multiplier)
+    
+    player.dragon_shards += total_shards
+    player.gold += total_gold
+    return total_shards, total_gold
 
-def draw_location_background(location: Optional[Location]):
-    """Draw location-specific background"""
-    if location is None:
-        draw_background()
-        return
+class BattleState:
+    """Pure combat rules for a single fight - no drawing, sound or input
     
-    bg_color = location.background_color
+    Every roll goes through self.rng, so a seeded random.Random makes the
+    whole fight reproducible from its actions. The opposition is either one
+    Character or an EnemyWave; in a wave battle actions hit self.target.
+    """
     
-    if location.special_effect == "haunted":
-        # Dark, spooky gradient
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(bg_color[0] * (1 - color_ratio * 0.5))
-            g = int(bg_color[1] * (1 - color_ratio * 0.5))
-            b = int(bg_color[2] * (1 + color_ratio * 0.3))
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def __init__(self, player: Character, enemy: Union[Character, "EnemyWave"],
+                 location: Optional[Location] = None, rng=random):
+        self.player = player
+        self.enemy = enemy
+        self.wave = enemy if isinstance(enemy, EnemyWave) else None
+        self.target = 0
+        self.location = location
+        self.rng = rng
+        self.turn = 0
+        self.outcome: Optional[BattleOutcome] = None
+        self.rewards: Tuple[int, int] = (0, 0)
+    
+    @property
+    def is_over(self) -> bool:
+        return self.outcome is not None
+    
+    @property
+    def enemy_name(self) -> str:
+        return self.enemy.name
+    
+    @property
+    def enemy_health(self) -> float:
+        return self.wave.total_health() if self.wave else self.enemy.health
+    
+    def step(self, action: BattleAction, target: int = 0) -> List[BattleEvent]:
+        """Resolve one full turn (player action, location effect, enemy reply)
         
-        # Add spooky effects
-        for i in range(10):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT // 2)
-            pygame.draw.circle(screen, (100, 100, 150), (x, y), random.randint(2, 5))
+        target picks the wave enemy to attack; a defeated one is skipped for the next alive.
+        """
+        if self.is_over:
+            raise ValueError("Battle is already over")
+        
+        self.turn += 1
+        if self.wave:
+            return self._wave_step(action, target)
+        events = [self._player_action(action)]
+        
+        location_event = self._location_effect()
+        if location_event:
+            events.append(location_event)
+        
+        # Check if enemy defeated
+        if self.enemy.health <= 0:
+            self._win()
+            return events
+        
+        # Enemy turn
+        enemy_damage = self.enemy.attack_enemy(self.player, self.rng)
+        events.append(BattleEvent("enemy_attack", f"{self.enemy.name} attacks for {enemy_damage} damage!", enemy_damage))
+        
+        ability_event = self._enemy_ability(enemy_damage)
+        if ability_event:
+            events.append(ability_event)
+        
+        if self.player.health <= 0:
+            self.outcome = BattleOutcome.DEFEAT
+        return events
     
-    elif location.special_effect == "water":
-        # Blue water gradient
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(bg_color[0])
-            g = int(bg_color[1] + 20 * color_ratio)
-            b = int(bg_color[2] + 40 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def _wave_step(self, action: BattleAction, target: int) -> List[BattleEvent]:
+        wave = self.wave
+        self.target = target if wave.is_alive(target) else wave.next_alive(target)
+        events = [self._wave_player_action(action)]
         
-        # Add water effects
-        for i in range(15):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT)
-            pygame.draw.circle(screen, (30, 50, 100), (x, y), random.randint(3, 8))
+        location_event = self._location_effect()
+        if location_event:
+            events.append(location_event)
+        
+        if not wave.alive_count():
+            self._win()
+            return events
+        
+        self.target = wave.next_alive(self.target)
+        events.append(self._wave_enemy_turn())
+        if self.player.health <= 0:
+            self.outcome = BattleOutcome.DEFEAT
+        return events
     
-    elif location.special_effect == "fire":
-        # Red/orange fire gradient
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(bg_color[0] + 40 * color_ratio)
-            g = int(bg_color[1] + 20 * color_ratio)
-            b = int(bg_color[2])
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def _win(self):
+        # Track location victory
+        if self.location:
+            location_key = self.location.name.lower().replace(" ", "_")
+            if location_key not in self.player.location_victories:
+                self.player.location_victories[location_key] = 0
+            self.player.location_victories[location_key] += 1
         
-        # Add lava bubbles
-        for i in range(8):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT)
-            pygame.draw.circle(screen, (255, 100, 0), (x, y), random.randint(4, 10))
+        self.rewards = award_victory(self.player, self.location, self.rng)
+        self.outcome = BattleOutcome.VICTORY
     
-    elif location.special_effect == "divine":
-        # Purple mystical gradient
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(bg_color[0] + 30 * math.sin(color_ratio * 3.14))
-            g = int(bg_color[1])
-            b = int(bg_color[2] + 40 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def _wave_player_action(self, action: BattleAction) -> BattleEvent:
+        """Attack the target, or hit the whole wave with the special (splash for everyone but the target)"""
+        player, wave, target = self.player, self.wave, self.target
+        if action == BattleAction.HEAL:
+            heal_amount = player.heal(self.rng)
+            return BattleEvent("heal", f"{player.name} heals for {heal_amount} HP!", heal_amount)
         
-        # Add divine light effects
-        for i in range(12):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT // 3)
-            pygame.draw.circle(screen, (200, 200, 255), (x, y), random.randint(2, 6))
+        player.is_attacking = True
+        player.attack_timer = 30
+        if action == BattleAction.ATTACK:
+            damage = max(1, self.rng.randint(int(player.attack * 0.8), int(player.attack * 1.2)) - int(wave.defense[target]))
+            wave.hurt(target, damage)
+            return BattleEvent("attack", f"{player.name} attacks {wave.label(target)} for {damage} damage!",
+                               damage, target=target)
+        
+        roll = self.rng.randint(int(player.attack * 1.2), int(player.attack * 1.5))
+        damage = max(1, roll - int(wave.defense[target]))
+        wave.hurt(target, damage)
+        total, hits = damage, 1
+        splash = roll * WAVE_SPLASH
+        for i in wave.alive_indices():
+            if i != target:
+                splash_damage = max(1, int(splash - wave.defense[i]))
+                wave.hurt(i, splash_damage)
+                total += splash_damage
+                hits += 1
+        return BattleEvent("special", f"{player.name} uses {player.special} on {hits} enemies for {total} damage!",
+                           damage, target=target)
     
-    else:
-        # Default background for other locations
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(bg_color[0] * (1 - color_ratio * 0.3) + 20 * color_ratio)
-            g = int(bg_color[1] * (1 - color_ratio * 0.3) + 15 * color_ratio)
-            b = int(bg_color[2] * (1 - color_ratio * 0.3) + 25 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def _wave_enemy_turn(self) -> BattleEvent:
+        """Every surviving wave enemy attacks, resolved in one pass over the stat columns"""
+        wave = self.wave
+        randint = self.rng.randint
+        player_defense = self.player.defense
+        attack, flags = wave.attack, wave.flags
+        total = attackers = 0
+        for i in range(len(wave)):
+            if flags[i] & EnemyWave.ALIVE:
+                total += max(1, randint(int(attack[i] * 0.8), int(attack[i] * 1.2)) - int(player_defense))
+                attackers += 1
+        self.player.health -= total
+        return BattleEvent("enemy_attack", f"{attackers} enemies attack for {total} damage!", total)
+    
+    def _damage_enemy(self, amount: int):
+        if self.wave:
+            self.wave.hurt(self.target, amount)
+        else:
+            self.enemy.health -= amount
+    
+    def _player_action(self, action: BattleAction) -> BattleEvent:
+        player = self.player
+        if action == BattleAction.ATTACK:
+            damage = player.attack_enemy(self.enemy, self.rng)
+            return BattleEvent("attack", f"{player.name} attacks for {damage} damage!", damage)
+        elif action == BattleAction.SPECIAL:
+            damage = player.special_attack(self.enemy, self.rng)
+            return BattleEvent("special", f"{player.name} uses {player.special} for {damage} damage!", damage)
+        else:
+            heal_amount = player.heal(self.rng)
+            return BattleEvent("heal", f"{player.name} heals for {heal_amount} HP!", heal_amount)
+    
+    def _location_effect(self) -> Optional[BattleEvent]:
+        """Roll the location's special effect proc"""
+        if not self.location or not self.location.special_effect:
+            return None
+        
+        effect = self.location.special_effect
+        target = self.target if self.wave else None
+        if effect == "haunted" and self.rng.randint(1, 10) == 1:
+            if self.wave:
+                self.wave.weaken(5)
+            else:
+                self.enemy.attack = max(1, self.enemy.attack - 5)
+            return BattleEvent("location", "👻 Spooky presence weakens the enemy!", 5, effect)
+        elif effect == "fire" and self.rng.randint(1, 8) == 1:
+            self._damage_enemy(10)
+            return BattleEvent("location", "🔥 Lava burst damages enemy!", 10, effect, target)
+        elif effect == "divine" and self.rng.randint(1, 12) == 1:
+            heal_amount = 15
+            self.player.health = min(self.player.max_health, self.player.health + heal_amount)
+            return BattleEvent("location", "✨ Divine blessing heals you!", heal_amount, effect)
+        elif effect == "water" and self.rng.randint(1, 6) == 1:
+            self._damage_enemy(10)
+            return BattleEvent("location", "🌊 Tidal wave boosts your attack!", 10, effect, target)
+        elif effect == "ruins" and self.rng.randint(1, 10) == 1:
+            self._damage_enemy(8)
+            return BattleEvent("location", "⚡ Ancient magic amplifies your power!", 8, effect, target)
+        return None
+    
+    def _enemy_ability(self, enemy_damage: int) -> Optional[BattleEvent]:
+        """Roll the enemy's special ability after its attack"""
+        enemy_type = self.enemy.enemy_type
+        if enemy_type and enemy_type.ability and self.rng.randint(1, enemy_type.ability_chance) == 1:
+            return enemy_type.ability(self, enemy_damage)
+        return None
 
-def draw_shop_background():
-    """Draw shop background"""
-    if assets.shop_background:
-        screen.blit(assets.shop_background, (0, 0))
-    else:
-        # Fallback shop background
-        for y in range(SCREEN_HEIGHT // 2, SCREEN_HEIGHT):
-            color_ratio = (y - SCREEN_HEIGHT // 2) / (SCREEN_HEIGHT // 2)
-            r = int(101 + 20 * color_ratio)
-            g = int(67 + 15 * color_ratio)
-            b = int(33 + 10 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
-        
-        for y in range(0, SCREEN_HEIGHT // 2):
-            color_ratio = y / (SCREEN_HEIGHT // 2)
-            r = g = int(80 + 30 * color_ratio)
-            b = int(90 + 20 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+# ==================== ENEMY REGISTRY ====================
+ENEMY_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "enemies.json")
 
-def draw_world_map_background():
-    """Draw world map background"""
-    if assets.world_map_background:
-        screen.blit(assets.world_map_background, (0, 0))
-    else:
-        # Fallback world map style background
-        # Ocean blue gradient
-        for y in range(SCREEN_HEIGHT):
-            color_ratio = y / SCREEN_HEIGHT
-            r = int(0 + 30 * color_ratio)
-            g = int(50 + 70 * color_ratio)
-            b = int(100 + 55 * color_ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
-        
-        # Draw some land masses
-        pygame.draw.ellipse(screen, (34, 139, 34), (100, 150, 300, 200))  # Forest green
-        pygame.draw.ellipse(screen, (160, 82, 45), (500, 100, 400, 300))  # Brown mountains
-        pygame.draw.ellipse(screen, (34, 139, 34), (800, 350, 350, 250))  # More forest
-        pygame.draw.ellipse(screen, (244, 164, 96), (200, 450, 250, 150))  # Sandy area
+def _ability_life_steal(battle: BattleState, enemy_damage: int) -> BattleEvent:
+    steal_amount = enemy_damage // 2
+    enemy = battle.enemy
+    enemy.health = min(enemy.max_health, enemy.health + steal_amount)
+    return BattleEvent("ability", f"🧛 {enemy.name} steals {steal_amount} life!", steal_amount, "life_steal")
+
+def _ability_phase(battle: BattleState, enemy_damage: int) -> BattleEvent:
+    # Reduces player defense for the rest of the fight
+    battle.player.defense = max(0, battle.player.defense - 2)
+    return BattleEvent("ability", f"👻 {battle.enemy.name} phases through armor! Defense reduced!", 2, "phase")
+
+def _ability_burn(battle: BattleState, enemy_damage: int) -> BattleEvent:
+    burn_damage = 5
+    battle.player.health -= burn_damage
+    return BattleEvent("ability", f"🔥 {battle.enemy.name} burns you for {burn_damage} damage!", burn_damage, "burn")
+
+def _ability_rage(battle: BattleState, enemy_damage: int) -> BattleEvent:
+    battle.enemy.attack += 3
+    return BattleEvent("ability", f"💢 {battle.enemy.name} enters a rage! Attack increased!", 3, "rage")
+
+def _ability_stone_skin(battle: BattleState, enemy_damage: int) -> BattleEvent:
+    battle.enemy.defense += 5
+    return BattleEvent("ability", f"🗿 {battle.enemy.name} hardens! Defense increased!", 5, "stone_skin")
+
+# Ability hooks that enemies.json can refer to by name
+ENEMY_ABILITIES = {
+    "life_steal": _ability_life_steal,
+    "phase": _ability_phase,
+    "burn": _ability_burn,
+    "rage": _ability_rage,
+    "stone_skin": _ability_stone_skin,
+}
+
+@dataclass(frozen=True)
+class EnemyType:
+    """Everything the game needs about an enemy, resolved once from enemies.json"""
+    name: str
+    sprite: str
+    color: Tuple[int, int, int]
+    weapon: str
+    shape: str
+    health: int = 0  # Stat modifiers added to the base rolls
+    attack: int = 0
+    defense: int = 0
+    ability: Optional[Callable[[BattleState, int], BattleEvent]] = None
+    ability_chance: int = 0  # 1 in N per enemy attack
+
+def _build_enemy_type(name: str, entry: Dict, default: Dict) -> EnemyType:
+    sprite = entry.get("sprite", name.lower().replace(" ", "_"))
+    stats = entry.get("stats", {})
+    ability = entry.get("ability")
+    if ability and ability not in ENEMY_ABILITIES:
+        print(f"⚠️  Unknown ability '{ability}' for {name} in enemies.json")
+        ability = None
+    return EnemyType(
+        name=name,
+        sprite=sprite if sprite in CHARACTER_IMAGE_FILES else "goblin",
+        color=tuple(entry.get("color", default["color"])),
+        weapon=entry.get("weapon", default["weapon"]),
+        shape=entry.get("shape", default["shape"]),
+        health=stats.get("health", 0),
+        attack=stats.get("attack", 0),
+        defense=stats.get("defense", 0),
+        ability=ENEMY_ABILITIES[ability] if ability else None,
+        ability_chance=entry.get("ability_chance", 1) if ability else 0,
+    )
+
+def load_enemy_registry(path: str = ENEMY_DATA_FILE) -> Tuple[Dict[str, EnemyType], List[str], Dict]:
+    """Read the enemy catalog, returns (types by name, basic enemy names, default entry)"""
+    default = {"color": list(RED), "weapon": "Crude Weapon", "shape": "default"}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not load {os.path.basename(path)} ({e}). Enemies will use default stats.")
+        return {}, ["Goblin", "Dark Mage", "Skeleton", "Orc"], default
+    
+    default.update(data.get("default", {}))
+    types = {name: _build_enemy_type(name, entry, default) for name, entry in data.get("enemies", {}).items()}
+    return types, data.get("basic_enemies", list(types)[:4]), default
+
+ENEMY_TYPES, BASIC_ENEMIES, _ENEMY_DEFAULT = load_enemy_registry()
+
+def get_enemy_type(name: str) -> EnemyType:
+    """Registry entry for an enemy, built from the defaults (and cached) for unknown names"""
+    enemy_type = ENEMY_TYPES.get(name)
+    if enemy_type is None:
+        enemy_type = ENEMY_TYPES[name] = _build_enemy_type(name, {}, _ENEMY_DEFAULT)
+    return enemy_type
+
+# ==================== ENEMY WAVES ====================
+WAVE_STRENGTH = 2.0   # A whole wave is worth this many lone enemies, split evenly between its members
+WAVE_SPLASH = 0.5     # Share of a special attack's roll that also hits every other enemy in the wave
+WAVE_AREA = pygame.Rect(620, 310, 760, 270)  # Battle screen region the wave is laid out in
+WAVE_COLUMNS = 5
+
+class EnemyWave:
+    """A group of enemies stored as parallel stat columns instead of Character objects
+    
+    Row i of every column is one enemy. kind[i] indexes self.types, so drawing
+    needs one cached sprite per enemy type however large the wave is.
+    Abilities from enemies.json only apply to single enemies.
+    """
+    
+    ALIVE = 1
+    WEAKENED = 2  # Attack lowered by a haunted location
+    
+    def __init__(self, name: str, title: str = ""):
+        self.name = name
+        self.title = title
+        self.types: List[EnemyType] = []
+        self.kind = array("B")
+        self.health = array("d")
+        self.max_health = array("d")
+        self.attack = array("d")
+        self.defense = array("d")
+        self.flags = array("B")
+        self.positions: List[Tuple[int, int]] = []
+        self.sprite_size = 120
+    
+    def __len__(self) -> int:
+        return len(self.kind)
+    
+    def add(self, enemy_type: EnemyType, health: float, attack: float, defense: float):
+        if enemy_type not in self.types:
+            self.types.append(enemy_type)
+        self.kind.append(self.types.index(enemy_type))
+        self.health.append(health)
+        self.max_health.append(health)
+        self.attack.append(attack)
+        self.defense.append(defense)
+        self.flags.append(self.ALIVE)
+        self._layout()
+    
+    def label(self, index: int) -> str:
+        return f"{self.title}{self.types[self.kind[index]].name} #{index + 1}"
+    
+    def is_alive(self, index: int) -> bool:
+        return 0 <= index < len(self) and bool(self.flags[index] & self.ALIVE)
+    
+    def alive_indices(self) -> List[int]:
+        return [i for i, flags in enumerate(self.flags) if flags & self.ALIVE]
+    
+    def alive_count(self) -> int:
+        return sum(flags & self.ALIVE for flags in self.flags)
+    
+    def next_alive(self, index: int) -> int:
+        """index if that enemy still stands, otherwise the next one that does (wrapping around)"""
+        count = len(self)
+        for offset in range(count):
+            candidate = (index + offset) % count
+            if self.flags[candidate] & self.ALIVE:
+                return candidate
+        return index
+    
+    def total_health(self) -> float:
+        return sum(max(0.0, health) for health in self.health)
+    
+    def hurt(self, index: int, amount: float):
+        self.health[index] -= amount
+        if self.health[index] <= 0:
+            self.flags[index] &= ~self.ALIVE
+    
+    def weaken(self, amount: float):
+        for i in self.alive_indices():
+            self.attack[i] = max(1, self.attack[i] - amount)
+            self.flags[i] |= self.WEAKENED
+    
+    def _layout(self):
+        """Grid positions and sprite size that fit the whole wave into WAVE_AREA"""
+        count = len(self)
+        columns = min(count, WAVE_COLUMNS)
+        rows = (count + columns - 1) // columns
+        cell_w = WAVE_AREA.width // columns
+        cell_h = WAVE_AREA.height // rows
+        self.sprite_size = max(24, min(CHARACTER_SPRITE_SIZE[0], cell_w - 20, cell_h - 20))
+        self.positions = [(WAVE_AREA.x + (i % columns) * cell_w + cell_w // 2,
+                           WAVE_AREA.y + (i // columns) * cell_h + (cell_h - 10) // 2) for i in range(count)]
+    
+    def hit_test(self, pos: Tuple[int, int]) -> Optional[int]:
+        """Index of the standing enemy under a canvas position"""
+        half = self.sprite_size // 2
+        for i, (x, y) in enumerate(self.positions):
+            if self.flags[i] & self.ALIVE and abs(pos[0] - x) <= half and abs(pos[1] - y) <= half:
+                return i
+        return None
+    
+    def draw(self, screen, target: int, offset: Tuple[int, int] = (0, 0)):
+        """Draw every standing enemy with a health bar, and a frame around the target"""
+        size = self.sprite_size
+        half = size // 2
+        sprites = []
+        for enemy_type in self.types:
+            sprite_key = "goblin" if enemy_type.sprite in assets.missing_images else enemy_type.sprite
+            sprites.append(assets.get_scaled_image(sprite_key, (size, size), quality.smooth_scaling))
+        
+        off_x, off_y = offset
+        blits = []
+        for i in self.alive_indices():
+            x, y = self.positions[i]
+            x += off_x
+            y += off_y
+            sprite = sprites[self.kind[i]]
+            if sprite:
+                blits.append((sprite, (x - half, y - half)))
+            else:
+                pygame.draw.circle(screen, self.types[self.kind[i]].color, (x, y), half - 4)
+            
+            # Health bar under the sprite
+            ratio = max(0.0, self.health[i] / self.max_health[i])
+            bar = pygame.Rect(x - half, y + half + 2, size, 6)
+            pygame.draw.rect(screen, RED, bar)
+            pygame.draw.rect(screen, GREEN, (bar.x, bar.y, int(size * ratio), bar.height))
+            if i == target:
+                pygame.draw.rect(screen, GOLD, (x - half - 4, y - half - 4, size + 8, size + 16), 3)
+        screen.blits(blits, False)
+        
+        if self.positions:
+            label = text_cache.render(text_font, f"{self.name} - {self.alive_count()} left", True, WHITE)
+            label_rect = label.get_rect(midtop=(WAVE_AREA.centerx + off_x, WAVE_AREA.bottom + off_y - 6))
+            screen.blit(label, label_rect)
+            dirty_rects.mark(WAVE_AREA.inflate(40, 40).move(off_x, off_y).union(label_rect))
+
+def create_wave(player: Character, location: Location, rng=random) -> EnemyWave:
+    """Roll a wave of location enemies; each gets its share of WAVE_STRENGTH lone enemies"""
+    count = rng.randint(*location.wave_size)
+    share = WAVE_STRENGTH / count
+    armor = min(1.0, share)  # Full defense would leave most hits on a small enemy at the 1 damage floor
+    wave = EnemyWave(f"{location.name} Horde", enemy_title(player))
+    for _ in range(count):
+        enemy_type = get_enemy_type(rng.choice(location.enemies))
+        health, attack, defense = roll_enemy_stats(player, location, enemy_type, rng)
+        wave.add(enemy_type, max(1, int(health * share)), max(1, int(attack * share)), int(defense * armor))
+    return wave
+
+# ==================== SAVE GAMES ====================
+SAVE_DIR = "saves"
+SAVE_SLOTS = 3
+SAVE_MAGIC = b"BOTD"
+SAVE_VERSION = 1
+
+# File layout: header, then chunks of (tag, payload length, CRC32, payload).
+# Readers seek past chunks they don't need, so large future chunks (battle
+# history, replays) never slow down loading or the slot list.
+SAVE_HEADER = struct.Struct("<4sH")    # magic, format version
+SAVE_CHUNK = struct.Struct("<4sII")    # tag, payload length, CRC32
+SAVE_STATS = struct.Struct("<dddqqqqqq")  # saved_at, health, max_health, attack, defense, speed, shards, gold, victories
+
+def save_path(slot: int) -> str:
+    return os.path.join(SAVE_DIR, f"slot{slot}.sav")
+
+def _pack_str(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+def _unpack_str(payload: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from("<H", payload, offset)
+    offset += 2
+    return payload[offset:offset + length].decode("utf-8"), offset + length
+
+def _restore_number(value: float):
+    """Doubles that hold whole numbers come back as ints, like they were saved"""
+    return int(value) if value.is_integer() else value
+
+def _chunk(tag: bytes, payload: bytes) -> bytes:
+    return SAVE_CHUNK.pack(tag, len(payload), zlib.crc32(payload)) + payload
+
+def encode_character(player: Character) -> bytes:
+    """The player as a CHAR chunk payload"""
+    parts = [SAVE_STATS.pack(time.time(), player.health, player.max_health, player.attack, player.defense,
+                             player.speed, player.dragon_shards, player.gold, player.victories)]
+    for text in (player.name, player.char_type, player.weapon, player.special):
+        parts.append(_pack_str(text))
+    parts.append(struct.pack("<H", len(player.location_victories)))
+    for location_key, count in player.location_victories.items():
+        parts.append(_pack_str(location_key) + struct.pack("<I", count))
+    return b"".join(parts)
+
+def encode_save(player: Character) -> bytes:
+    """Serialize the player into the binary save format"""
+    return SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION) + _chunk(b"CHAR", encode_character(player))
+
+class OutdatedFileError(ValueError):
+    """A readable file written in a format this game no longer accepts"""
+
+def _read_chunks(f, wanted: Tuple[bytes, ...], magic: bytes = SAVE_MAGIC,
+                 max_version: int = SAVE_VERSION, min_version: int = 1) -> Dict[bytes, bytes]:
+    """Read the wanted chunks from an open save (or replay) file, skipping the rest"""
+    file_magic, version = SAVE_HEADER.unpack(f.read(SAVE_HEADER.size))
+    if file_magic != magic:
+        raise ValueError(f"not a Battle of the Druids {'save' if magic == SAVE_MAGIC else 'replay'} file")
+    if version > max_version:
+        raise ValueError(f"file format {version} is newer than this game supports ({max_version})")
+    if version < min_version:
+        raise OutdatedFileError(f"file format {version} is outdated, this game needs format {min_version} or newer")
+    
+    chunks = {}
+    while True:
+        header = f.read(SAVE_CHUNK.size)
+        if not header:
+            return chunks
+        tag, length, crc = SAVE_CHUNK.unpack(header)
+        if tag not in wanted:
+            f.seek(length, os.SEEK_CUR)
+            continue
+        payload = f.read(length)
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError(f"{tag.decode()} chunk is corrupt")
+        chunks[tag] = payload
+
+def _decode_character(payload: bytes) -> Tuple[Character, float]:
+    """Rebuild the player from a CHAR chunk, returns (player, saved_at)"""
+    saved_at, health, max_health, attack, defense, speed, shards, gold, victories = SAVE_STATS.unpack_from(payload)
+    offset = SAVE_STATS.size
+    name, offset = _unpack_str(payload, offset)
+    char_type, offset = _unpack_str(payload, offset)
+    weapon, offset = _unpack_str(payload, offset)
+    special, offset = _unpack_str(payload, offset)
+    
+    player = Character(name, char_type, 200, 400)
+    player.health = _restore_number(health)
+    player.max_health = _restore_number(max_health)
+    player.attack, player.defense, player.speed = attack, defense, speed
+    player.dragon_shards, player.gold, player.victories = shards, gold, victories
+    player.weapon, player.special = weapon, special
+    
+    (count,) = struct.unpack_from("<H", payload, offset)
+    offset += 2
+    for _ in range(count):
+        location_key, offset = _unpack_str(payload, offset)
+        (player.location_victories[location_key],) = struct.unpack_from("<I", payload, offset)
+        offset += 4
+    return player, saved_at
+
+def read_save(path: str) -> Tuple[Character, float]:
+    """Load a save file, returns (player, saved_at); raises ValueError if unreadable"""
+    with open(path, "rb") as f:
+        try:
+            chunks = _read_chunks(f, (b"CHAR",))
+            if b"CHAR" not in chunks:
+                raise ValueError("save has no character data")
+            return _decode_character(chunks[b"CHAR"])
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"save is truncated or damaged ({e})")
+
+def write_save_file(path: str, data: bytes):
+    """Write atomically: a crash mid-write leaves the previous save intact"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def list_saves() -> Dict[int, Tuple[Character, float]]:
+    """Readable saves by slot number"""
+    saves = {}
+    for slot in range(1, SAVE_SLOTS + 1):
+        if os.path.exists(save_path(slot)):
+            try:
+                saves[slot] = read_save(save_path(slot))
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Skipping save slot {slot}: {e}")
+    return saves
+
+def first_free_slot() -> int:
+    """Empty slot for a new game, or the least recently written one if all are taken"""
+    for slot in range(1, SAVE_SLOTS + 1):
+        if not os.path.exists(save_path(slot)):
+            return slot
+    return min(range(1, SAVE_SLOTS + 1), key=lambda slot: os.path.getmtime(save_path(slot)))
+
+def player_to_dict(player: Character) -> Dict:
+    """Plain-data view of the saved fields (JSON export for debugging)"""
+    return {
+        "format_version": SAVE_VERSION,
+        "name": player.name,
+        "char_type": player.char_type,
+        "health": player.health,
+        "max_health": player.max_health,
+        "attack": player.attack,
+        "defense": player.defense,
+        "speed": player.speed,
+        "dragon_shards": player.dragon_shards,
+        "gold": player.gold,
+        "victories": player.victories,
+        "location_victories": dict(player.location_victories),
+        "weapon": player.weapon,
+        "special": player.special,
+    }
+
+class AutoSaver:
+    """Background autosave: the player is encoded on the caller's thread (microseconds),
+    the disk write and fsync happen on a single worker thread so writes stay in order"""
+    
+    def __init__(self):
+        self.slot = 1
+        self.executor = None
+    
+    def save(self, player: Character):
+        self.submit(self._write, save_path(self.slot), encode_save(player))
+    
+    def submit(self, func, *args):
+        """Run func(*args) on the background writer thread, after earlier writes"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self.executor.submit(func, *args)
+    
+    @staticmethod
+    def _write(path: str, data: bytes):
+        try:
+            write_save_file(path, data)
+        except OSError as e:
+            print(f"⚠️  Autosave failed: {e}")
+    
+    def flush(self):
+        """Wait for queued writes to reach the disk"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+# Create global autosaver (slot is chosen at startup)
+autosaver = AutoSaver()
+
+# ==================== BATTLE REPLAYS ====================
+REPLAY_DIR = "replays"
+REPLAY_MAGIC = b"BOTR"
+REPLAY_VERSION = 2
+REPLAY_MIN_VERSION = 2    # Format 1 replays predate wave battles, so Castle and Bot Attack fights no longer replay
+REPLAY_KEEP = 50          # Most recent battles kept on disk
+REPLAY_TURN_FRAMES = 45   # Frames between actions during real-time playback
+REPLAY_ACTIONS = list(BattleAction)  # Action code in the log = index in this list
+REPLAY_OUTCOMES = [None, BattleOutcome.VICTORY, BattleOutcome.DEFEAT]
+REPLAY_RUN = struct.Struct("<QI")      # seed, action count (followed by location name and one byte per action)
+REPLAY_RESULT = struct.Struct("<BIdd")  # outcome code, turns, player health, enemy health
+# Wave battles add a TRGT chunk: one target index byte per action
+
+def start_battle(player: Character, location: Optional[Location], seed: int) -> BattleState:
+    """Create the enemy and engine from one seeded RNG, so seed + actions reproduce the fight"""
+    rng = random.Random(seed)
+    return BattleState(player, create_encounter(player, location, rng), location, rng)
+
+@dataclass
+class BattleReplay:
+    """Compact battle log: the player as they entered, the seed and each turn's action"""
+    player_snapshot: bytes  # CHAR chunk payload
+    location_name: str
+    seed: int
+    actions: List[BattleAction] = field(default_factory=list)
+    targets: List[int] = field(default_factory=list)  # Wave enemy picked for each action
+    outcome: Optional[BattleOutcome] = None
+    turns: int = 0
+    player_health: float = 0.0
+    enemy_health: float = 0.0
+    
+    @classmethod
+    def record(cls, player: Character, location: Optional[Location]) -> "BattleReplay":
+        """Start recording a new battle with a fresh seed"""
+        return cls(encode_character(player), location.name if location else "", random.getrandbits(63))
+    
+    def restore(self) -> Tuple[Character, Optional[Location]]:
+        """Fresh copy of the recorded player and the battle's location"""
+        player, _ = _decode_character(self.player_snapshot)
+        location = next((loc for loc in get_world_locations().values() if loc.name == self.location_name), None)
+        return player, location
+    
+    def finish(self, battle: BattleState):
+        """Record the result so playback can be checked against it"""
+        self.outcome = battle.outcome
+        self.turns = battle.turn
+        self.player_health = battle.player.health
+        self.enemy_health = battle.enemy_health
+    
+    def target(self, turn: int) -> int:
+        return self.targets[turn] if turn < len(self.targets) else 0
+
+def encode_replay(replay: BattleReplay) -> bytes:
+    run = (REPLAY_RUN.pack(replay.seed, len(replay.actions)) + _pack_str(replay.location_name) +
+           bytes(REPLAY_ACTIONS.index(action) for action in replay.actions))
+    result = REPLAY_RESULT.pack(REPLAY_OUTCOMES.index(replay.outcome), replay.turns,
+                                replay.player_health, replay.enemy_health)
+    data = (SAVE_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION) + _chunk(b"CHAR", replay.player_snapshot) +
+            _chunk(b"RPLY", run) + _chunk(b"RSLT", result))
+    if any(replay.targets):
+        data += _chunk(b"TRGT", bytes(replay.targets))
+    return data
+
+def read_replay(path: str) -> BattleReplay:
+    """Load a replay file; raises ValueError if unreadable"""
+    with open(path, "rb") as f:
+        try:
+            chunks = _read_chunks(f, (b"CHAR", b"RPLY", b"RSLT", b"TRGT"), REPLAY_MAGIC, REPLAY_VERSION,
+                                  REPLAY_MIN_VERSION)
+            seed, count = REPLAY_RUN.unpack_from(chunks[b"RPLY"])
+            location_name, offset = _unpack_str(chunks[b"RPLY"], REPLAY_RUN.size)
+            actions = [REPLAY_ACTIONS[code] for code in chunks[b"RPLY"][offset:offset + count]]
+            replay = BattleReplay(chunks[b"CHAR"], location_name, seed, actions, list(chunks.get(b"TRGT", b"")))
+            if b"RSLT" in chunks:
+                outcome, replay.turns, replay.player_health, replay.enemy_health = REPLAY_RESULT.unpack(chunks[b"RSLT"])
+                replay.outcome = REPLAY_OUTCOMES[outcome]
+            return replay
+        except (KeyError, IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"replay is truncated or damaged ({e!r})")
+
+def _store_replay(path: str, data: bytes):
+    """Write a replay and drop the oldest ones beyond REPLAY_KEEP (runs on the autosave thread)"""
+    try:
+        write_save_file(path, data)
+        replays = sorted(name for name in os.listdir(REPLAY_DIR) if name.endswith(".rpl"))
+        for name in replays[:-REPLAY_KEEP]:
+            os.remove(os.path.join(REPLAY_DIR, name))
+    except OSError as e:
+        print(f"⚠️  Could not save replay: {e}")
+
+def save_replay(replay: BattleReplay):
+    """Queue a finished battle's replay for writing in the background"""
+    now = time.time()
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{replay.seed:016x}.rpl"
+    autosaver.submit(_store_replay, os.path.join(REPLAY_DIR, name), encode_replay(replay))
+
+def run_replay_headless(replay: BattleReplay) -> BattleState:
+    """Re-run a recorded battle at full speed with no rendering"""
+    player, location = replay.restore()
+    battle = start_battle(player, location, replay.seed)
+    for turn, action in enumerate(replay.actions):
+        if battle.is_over:
+            break
+        battle.step(action, replay.target(turn))
+    return battle
+
+def replay_matches(replay: BattleReplay, battle: BattleState) -> bool:
+    """Whether a re-run ended exactly like the recording"""
+    return (battle.outcome == replay.outcome and battle.turn == replay.turns and
+            battle.player.health == replay.player_health and battle.enemy_health == replay.enemy_health)
+
+def run_verify_replays_command(args: argparse.Namespace):
+    """--verify-replay: re-run replays headless and report any that no longer end the same way"""
+    paths = []
+    for path in args.verify_replay:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".rpl"))
+        else:
+            paths.append(path)
+    
+    mismatches = 0
+    outdated = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            replay = read_replay(path)
+        except OutdatedFileError as e:
+            print(f"⚠️  {path}: skipped, {e}")
+            outdated += 1
+            continue
+        except (OSError, ValueError) as e:
+            print(f"⚠️  {path}: {e}")
+            mismatches += 1
+            continue
+        battle = run_replay_headless(replay)
+        if not replay_matches(replay, battle):
+            mismatches += 1
+            recorded = replay.outcome.value if replay.outcome else "unfinished"
+            now = battle.outcome.value if battle.outcome else "unfinished"
+            print(f"⚠️  {path}: recorded {recorded} in {replay.turns} turns, now {now} in {battle.turn} turns")
+    elapsed = time.perf_counter() - start
+    
+    checked = len(paths) - outdated
+    print(f"✅ Re-ran {checked} replays in {elapsed:.2f}s, {checked - mismatches} match"
+          + (f" ({outdated} outdated skipped)" if outdated else ""))
+    if mismatches:
+        sys.exit(1)
 
 # ==================== GAME SCREENS ====================
+def loading_screen():
+    """Startup progress screen shown while the first assets are decoded"""
+    def draw_progress(done: int, total: int):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+        
+        draw_background()
+        
+        title_text = text_cache.render(title_font, "BATTLE OF THE DRUIDS", True, WHITE)
+        screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80)))
+        
+        # Progress bar
+        bar_rect = pygame.Rect(SCREEN_WIDTH // 2 - 300, SCREEN_HEIGHT // 2, 600, 30)
+        pygame.draw.rect(screen, DARK_GRAY, bar_rect)
+        pygame.draw.rect(screen, GOLD, (bar_rect.x, bar_rect.y, int(bar_rect.width * done / total), bar_rect.height))
+        pygame.draw.rect(screen, WHITE, bar_rect, 2)
+        
+        loading_text = text_cache.render(small_font, f"Loading... {done}/{total}", True, WHITE)
+        screen.blit(loading_text, loading_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60)))
+        
+        game_display.present()
+    
+    assets.load_startup_assets(draw_progress)
+
+def load_game_screen() -> Optional[Character]:
+    """Offer saved games to continue, returns None to start a new game"""
+    saves = list_saves()
+    if not saves:
+        return None
+    
+    buttons = []
+    for i, (slot, (saved_player, saved_at)) in enumerate(sorted(saves.items())):
+        label = (f"Slot {slot}: {saved_player.char_type} - {saved_player.victories} wins "
+                 f"({time.strftime('%b %d %H:%M', time.localtime(saved_at))})")
+        buttons.append((Button(350, 200 + i * 120, 700, 100, label, PURPLE), slot))
+    new_game_btn = Button(350, 200 + len(buttons) * 120, 700, 100, "New Game", GREEN)
+    
+    dirty_rects.invalidate()
+    events = pygame.event.get()
+    while True:
+        for event in events:
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            
+            for button, slot in buttons:
+                if button.handle_event(event):
+                    autosaver.slot = slot
+                    assets.start_music()
+                    return saves[slot][0]
+            
+            if new_game_btn.handle_event(event):
+                return None
+        
+        if dirty_rects.begin_frame():
+            draw_background()
+            
+            title_text = text_cache.render(title_font, "BATTLE OF THE DRUIDS", True, WHITE)
+            screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 80)))
+            
+            subtitle_text = text_cache.render(text_font, "Continue Your Adventure:", True, WHITE)
+            screen.blit(subtitle_text, subtitle_text.get_rect(center=(SCREEN_WIDTH // 2, 140)))
+            dirty_rects.capture()
+        
+        for button, _ in buttons:
+            button.draw(screen)
+        new_game_btn.draw(screen)
+        
+        dirty_rects.present()
+        events = wait_for_events()
+
 def character_selection_screen() -> Character:
     """Character selection screen"""
     characters = [
@@ -1001,8 +3286,10 @@ def character_selection_screen() -> Character:
         button = Button(350, 200 + i * 120, 700, 100, f"{char_type} - {description}")
         buttons.append((button, char_type))
     
+    dirty_rects.invalidate()
+    events = pygame.event.get()
     while True:
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1012,30 +3299,36 @@ def character_selection_screen() -> Character:
                     assets.start_music()
                     return Character(f"Hero {char_type}", char_type, 200, 400)
         
-        draw_background()
-        
-        title_text = title_font.render("BATTLE OF THE DRUIDS", True, WHITE)
-        title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 80))
-        screen.blit(title_text, title_rect)
-        
-        subtitle_text = text_font.render("Choose Your Character:", True, WHITE)
-        subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH // 2, 140))
-        screen.blit(subtitle_text, subtitle_rect)
+        if dirty_rects.begin_frame():
+            draw_background()
+            
+            title_text = text_cache.render(title_font, "BATTLE OF THE DRUIDS", True, WHITE)
+            title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 80))
+            screen.blit(title_text, title_rect)
+            
+            subtitle_text = text_cache.render(text_font, "Choose Your Character:", True, WHITE)
+            subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH // 2, 140))
+            screen.blit(subtitle_text, subtitle_rect)
+            dirty_rects.capture()
         
         for button, _ in buttons:
             button.draw(screen)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        dirty_rects.present()
+        events = wait_for_events()
 
 def world_map_screen(player: Character):
     """World map screen where player can move and select locations"""
     locations = get_world_locations()
+    world_map = WorldMap(locations)
     
     # Player starting position (center of map)
     map_player_x = 650
     map_player_y = 450
-    player_speed = 5
+    prev_player_x, prev_player_y = map_player_x, map_player_y  # Position before the last step
+    player_speed = 5  # Pixels per simulation step
+    timestep = FixedTimestep()
+    frame_ms = 0
     
     # UI
     back_btn = Button(50, 20, 150, 50, "← Back", GRAY)
@@ -1043,20 +3336,14 @@ def world_map_screen(player: Character):
     # Track if player is near a location
     current_location = None
     
-    def check_location_unlocked(loc_key: str) -> bool:
-        """Check if a location is unlocked"""
-        location = locations[loc_key]
-        if not location.unlock_requirements:
-            return True
-        
-        # Check if player has victories from all required locations
-        for req_loc in location.unlock_requirements:
-            req_key = req_loc.replace(" ", "_").replace("_track", "")
-            if req_key not in player.location_victories or player.location_victories[req_key] == 0:
-                return False
-        return True
+    # Decode enemy sprites in the background so entering a battle doesn't hitch
+    for location in locations.values():
+        assets.request_location_sprites(location)
+    assets.start_music("world_map")
     
     while True:
+        profiler.begin_frame("world_map")
+        
         # Handle input
         keys = pygame.key.get_pressed()
         dx = dy = 0
@@ -1070,24 +3357,26 @@ def world_map_screen(player: Character):
         if keys[pygame.K_DOWN] or keys[pygame.K_s]:
             dy = player_speed
         
-        # Update player position
-        new_x = map_player_x + dx
-        new_y = map_player_y + dy
-        
-        # Keep player on screen
-        if 50 < new_x < SCREEN_WIDTH - 50:
-            map_player_x = new_x
-        if 50 < new_y < SCREEN_HEIGHT - 150:
-            map_player_y = new_y
+        # Update player position once per simulation step
+        for _ in range(timestep.advance(frame_ms)):
+            prev_player_x, prev_player_y = map_player_x, map_player_y
+            new_x = map_player_x + dx
+            new_y = map_player_y + dy
+            
+            # Keep player on screen
+            if 50 < new_x < SCREEN_WIDTH - 50:
+                map_player_x = new_x
+            if 50 < new_y < SCREEN_HEIGHT - 150:
+                map_player_y = new_y
         
         # Check proximity to locations
         current_location = None
-        for loc_key, location in locations.items():
-            distance = math.sqrt((map_player_x - location.x)**2 + (map_player_y - location.y)**2)
-            if distance < 60:  # Within 60 pixels
-                if check_location_unlocked(loc_key):
-                    current_location = location
-                break
+        unlocked = world_map.unlock_state(player)
+        nearby_key = world_map.location_at(map_player_x, map_player_y)
+        if nearby_key and unlocked[nearby_key]:
+            current_location = locations[nearby_key]
+        
+        profiler.lap("update")
         
         # Handle events
         for event in pygame.event.get():
@@ -1095,6 +3384,7 @@ def world_map_screen(player: Character):
                 pygame.quit()
                 sys.exit()
             
+            profiler.handle_event(event)
             if back_btn.handle_event(event):
                 return
             
@@ -1107,14 +3397,19 @@ def world_map_screen(player: Character):
                     
                     battle_result = battle_screen(player, current_location)
                     # Player will be returned to world map after victory/defeat
+                    assets.start_music("world_map")
+                    world_map.invalidate_unlocks()  # A win may have opened new areas
+        
+        profiler.lap("events")
         
         # Draw everything
         draw_world_map_background()
+        profiler.lap("background")
         
         # Draw location markers
         for loc_key, location in locations.items():
             # Check if unlocked
-            is_unlocked = check_location_unlocked(loc_key)
+            is_unlocked = unlocked[loc_key]
             
             # Draw lock icon for locked locations
             if not is_unlocked:
@@ -1123,7 +3418,7 @@ def world_map_screen(player: Character):
                 pygame.draw.circle(screen, (101, 67, 33), (location.x, location.y - 20), 25, 3)
                 
                 # Lock icon
-                lock_text = text_font.render("🔒", True, GOLD)
+                lock_text = text_cache.render(text_font, "🔒", True, GOLD)
                 lock_rect = lock_text.get_rect(center=(location.x, location.y - 20))
                 screen.blit(lock_text, lock_rect)
             
@@ -1135,34 +3430,38 @@ def world_map_screen(player: Character):
             pygame.draw.rect(screen, WHITE if is_unlocked else GRAY, name_bg, 2)
             
             name_color = WHITE if is_unlocked else GRAY
-            name_text = small_font.render(location.name, True, name_color)
+            name_text = text_cache.render(small_font, location.name, True, name_color)
             name_rect = name_text.get_rect(center=(location.x, location.y + 45))
             screen.blit(name_text, name_rect)
             
             # Victory count
-            loc_key_clean = loc_key.replace("_track", "")
-            loc_victories = player.location_victories.get(loc_key_clean, 0)
+            loc_victories = player.location_victories.get(world_map.victory_keys[loc_key], 0)
             if loc_victories > 0:
-                victory_text = small_font.render(f"Wins: {loc_victories}", True, GOLD)
+                victory_text = text_cache.render(small_font, f"Wins: {loc_victories}", True, GOLD)
                 victory_rect = victory_text.get_rect(center=(location.x, location.y + 70))
                 screen.blit(victory_text, victory_rect)
         
-        # Draw player character on map
-        if assets.character_images and player.char_type.lower() in assets.character_images:
+        profiler.lap("ui")
+        
+        # Draw player character on map, smoothed between simulation steps
+        draw_x = round(prev_player_x + (map_player_x - prev_player_x) * timestep.alpha)
+        draw_y = round(prev_player_y + (map_player_y - prev_player_y) * timestep.alpha)
+        small_char = assets.get_scaled_image(player.image_key, (80, 80), quality.smooth_scaling)
+        if small_char:
             # Draw small version of character sprite
-            char_image = assets.character_images[player.char_type.lower()]
-            small_char = pygame.transform.scale(char_image, (80, 80))
-            char_rect = small_char.get_rect(center=(map_player_x, map_player_y))
+            char_rect = small_char.get_rect(center=(draw_x, draw_y))
             screen.blit(small_char, char_rect)
         else:
             # Simple circle for player
-            pygame.draw.circle(screen, YELLOW, (map_player_x, map_player_y), 25)
-            pygame.draw.circle(screen, WHITE, (map_player_x, map_player_y), 25, 3)
+            pygame.draw.circle(screen, YELLOW, (draw_x, draw_y), 25)
+            pygame.draw.circle(screen, WHITE, (draw_x, draw_y), 25, 3)
             # Character initial
-            initial_text = button_font.render(player.char_type[0], True, BLACK)
-            initial_rect = initial_text.get_rect(center=(map_player_x, map_player_y))
+            initial_text = text_cache.render(button_font, player.char_type[0], True, BLACK)
+            initial_rect = initial_text.get_rect(center=(draw_x, draw_y))
             screen.blit(initial_text, initial_rect)
         
+        profiler.lap("characters")
+        
         # Current location info
         if current_location:
             # Draw info box
@@ -1171,7 +3470,7 @@ def world_map_screen(player: Character):
             pygame.draw.rect(screen, GOLD, info_box, 3)
             
             # Location name
-            loc_name = button_font.render(current_location.name, True, GOLD)
+            loc_name = text_cache.render(button_font, current_location.name, True, GOLD)
             screen.blit(loc_name, (info_box.x + 10, info_box.y + 10))
             
             # Description (word wrap)
@@ -1189,21 +3488,21 @@ def world_map_screen(player: Character):
                 lines.append(' '.join(current_line))
             
             for i, line in enumerate(lines[:3]):  # Max 3 lines
-                desc_text = small_font.render(line, True, WHITE)
+                desc_text = text_cache.render(small_font, line, True, WHITE)
                 screen.blit(desc_text, (info_box.x + 10, info_box.y + 60 + i * 25))
             
             # Enemies
-            enemy_label = small_font.render("Enemies:", True, RED)
+            enemy_label = text_cache.render(small_font, "Enemies:", True, RED)
             screen.blit(enemy_label, (info_box.x + 10, info_box.y + 140))
             
-            enemies_text = small_font.render(", ".join(current_location.enemies[:2]), True, WHITE)
+            enemies_text = text_cache.render(small_font, ", ".join(current_location.enemies[:2]), True, WHITE)
             screen.blit(enemies_text, (info_box.x + 10, info_box.y + 165))
             
             # Action prompt
             if player.health >= 20:
-                action_text = text_font.render("Press SPACE to enter!", True, GREEN)
+                action_text = text_cache.render(text_font, "Press SPACE to enter!", True, GREEN)
             else:
-                action_text = text_font.render("Too injured to fight!", True, RED)
+                action_text = text_cache.render(text_font, "Too injured to fight!", True, RED)
             screen.blit(action_text, (info_box.x + 10, info_box.y + 190))
         
         # Instructions box
@@ -1216,129 +3515,57 @@ def world_map_screen(player: Character):
             "Press SPACE or ENTER to enter location",
             "Defeat enemies in all locations to unlock special areas!"
         ]
-        for i, instruction in enumerate(instructions):
-            inst_text = small_font.render(instruction, True, WHITE)
-            screen.blit(inst_text, (20, SCREEN_HEIGHT - 105 + i * 30))
-        
-        # Player stats bar at top
-        stats_bg = pygame.Rect(200, 10, SCREEN_WIDTH - 220, 60)
-        pygame.draw.rect(screen, (30, 30, 40), stats_bg)
-        pygame.draw.rect(screen, WHITE, stats_bg, 2)
-        
-        stats_text = text_font.render(
-            f"HP: {player.health}/{player.max_health} | 💎 {player.dragon_shards} | 🪙 {player.gold} | 🏆 {player.victories}",
-            True, WHITE
-        )
-        screen.blit(stats_text, (220, 30))
-        
-        # Back button
-        back_btn.draw(screen)
-        
-        pygame.display.flip()
-        clock.tick(FPS)
-
-def create_enemy(player: Character, location: Optional[Location] = None) -> Character:
-    """Create enemy scaled to player's progress"""
-    if location and location.enemies:
-        enemy_name = random.choice(location.enemies)
-    else:
-        enemy_types = ["Goblin", "Dark Mage", "Skeleton", "Orc"]
-        enemy_name = random.choice(enemy_types)
-    
-    enemy = Character(enemy_name, "Enemy", 700, 400)
-    
-    # Scale enemy strength
-    level_multiplier = 1 + (player.victories * 0.05)
-    victory_bonus = player.victories * 1.5
-    
-    # Extra difficulty for locked locations
-    if location and location.name in ["Battle of Druids", "Bot Attack"]:
-        level_multiplier *= 1.5
-        victory_bonus += 20
-    
-    # Base stats
-    base_health = random.randint(60, 80)
-    base_attack = random.randint(15, 25)
-    base_defense = random.randint(8, 15)
-    
-    # Enemy-specific stat modifications
-    if enemy_name == "Ghost":
-        base_health -= 10  # Ghosts are fragile
-        base_defense -= 5
-        base_attack += 5  # But hit harder
-    elif enemy_name == "Vampire":
-        base_health += 20  # Vampires are tough
-        base_attack += 10
-        base_defense += 5
-    elif enemy_name == "Golem":
-        base_health += 30  # Very tanky
-        base_defense += 15
-        base_attack -= 5  # But slow
-    elif enemy_name in ["Fire Elemental", "Lava Beast"]:
-        base_attack += 15  # Fire creatures deal high damage
-        base_defense -= 5  # But are vulnerable
-    elif enemy_name in ["Sea Serpent", "Kraken Spawn"]:
-        base_health += 15
-        base_attack += 8
-    elif enemy_name == "Temple Guardian":
-        base_health += 25
-        base_defense += 12
-    elif enemy_name == "Minotaur":
-        base_health += 35
-        base_attack += 12
-        base_defense += 8
-    elif enemy_name in ["Druid Lord", "Ancient Guardian"]:
-        base_health += 40
-        base_attack += 20
-        base_defense += 15
-    elif enemy_name in ["Mech Dragon", "War Machine"]:
-        base_health += 50
-        base_attack += 25
-        base_defense += 20
-    
-    # Apply scaling
-    enemy.health = int(base_health * level_multiplier) + victory_bonus
-    enemy.max_health = enemy.health
-    enemy.attack = int(base_attack * level_multiplier) + (victory_bonus // 2)
-    enemy.defense = int(base_defense * level_multiplier) + (victory_bonus // 3)
-    
-    # Give enemies appropriate weapons
-    weapon_map = {
-        "Goblin": "Rusty Dagger",
-        "Orc": "Heavy Club", 
-        "Dark Mage": "Dark Staff",
-        "Skeleton": "Bone Sword",
-        "Ghost": "Spectral Touch",
-        "Vampire": "Blood Fangs",
-        "Pirate": "Cutlass",
-        "City Guard": "Guard Spear",
-        "Assassin": "Poison Blade",
-        "Golem": "Stone Fists",
-        "Fire Elemental": "Flame Burst",
-        "Temple Guardian": "Holy Mace",
-        "Minotaur": "Giant Axe",
-        "Druid Lord": "Nature Staff",
-        "Mech Dragon": "Laser Cannon",
-    }
-    enemy.weapon = weapon_map.get(enemy_name, "Crude Weapon")
+        for i, instruction in enumerate(instructions):
+            inst_text = text_cache.render(small_font, instruction, True, WHITE)
+            screen.blit(inst_text, (20, SCREEN_HEIGHT - 105 + i * 30))
+        
+        # Player stats bar at top
+        stats_bg = pygame.Rect(200, 10, SCREEN_WIDTH - 220, 60)
+        pygame.draw.rect(screen, (30, 30, 40), stats_bg)
+        pygame.draw.rect(screen, WHITE, stats_bg, 2)
+        
+        stats_text = text_cache.render(text_font, 
+            f"HP: {player.health}/{player.max_health} | 💎 {player.dragon_shards} | 🪙 {player.gold} | 🏆 {player.victories}",
+            True, WHITE
+        )
+        screen.blit(stats_text, (220, 30))
+        
+        # Back button
+        back_btn.draw(screen)
+        
+        profiler.draw_hud(screen)
+        profiler.lap("ui")
+        game_display.present()
+        profiler.lap("flip")
+        frame_ms = clock.tick(FPS)
+        quality.end_frame(clock.get_rawtime())
+        profiler.end_frame()
+
+def battle_screen(player: Character, location: Optional[Location] = None,
+                  replay: Optional[BattleReplay] = None) -> bool:
+    """Battle screen - returns True if player wins, False if defeated
     
-    # Add titles based on player victories
-    if player.victories >= 10:
-        enemy.name = f"Elite {enemy_name}"
-    elif player.victories >= 5:
-        enemy.name = f"Veteran {enemy_name}"
-    elif player.victories >= 2:
-        enemy.name = f"Tough {enemy_name}"
+    Every battle is recorded to a replay. Passing a replay (with the player and
+    location from replay.restore()) plays it back instead of taking input.
+    """
+    playback = replay is not None
+    if not playback:
+        replay = BattleReplay.record(player, location)
+    playback_actions = iter(replay.actions)
+    playback_timer = 0
     
-    return enemy
-
-def battle_screen(player: Character, location: Optional[Location] = None) -> bool:
-    """Battle screen - returns True if player wins, False if defeated"""
-    enemy = create_enemy(player, location)
+    battle = start_battle(player, location, replay.seed)
+    enemy = battle.enemy
+    wave = battle.wave
+    target = 0  # Wave enemy the next action is aimed at
+    if location:
+        assets.ensure_location_sprites(location)
+    assets.start_music(f"battle_{location.special_effect}" if location else "battle")
     
     # Reset positions
     player.x, player.y = 200, 400
-    enemy.x, enemy.y = 700, 400
+    if not wave:
+        enemy.x, enemy.y = 700, 400
     
     # Battle UI
     attack_btn = Button(50, 600, 180, 60, "Attack", BLUE)
@@ -1346,206 +3573,207 @@ def battle_screen(player: Character, location: Optional[Location] = None) -> boo
     heal_btn = Button(450, 600, 180, 60, "Heal", GREEN)
     
     battle_log = []
-    damage_numbers = []  # For floating damage numbers
-    attack_effects = []  # For attack animations
+    particles.clear()
+    damage_numbers.clear()
     screen_shake = 0     # For screen shake effect
+    timestep = FixedTimestep()
+    frame_ms = 0
     
     def add_to_log(message: str):
         battle_log.append(message)
         if len(battle_log) > 8:
             battle_log.pop(0)
     
-    add_to_log(f"Battle begins! {player.name} vs {enemy.name}")
+    def present(battle_event: BattleEvent):
+        """Turn an engine event into log lines, damage numbers and effects"""
+        nonlocal screen_shake
+        add_to_log(battle_event.message)
+        amount = battle_event.amount
+        # Effects land on the wave enemy that was hit, or the lone enemy
+        if battle_event.target is not None:
+            enemy_x, enemy_y = wave.positions[battle_event.target]
+        else:
+            enemy_x, enemy_y = WAVE_AREA.center if wave else (enemy.x, enemy.y)
+        
+        if battle_event.kind == "attack":
+            damage_numbers.spawn(enemy_x, enemy_y - 30, amount)
+            if "Sword" in player.weapon:
+                particles.spawn(enemy_x, enemy_y, "slash")
+            elif "Wand" in player.weapon:
+                particles.spawn(enemy_x, enemy_y, "magic")
+            else:
+                particles.spawn(enemy_x, enemy_y, "slash")
+            screen_shake = 10  # Add screen shake
+        elif battle_event.kind == "special":
+            damage_numbers.spawn(enemy_x, enemy_y - 30, amount, True)
+            particles.spawn(enemy_x, enemy_y, "special")
+            if wave:
+                # Area special: sparks on the rest of the wave it splashed
+                for i in wave.alive_indices():
+                    if i != battle_event.target:
+                        particles.spawn(*wave.positions[i], "magic")
+            screen_shake = 15  # Bigger shake for special attacks
+        elif battle_event.kind == "heal":
+            damage_numbers.spawn(player.x, player.y - 30, amount, False, True)
+        elif battle_event.kind == "location":
+            if battle_event.source == "fire":
+                damage_numbers.spawn(enemy_x, enemy_y - 50, amount, True)
+            elif battle_event.source == "divine":
+                damage_numbers.spawn(player.x, player.y - 50, amount, False, True)
+            elif battle_event.source == "water":
+                damage_numbers.spawn(enemy_x + 30, enemy_y - 60, amount, True)
+        elif battle_event.kind == "enemy_attack":
+            if not wave:
+                enemy.is_attacking = True
+            damage_numbers.spawn(player.x, player.y - 30, amount)
+            particles.spawn(player.x, player.y, "slash")
+            screen_shake = 8
+        elif battle_event.kind == "ability":
+            if battle_event.source == "life_steal":
+                damage_numbers.spawn(enemy_x, enemy_y - 50, amount, False, True)
+            elif battle_event.source == "burn":
+                damage_numbers.spawn(player.x + 30, player.y - 60, amount)
+    
+    def take_turn(action: BattleAction, turn_target: int = 0):
+        nonlocal target
+        if not playback:
+            replay.actions.append(action)
+            replay.targets.append(turn_target)
+        for battle_event in battle.step(action, turn_target):
+            present(battle_event)
+        target = battle.target
+    
+    def end_battle():
+        """Autosave and keep the replay (skipped when watching a replay)"""
+        if playback:
+            return
+        replay.finish(battle)
+        save_replay(replay)
+        if battle.outcome == BattleOutcome.VICTORY:
+            autosaver.save(player)
+    
+    add_to_log(f"Battle begins! {player.name} vs {battle.enemy_name}")
     if location:
         add_to_log(f"Location: {location.name}")
     
-    while player.health > 0 and enemy.health > 0:
+    dirty_rects.invalidate()
+    while True:
+        profiler.begin_frame("battle")
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             
-            player_acted = False
+            profiler.handle_event(event)
+            if battle.is_over or playback:
+                continue
             
+            # Pick a wave target by clicking it, or cycle with Tab
+            if wave and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                clicked = wave.hit_test(game_display.to_logical(event.pos))
+                if clicked is not None:
+                    target = clicked
+            elif wave and event.type == pygame.KEYDOWN and event.key == pygame.K_TAB:
+                target = wave.next_alive(target + 1)
+            
+            action = None
             if attack_btn.handle_event(event):
                 assets.play_sound('attack')
-                damage = player.attack_enemy(enemy)
-                add_to_log(f"{player.name} attacks for {damage} damage!")
-                
-                # Add damage number and attack effect
-                damage_numbers.append(DamageNumber(enemy.x, enemy.y - 30, damage))
-                if "Sword" in player.weapon:
-                    attack_effects.append(AttackEffect(enemy.x, enemy.y, "slash"))
-                elif "Wand" in player.weapon:
-                    attack_effects.append(AttackEffect(enemy.x, enemy.y, "magic"))
-                else:
-                    attack_effects.append(AttackEffect(enemy.x, enemy.y, "slash"))
-                screen_shake = 10  # Add screen shake
-                
-                player_acted = True
-            
+                action = BattleAction.ATTACK
             elif special_btn.handle_event(event):
                 assets.play_sound('special')
-                damage = player.special_attack(enemy)
-                add_to_log(f"{player.name} uses {player.special} for {damage} damage!")
-                
-                # Add special damage number and effect
-                damage_numbers.append(DamageNumber(enemy.x, enemy.y - 30, damage, True))
-                attack_effects.append(AttackEffect(enemy.x, enemy.y, "special"))
-                screen_shake = 15  # Bigger shake for special attacks
-                
-                player_acted = True
-            
+                action = BattleAction.SPECIAL
             elif heal_btn.handle_event(event):
                 assets.play_sound('heal')
-                heal_amount = player.heal()
-                add_to_log(f"{player.name} heals for {heal_amount} HP!")
-                
-                # Add healing number (green)
-                damage_numbers.append(DamageNumber(player.x, player.y - 30, heal_amount, False, True))
-                
-                player_acted = True
-            
-            if player_acted:
-                # Add special location effects
-                if location and location.special_effect:
-                    if location.special_effect == "haunted" and random.randint(1, 10) == 1:
-                        add_to_log("👻 Spooky presence weakens the enemy!")
-                        enemy.attack = max(1, enemy.attack - 5)
-                    elif location.special_effect == "fire" and random.randint(1, 8) == 1:
-                        add_to_log("🔥 Lava burst damages enemy!")
-                        enemy.health -= 10
-                        damage_numbers.append(DamageNumber(enemy.x, enemy.y - 50, 10, True))
-                    elif location.special_effect == "divine" and random.randint(1, 12) == 1:
-                        add_to_log("✨ Divine blessing heals you!")
-                        heal_amount = 15
-                        player.health = min(player.max_health, player.health + heal_amount)
-                        damage_numbers.append(DamageNumber(player.x, player.y - 50, heal_amount, False, True))
-                    elif location.special_effect == "water" and random.randint(1, 6) == 1:
-                        add_to_log("🌊 Tidal wave boosts your attack!")
-                        damage += 10
-                        damage_numbers.append(DamageNumber(enemy.x + 30, enemy.y - 60, 10, True))
-                    elif location.special_effect == "ruins" and random.randint(1, 10) == 1:
-                        add_to_log("⚡ Ancient magic amplifies your power!")
-                        damage += 8
-                
-                # Check if enemy defeated
-                if enemy.health <= 0:
-                    # Track location victory
-                    if location:
-                        location_key = location.name.lower().replace(" ", "_")
-                        if location_key not in player.location_victories:
-                            player.location_victories[location_key] = 0
-                        player.location_victories[location_key] += 1
-                    
-                    # Victory screen
-                    return show_victory_screen(player, enemy, location)
-                
-                # Enemy turn
-                enemy_damage = enemy.attack_enemy(player)
-                enemy.is_attacking = True
-                add_to_log(f"{enemy.name} attacks for {enemy_damage} damage!")
-                
-                # Enemy damage number and effect
-                damage_numbers.append(DamageNumber(player.x, player.y - 30, enemy_damage))
-                attack_effects.append(AttackEffect(player.x, player.y, "slash"))
-                screen_shake = 8
-                
-                # Special enemy abilities
-                base_enemy_name = enemy.name
-                for prefix in ["Elite ", "Veteran ", "Tough "]:
-                    if base_enemy_name.startswith(prefix):
-                        base_enemy_name = base_enemy_name[len(prefix):]
-                        break
-                
-                if base_enemy_name == "Vampire" and random.randint(1, 6) == 1:
-                    # Vampire life steal
-                    steal_amount = enemy_damage // 2
-                    enemy.health = min(enemy.max_health, enemy.health + steal_amount)
-                    add_to_log(f"🧛 {enemy.name} steals {steal_amount} life!")
-                    damage_numbers.append(DamageNumber(enemy.x, enemy.y - 50, steal_amount, False, True))
-                elif base_enemy_name == "Ghost" and random.randint(1, 8) == 1:
-                    # Ghost phase - reduces player defense temporarily
-                    player.defense = max(0, player.defense - 2)
-                    add_to_log(f"👻 {enemy.name} phases through armor! Defense reduced!")
-                elif base_enemy_name == "Fire Elemental" and random.randint(1, 5) == 1:
-                    # Burn damage
-                    burn_damage = 5
-                    player.health -= burn_damage
-                    add_to_log(f"🔥 {enemy.name} burns you for {burn_damage} damage!")
-                    damage_numbers.append(DamageNumber(player.x + 30, player.y - 60, burn_damage))
-                elif base_enemy_name == "Minotaur" and random.randint(1, 7) == 1:
-                    # Rage - increases attack
-                    enemy.attack += 3
-                    add_to_log(f"💢 {enemy.name} enters a rage! Attack increased!")
-                elif base_enemy_name == "Golem" and random.randint(1, 10) == 1:
-                    # Stone skin - increases defense
-                    enemy.defense += 5
-                    add_to_log(f"🗿 {enemy.name} hardens! Defense increased!")
-        
-        # Update animations and effects
-        player.update_animation()
-        enemy.update_animation()
-        
-        # Update damage numbers
-        damage_numbers = [dn for dn in damage_numbers if dn.update()]
-        
-        # Update attack effects
-        attack_effects = [ae for ae in attack_effects if ae.update()]
-        
-        # Update screen shake
-        if screen_shake > 0:
-            screen_shake -= 1
-        
-        # Calculate screen shake offset
-        shake_x = random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0
-        shake_y = random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0
-        
-        # Draw everything with shake offset
-        draw_location_background(location)
+                action = BattleAction.HEAL
+            
+            if action:
+                take_turn(action, target)
+        
+        profiler.lap("events")
+        
+        # Run as many fixed simulation steps as the last frame took
+        for _ in range(timestep.advance(frame_ms)):
+            # Replays take one recorded action every REPLAY_TURN_FRAMES steps
+            if playback and not battle.is_over:
+                playback_timer += 1
+                if playback_timer >= REPLAY_TURN_FRAMES:
+                    playback_timer = 0
+                    action = next(playback_actions, None)
+                    if action is None:
+                        return False  # Replay of an unfinished battle
+                    assets.play_sound(action.value)
+                    take_turn(action, replay.target(battle.turn))
+            
+            # Update animations and effects
+            player.update_animation()
+            if not wave:
+                enemy.update_animation()
+            
+            # Update damage numbers and attack particles
+            damage_numbers.update()
+            particles.update()
+            
+            # Update screen shake
+            if screen_shake > 0:
+                screen_shake -= 1
+        
+        if battle.outcome == BattleOutcome.VICTORY:
+            end_battle()
+            # Victory screen
+            return show_victory_screen(player, battle.enemy_name, location, battle.rewards)
+        
+        # Calculate screen shake offset (turned off at low quality)
+        shake = screen_shake if quality.screen_shake else 0
+        shake_x = random.randint(-shake, shake) if shake > 0 else 0
+        shake_y = random.randint(-shake, shake) if shake > 0 else 0
+        profiler.lap("update")
+        
+        # Static layer: background and stats (drawn once per battle in dirty-rect mode)
+        if dirty_rects.begin_frame():
+            draw_location_background(location)
+            
+            stats = [
+                f"Shards: {player.dragon_shards}",
+                f"Gold: {player.gold}",
+                f"Victories: {player.victories}"
+            ]
+            for i, stat in enumerate(stats):
+                text_surface = text_cache.render(small_font, stat, True, WHITE)
+                screen.blit(text_surface, (20, 20 + i * 30))
+            dirty_rects.capture()
+        profiler.lap("background")
         
         # Draw characters with shake offset
         temp_player_x = player.x
-        temp_enemy_x = enemy.x
         temp_player_y = player.y
-        temp_enemy_y = enemy.y
-        
         player.x += shake_x
-        enemy.x += shake_x
         player.y += shake_y
-        enemy.y += shake_y
-        
         player.draw(screen)
-        enemy.draw(screen)
-        
-        # Restore positions
         player.x = temp_player_x
-        enemy.x = temp_enemy_x
         player.y = temp_player_y
-        enemy.y = temp_enemy_y
         
-        # Draw attack effects
-        for effect in attack_effects:
-            effect.draw(screen)
-        
-        # Draw damage numbers
-        for damage_num in damage_numbers:
-            damage_num.draw(screen)
+        if wave:
+            wave.draw(screen, target, (shake_x, shake_y))
+        else:
+            temp_enemy_x = enemy.x
+            temp_enemy_y = enemy.y
+            enemy.x += shake_x
+            enemy.y += shake_y
+            enemy.draw(screen)
+            enemy.x = temp_enemy_x
+            enemy.y = temp_enemy_y
+        profiler.lap("characters")
         
-        # Draw stats
-        stats = [
-            f"Shards: {player.dragon_shards}",
-            f"Gold: {player.gold}",
-            f"Victories: {player.victories}"
-        ]
-        for i, stat in enumerate(stats):
-            text_surface = small_font.render(stat, True, WHITE)
-            screen.blit(text_surface, (20, 20 + i * 30))
+        # Draw attack effects and damage numbers
+        particles.draw(screen, timestep.alpha)
+        damage_numbers.draw(screen, timestep.alpha)
+        profiler.lap("effects")
         
         # Draw battle log
         for i, log_entry in enumerate(battle_log):
-            log_surface = small_font.render(log_entry, True, WHITE)
-            screen.blit(log_surface, (600, 50 + i * 30))
+            log_surface = text_cache.render(small_font, log_entry, True, WHITE)
+            dirty_rects.mark(screen.blit(log_surface, (600, 50 + i * 30)))
         
         # Draw buttons
         attack_btn.draw(screen)
@@ -1553,46 +3781,33 @@ def battle_screen(player: Character, location: Optional[Location] = None) -> boo
         heal_btn.draw(screen)
         
         # Check for defeat
-        if player.health <= 0:
+        if battle.outcome == BattleOutcome.DEFEAT:
+            end_battle()
             show_defeat_screen(player)
             return False
         
-        pygame.display.flip()
-        clock.tick(FPS)
-    
-    return True
+        profiler.draw_hud(screen)
+        profiler.lap("ui")
+        dirty_rects.present()
+        profiler.lap("flip")
+        frame_ms = clock.tick(FPS)
+        quality.end_frame(clock.get_rawtime())
+        profiler.end_frame()
 
-def show_victory_screen(player: Character, enemy: Character, location: Optional[Location] = None) -> bool:
+def show_victory_screen(player: Character, enemy_name: str, location: Optional[Location] = None,
+                        rewards: Tuple[int, int] = (0, 0)) -> bool:
     """Show victory screen with rewards and animations"""
     assets.play_sound('victory')
-    
-    # Calculate rewards
-    player.victories += 1
-    base_shards = random.randint(20, 35)
-    base_gold = random.randint(15, 25)
-    
-    # Victory bonus based on total victories
-    victory_bonus_shards = player.victories * 2
-    victory_bonus_gold = player.victories
-    
-    # Location bonus for special areas
-    location_multiplier = 1.0
-    if location and location.name in ["Battle of Druids", "Bot Attack"]:
-        location_multiplier = 2.0
-    elif location and location.name in ["Mansion", "Maze"]:
-        location_multiplier = 1.5
-    
-    total_shards = int((base_shards + victory_bonus_shards) * location_multiplier)
-    total_gold = int((base_gold + victory_bonus_gold) * location_multiplier)
-    
-    player.dragon_shards += total_shards
-    player.gold += total_gold
+    assets.start_music("victory")
+    total_shards, total_gold = rewards
     
     # Victory screen loop
     continue_btn = Button(SCREEN_WIDTH // 2 - 100, 600, 200, 60, "Continue", GREEN)
     
     start_time = pygame.time.get_ticks()
-    celebration_timer = 0
+    celebration_timer = 0  # Simulation steps since the screen opened
+    timestep = FixedTimestep()
+    frame_ms = 0
     
     while True:
         for event in pygame.event.get():
@@ -1603,7 +3818,8 @@ def show_victory_screen(player: Character, enemy: Character, location: Optional[
             if continue_btn.handle_event(event):
                 return True
         
-        celebration_timer += 1
+        celebration_timer += timestep.advance(frame_ms)
+        wave = celebration_timer + timestep.alpha  # Smooth between steps for the motion
         
         # Animated background
         draw_background()
@@ -1611,26 +3827,26 @@ def show_victory_screen(player: Character, enemy: Character, location: Optional[
         # Victory text with animation
         current_time = pygame.time.get_ticks() - start_time
         glow = int(30 * math.sin(current_time * 0.003))
-        title_y = 150 + int(10 * math.sin(celebration_timer * 0.1))
+        title_y = 150 + int(10 * math.sin(wave * 0.1))
         
         victory_color = (255, 215 + glow, 0)  # Gold with glow
-        victory_text = title_font.render(f"🎉 VICTORY #{player.victories}! 🎉", True, victory_color)
+        victory_text = text_cache.render(title_font, f"🎉 VICTORY #{player.victories}! 🎉", True, victory_color)
         victory_rect = victory_text.get_rect(center=(SCREEN_WIDTH // 2, title_y))
         
         # Shadow effect
-        shadow_text = title_font.render(f"🎉 VICTORY #{player.victories}! 🎉", True, (50, 50, 50))
+        shadow_text = text_cache.render(title_font, f"🎉 VICTORY #{player.victories}! 🎉", True, (50, 50, 50))
         shadow_rect = shadow_text.get_rect(center=(SCREEN_WIDTH // 2 + 3, title_y + 3))
         screen.blit(shadow_text, shadow_rect)
         screen.blit(victory_text, victory_rect)
         
         # Enemy defeated
-        defeated_text = button_font.render(f"You defeated {enemy.name}!", True, WHITE)
+        defeated_text = text_cache.render(button_font, f"You defeated {enemy_name}!", True, WHITE)
         defeated_rect = defeated_text.get_rect(center=(SCREEN_WIDTH // 2, 250))
         screen.blit(defeated_text, defeated_rect)
         
         # Location info
         if location:
-            location_text = text_font.render(f"Location: {location.name}", True, TURQUOISE)
+            location_text = text_cache.render(text_font, f"Location: {location.name}", True, TURQUOISE)
             location_rect = location_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
             screen.blit(location_text, location_rect)
         
@@ -1640,47 +3856,50 @@ def show_victory_screen(player: Character, enemy: Character, location: Optional[
         pygame.draw.rect(screen, GOLD, reward_box, 3)
         
         # Rewards title
-        rewards_title = button_font.render("REWARDS", True, GOLD)
+        rewards_title = text_cache.render(button_font, "REWARDS", True, GOLD)
         rewards_rect = rewards_title.get_rect(center=(SCREEN_WIDTH // 2, 380))
         screen.blit(rewards_title, rewards_rect)
         
         # Reward details with sparkle effect
         shard_color = TURQUOISE if (celebration_timer // 10) % 2 == 0 else WHITE
-        shards_text = text_font.render(f"💎 Dragon Shards: +{total_shards}", True, shard_color)
+        shards_text = text_cache.render(text_font, f"💎 Dragon Shards: +{total_shards}", True, shard_color)
         shards_rect = shards_text.get_rect(center=(SCREEN_WIDTH // 2, 430))
         screen.blit(shards_text, shards_rect)
         
         gold_color = GOLD if (celebration_timer // 8) % 2 == 0 else YELLOW
-        gold_text = text_font.render(f"🪙 Gold: +{total_gold}", True, gold_color)
+        gold_text = text_cache.render(text_font, f"🪙 Gold: +{total_gold}", True, gold_color)
         gold_rect = gold_text.get_rect(center=(SCREEN_WIDTH // 2, 470))
         screen.blit(gold_text, gold_rect)
         
-        victories_text = text_font.render(f"🏆 Total Victories: {player.victories}", True, WHITE)
+        victories_text = text_cache.render(text_font, f"🏆 Total Victories: {player.victories}", True, WHITE)
         victories_rect = victories_text.get_rect(center=(SCREEN_WIDTH // 2, 510))
         screen.blit(victories_text, victories_rect)
         
         # Floating victory particles
         for i in range(5):
-            particle_x = SCREEN_WIDTH // 2 + int(50 * math.sin(celebration_timer * 0.05 + i))
-            particle_y = 100 + int(20 * math.cos(celebration_timer * 0.08 + i))
+            particle_x = SCREEN_WIDTH // 2 + int(50 * math.sin(wave * 0.05 + i))
+            particle_y = 100 + int(20 * math.cos(wave * 0.08 + i))
             pygame.draw.circle(screen, GOLD, (particle_x, particle_y), 3)
         
         # Continue button
         continue_btn.draw(screen)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        game_display.present()
+        frame_ms = clock.tick(FPS)
 
 def show_defeat_screen(player: Character):
     """Show defeat screen"""
     assets.play_sound('defeat')
+    assets.start_music("defeat")
     
     # Defeat screen loop
     retry_btn = Button(SCREEN_WIDTH // 2 - 250, 500, 200, 60, "Try Again", GREEN)
     quit_btn = Button(SCREEN_WIDTH // 2 + 50, 500, 200, 60, "Main Menu", RED)
     
+    dirty_rects.invalidate()
+    events = pygame.event.get()
     while True:
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1692,237 +3911,267 @@ def show_defeat_screen(player: Character):
             if quit_btn.handle_event(event):
                 return
         
-        # Dark background
-        draw_background()
-        
-        # Add dark overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.fill((0, 0, 0))
-        overlay.set_alpha(150)
-        screen.blit(overlay, (0, 0))
-        
-        # Defeat text
-        defeat_text = title_font.render("DEFEATED!", True, RED)
-        defeat_rect = defeat_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
-        screen.blit(defeat_text, defeat_rect)
-        
-        # Message
-        message_text = button_font.render("You have fallen in battle...", True, WHITE)
-        message_rect = message_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
-        screen.blit(message_text, message_rect)
-        
-        # Stats
-        stats = [
-            f"Final Health: 0/{player.max_health}",
-            f"Dragon Shards: {player.dragon_shards}",
-            f"Gold: {player.gold}",
-            f"Victories: {player.victories}"
-        ]
-        
-        for i, stat in enumerate(stats):
-            stat_text = text_font.render(stat, True, GRAY)
-            stat_rect = stat_text.get_rect(center=(SCREEN_WIDTH // 2, 380 + i * 30))
-            screen.blit(stat_text, stat_rect)
+        if dirty_rects.begin_frame():
+            # Dark background
+            draw_background()
+            
+            # Add dark overlay
+            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            overlay.fill((0, 0, 0))
+            overlay.set_alpha(150)
+            screen.blit(overlay, (0, 0))
+            
+            # Defeat text
+            defeat_text = text_cache.render(title_font, "DEFEATED!", True, RED)
+            defeat_rect = defeat_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
+            screen.blit(defeat_text, defeat_rect)
+            
+            # Message
+            message_text = text_cache.render(button_font, "You have fallen in battle...", True, WHITE)
+            message_rect = message_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
+            screen.blit(message_text, message_rect)
+            
+            # Stats
+            stats = [
+                f"Final Health: 0/{player.max_health}",
+                f"Dragon Shards: {player.dragon_shards}",
+                f"Gold: {player.gold}",
+                f"Victories: {player.victories}"
+            ]
+            
+            for i, stat in enumerate(stats):
+                stat_text = text_cache.render(text_font, stat, True, GRAY)
+                stat_rect = stat_text.get_rect(center=(SCREEN_WIDTH // 2, 380 + i * 30))
+                screen.blit(stat_text, stat_rect)
+            dirty_rects.capture()
         
         # Buttons
         retry_btn.draw(screen)
         quit_btn.draw(screen)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        dirty_rects.present()
+        events = wait_for_events()
 
 def store_screen(player: Character):
-    """Enhanced store with pagination"""
-    store_items = get_store_items()
+    """Store with filters, sorting, type-to-search and a scrolling item list
     
-    # Pagination
-    items_per_page = 8
-    current_page = 0
-    total_pages = (len(store_items) + items_per_page - 1) // items_per_page
+    Only the rows inside the list area are laid out and drawn, so the cost
+    per frame does not depend on the catalog size.
+    """
+    catalog = get_store_catalog()
+    store_items = catalog.items
+    
+    # Filters (None = all) and the matching item positions
+    tier_filter: Optional[str] = None
+    type_filter: Optional[str] = None
+    stat_filter: Optional[str] = None
+    sort_keys = list(STORE_SORTS)
+    sort_key = sort_keys[0]
+    search = ""
+    results = catalog.query()
+    
+    # Scrolling list
+    row_height = 75
+    list_rect = pygame.Rect(40, 195, SCREEN_WIDTH - 100, 7 * row_height)
+    scroll = 0  # Pixels
+    track_rect = pygame.Rect(list_rect.right + 8, list_rect.y, 8, list_rect.height)
+    drag_offset: Optional[int] = None  # Grab point inside the thumb while dragging
     
     # UI
     back_btn = Button(50, 800, 150, 60, "Back", GRAY)
-    prev_page_btn = Button(300, 800, 200, 60, "◀ Previous", BLUE)
-    next_page_btn = Button(520, 800, 200, 60, "Next ▶", BLUE)
+    prev_page_btn = Button(300, 800, 200, 60, "▲ Page Up", BLUE)
+    next_page_btn = Button(520, 800, 220, 60, "▼ Page Down", BLUE)
+    tier_btn = Button(40, 140, 240, 45, "All Tiers", BLUE)
+    type_btn = Button(290, 140, 220, 45, "All Types", BLUE)
+    stat_btn = Button(520, 140, 200, 45, "Any Stat", BLUE)
+    sort_btn = Button(730, 140, 260, 45, f"Sort: {STORE_SORTS[sort_key][0]}", PURPLE)
+    search_rect = pygame.Rect(1000, 140, SCREEN_WIDTH - 1060, 45)
+    
+    # One Buy button per row that can be on screen, moved to its row each frame
+    buy_buttons = [Button(50, 0, 120, 50, "Buy", GREEN) for _ in range(list_rect.height // row_height + 1)]
+    
+    def cycle(value: Optional[str], choices: List[str]) -> Optional[str]:
+        """Next filter value, going back to None (all) after the last one"""
+        options = [None] + choices
+        return options[(options.index(value) + 1) % len(options)]
     
-    buy_buttons = [Button(50, 150 + i * 75, 120, 50, "Buy", GREEN) for i in range(items_per_page)]
+    def max_scroll() -> int:
+        return max(0, len(results) * row_height - list_rect.height)
+    
+    def thumb_rect() -> pygame.Rect:
+        thumb_height = max(30, list_rect.height * list_rect.height // max(1, len(results) * row_height))
+        thumb_y = track_rect.y + (track_rect.height - thumb_height) * scroll // max(1, max_scroll())
+        return pygame.Rect(track_rect.x, thumb_y, track_rect.width, thumb_height)
+    
+    def scroll_to_thumb(thumb_top: int) -> int:
+        """Scroll position that puts the top of the thumb at thumb_top"""
+        travel = track_rect.height - thumb_rect().height
+        return (thumb_top - track_rect.y) * max_scroll() // max(1, travel)
+    
+    def visible_rows() -> List[Tuple[int, int]]:
+        """(item position, row top) for every row that overlaps the list area"""
+        first = scroll // row_height
+        last = min(len(results), (scroll + list_rect.height + row_height - 1) // row_height)
+        return [(results[row], list_rect.y + row * row_height - scroll) for row in range(first, last)]
     
     message = ""
-    message_timer = 0
-    
-    # Tier colors
-    tier_colors = {
-        ItemTier.BASIC.value: (40, 60, 40),
-        ItemTier.INTERMEDIATE.value: (40, 40, 80),
-        ItemTier.ADVANCED.value: (80, 40, 80),
-        ItemTier.LEGENDARY.value: (100, 50, 0),
-        ItemTier.MYTHIC.value: (120, 0, 120)
-    }
+    message_timer = 0  # Simulation steps left
+    timestep = FixedTimestep()
+    frame_ms = 0
     
-    tier_badge_colors = {
-        ItemTier.BASIC.value: GRAY,
-        ItemTier.INTERMEDIATE.value: BLUE,
-        ItemTier.ADVANCED.value: PURPLE,
-        ItemTier.LEGENDARY.value: GOLD,
-        ItemTier.MYTHIC.value: TURQUOISE
-    }
+    row_cache = StoreRowCache(store_items)
+    row_cache.set_funds(player.dragon_shards, player.gold)
     
+    assets.start_music("store")
+    pygame.key.start_text_input()
+    rows = visible_rows()
     while True:
+        profiler.begin_frame("store")
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             
+            profiler.handle_event(event)
             if back_btn.handle_event(event):
+                pygame.key.stop_text_input()
                 return
             
-            # Handle pagination
-            if prev_page_btn.handle_event(event) and current_page > 0:
-                current_page -= 1
+            # Filters, sort and search re-run the catalog query
+            query_changed = False
+            if tier_btn.handle_event(event):
+                tier_filter = cycle(tier_filter, catalog.tiers)
+                tier_btn.text = tier_filter or "All Tiers"
+                query_changed = True
+            elif type_btn.handle_event(event):
+                type_filter = cycle(type_filter, catalog.types)
+                type_btn.text = type_filter.title() if type_filter else "All Types"
+                query_changed = True
+            elif stat_btn.handle_event(event):
+                stat_filter = cycle(stat_filter, catalog.stats)
+                stat_btn.text = f"Has {STORE_STAT_NAMES[stat_filter]}" if stat_filter else "Any Stat"
+                query_changed = True
+            elif sort_btn.handle_event(event):
+                sort_key = sort_keys[(sort_keys.index(sort_key) + 1) % len(sort_keys)]
+                sort_btn.text = f"Sort: {STORE_SORTS[sort_key][0]}"
+                query_changed = True
+            elif event.type == pygame.TEXTINPUT:
+                search += event.text
+                query_changed = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE and search:
+                search = search[:-1]
+                query_changed = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and search:
+                search = ""
+                query_changed = True
             
-            if next_page_btn.handle_event(event) and current_page < total_pages - 1:
-                current_page += 1
+            if query_changed:
+                results = catalog.query(tier_filter, type_filter, stat_filter, search, sort_key)
+                scroll = 0
             
-            # Get current page items
-            start_index = current_page * items_per_page
-            end_index = min(start_index + items_per_page, len(store_items))
-            current_items = store_items[start_index:end_index]
+            # Scrolling (the scrollbar is easier to hit with some slack around the track)
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and max_scroll() > 0:
+                mouse_pos = game_display.to_logical(event.pos)
+                if track_rect.inflate(16, 0).collidepoint(mouse_pos):
+                    thumb = thumb_rect()
+                    # Grab the thumb where it was clicked, or centre it on a track click
+                    drag_offset = mouse_pos[1] - thumb.y if thumb.inflate(16, 0).collidepoint(mouse_pos) else thumb.height // 2
+                    scroll = scroll_to_thumb(mouse_pos[1] - drag_offset)
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                drag_offset = None
+            elif event.type == pygame.MOUSEMOTION and drag_offset is not None:
+                scroll = scroll_to_thumb(game_display.to_logical(event.pos)[1] - drag_offset)
+            elif event.type == pygame.MOUSEWHEEL:
+                scroll -= event.y * row_height // 2
+            elif prev_page_btn.handle_event(event) or (event.type == pygame.KEYDOWN and event.key == pygame.K_PAGEUP):
+                scroll -= list_rect.height
+            elif next_page_btn.handle_event(event) or (event.type == pygame.KEYDOWN and event.key == pygame.K_PAGEDOWN):
+                scroll += list_rect.height
+            scroll = max(0, min(scroll, max_scroll()))
             
-            # Handle purchases
-            for i, btn in enumerate(buy_buttons):
-                if i < len(current_items) and btn.handle_event(event):
-                    item = current_items[i]
+            # Handle purchases (rows cut off by the list edge can't be bought from)
+            for btn, (item_index, _) in zip(buy_buttons, rows):
+                if list_rect.contains(btn.rect) and btn.handle_event(event):
+                    item = store_items[item_index]
                     
-                    if player.dragon_shards >= item["cost_shards"] and player.gold >= item["cost_gold"]:
+                    benefits = buy_item(player, item)
+                    if benefits is not None:
                         assets.play_sound('buy')
-                        player.dragon_shards -= item["cost_shards"]
-                        player.gold -= item["cost_gold"]
-                        
-                        # Apply item effects
-                        benefits = []
-                        if "attack_boost" in item:
-                            player.attack += item["attack_boost"]
-                            benefits.append(f"ATK+{item['attack_boost']}")
-                        if "defense_boost" in item:
-                            player.defense += item["defense_boost"]
-                            benefits.append(f"DEF+{item['defense_boost']}")
-                        if "speed_boost" in item:
-                            player.speed += item["speed_boost"]
-                            benefits.append(f"SPD+{item['speed_boost']}")
-                        if "max_health_boost" in item:
-                            player.max_health += item["max_health_boost"]
-                            player.health += item["max_health_boost"]
-                            benefits.append(f"MaxHP+{item['max_health_boost']}")
-                        if "heal" in item:
-                            heal_amount = min(item["heal"], player.max_health - player.health)
-                            player.health += heal_amount
-                            benefits.append(f"Healed {heal_amount}HP")
-                        if "special_power" in item:
-                            player.special = item["special_power"]
-                            benefits.append("New Special Power!")
-                        
-                        if item["type"] == "weapon":
-                            player.weapon = item["name"]
-                        
+                        autosaver.save(player)
+                        row_cache.set_funds(player.dragon_shards, player.gold)
                         message = f"Bought {item['name']}! " + " | ".join(benefits)
                         message_timer = 240
                     else:
                         message = "Not enough resources!"
                         message_timer = 120
         
+        profiler.lap("events")
+        
         # Update message timer
+        steps = timestep.advance(frame_ms)
         if message_timer > 0:
-            message_timer -= 1
-            if message_timer == 0:
+            message_timer -= steps
+            if message_timer <= 0:
+                message_timer = 0
                 message = ""
         
+        profiler.lap("update")
+        
         # Draw shop
         draw_shop_background()
+        profiler.lap("background")
         
         # Title
         title_color = [GOLD, YELLOW, TURQUOISE][(pygame.time.get_ticks() // 500) % 3]
-        title_text = title_font.render("🏪 DRUID MERCHANT", True, title_color)
+        title_text = text_cache.render(title_font, "🏪 DRUID MERCHANT", True, title_color)
         screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 50)))
         
         # Currency display
         currency_bg = pygame.Rect(40, 85, 600, 45)
         pygame.draw.rect(screen, (40, 40, 60), currency_bg)
         pygame.draw.rect(screen, GOLD, currency_bg, 3)
-        currency_text = text_font.render(f"💎 Shards: {player.dragon_shards}  |  🪙 Gold: {player.gold}", True, WHITE)
+        currency_text = text_cache.render(text_font, f"💎 Shards: {player.dragon_shards}  |  🪙 Gold: {player.gold}", True, WHITE)
         screen.blit(currency_text, (50, 95))
         
-        # Page indicator
-        page_text = button_font.render(f"Page {current_page + 1} of {total_pages}", True, WHITE)
-        screen.blit(page_text, page_text.get_rect(center=(SCREEN_WIDTH // 2, 125)))
-        
-        # Get current items
-        start_index = current_page * items_per_page
-        end_index = min(start_index + items_per_page, len(store_items))
-        current_items = store_items[start_index:end_index]
-        
-        # Display items
-        for i, item in enumerate(current_items):
-            y_pos = 150 + i * 75
-            
-            # Item background
-            item_rect = pygame.Rect(40, y_pos - 5, SCREEN_WIDTH - 100, 70)
-            bg_color = tier_colors.get(item["tier"], (30, 30, 30))
-            pygame.draw.rect(screen, bg_color, item_rect)
-            pygame.draw.rect(screen, WHITE, item_rect, 3)
-            
-            # Tier badge
-            tier_color = tier_badge_colors.get(item["tier"], WHITE)
-            tier_badge = pygame.Rect(item_rect.right - 100, y_pos, 80, 25)
-            pygame.draw.rect(screen, tier_color, tier_badge)
-            pygame.draw.rect(screen, WHITE, tier_badge, 2)
-            tier_text = small_font.render(item["tier"], True, BLACK)
-            screen.blit(tier_text, tier_text.get_rect(center=tier_badge.center))
-            
-            # Item name
-            name_color = tier_color
-            if item["tier"] in [ItemTier.LEGENDARY.value, ItemTier.MYTHIC.value]:
-                # Glow effect - ensure we handle color tuples properly
-                glow = int(5 * math.sin(pygame.time.get_ticks() * 0.01))
-                name_color = tuple(min(255, max(0, c + glow)) for c in tier_color[:3])  # Only RGB, no alpha
-            
-            name_text = button_font.render(item["name"], True, name_color)
-            screen.blit(name_text, (190, y_pos + 5))
-            
-            # Item stats
-            desc_parts = []
-            stat_icons = {
-                "attack_boost": "⚔️ ATK",
-                "defense_boost": "🛡️ DEF",
-                "speed_boost": "⚡ SPD",
-                "max_health_boost": "💪 MaxHP",
-                "heal": "💚 Heal",
-                "special_power": "✨"
-            }
-            
-            for stat, icon in stat_icons.items():
-                if stat in item:
-                    if stat == "special_power":
-                        desc_parts.append(f"{icon} {item[stat]}")
-                    else:
-                        desc_parts.append(f"{icon}+{item[stat]}")
-            
-            desc = " | ".join(desc_parts) if desc_parts else "Special Item"
-            desc_text = small_font.render(desc, True, WHITE)
-            screen.blit(desc_text, (190, y_pos + 35))
-            
-            # Cost
-            cost_text = text_font.render(f"💎 {item['cost_shards']} + 🪙 {item['cost_gold']}", True, YELLOW)
-            screen.blit(cost_text, (700, y_pos + 20))
+        # Filter bar and search box
+        tier_btn.draw(screen)
+        type_btn.draw(screen)
+        stat_btn.draw(screen)
+        sort_btn.draw(screen)
+        pygame.draw.rect(screen, (40, 40, 60), search_rect)
+        pygame.draw.rect(screen, GOLD if search else WHITE, search_rect, 2)
+        search_label = f"🔍 {search}" if search else "Type to search"
+        search_text = text_cache.render(small_font, search_label, True, WHITE if search else GRAY)
+        screen.blit(search_text, search_text.get_rect(midleft=(search_rect.x + 10, search_rect.centery)))
+        count_text = text_cache.render(small_font, f"{len(results)} of {len(catalog)} items", True, WHITE)
+        screen.blit(count_text, count_text.get_rect(midleft=(770, 830)))
+        
+        # Display the rows in view (pre-rendered), clipped to the list area
+        rows = visible_rows()
+        phase = store_glow_phase()
+        screen.set_clip(list_rect)
+        for i, (item_index, row_top) in enumerate(rows):
+            row_cache.draw(screen, item_index, (list_rect.x, row_top), phase)
             
             # Buy button
-            if i < len(current_items):
-                buy_buttons[i].draw(screen)
+            buy_buttons[i].rect.y = row_top + 5
+            buy_buttons[i].draw(screen)
+        screen.set_clip(None)
+        
+        if not results:
+            empty_text = text_cache.render(text_font, "No items match these filters", True, GRAY)
+            screen.blit(empty_text, empty_text.get_rect(center=(SCREEN_WIDTH // 2, list_rect.y + 60)))
+        
+        # Scrollbar
+        if max_scroll() > 0:
+            pygame.draw.rect(screen, (40, 40, 60), track_rect)
+            pygame.draw.rect(screen, GOLD, thumb_rect())
         
         # Navigation
         back_btn.draw(screen)
-        if current_page > 0:
+        if scroll > 0:
             prev_page_btn.draw(screen)
-        if current_page < total_pages - 1:
+        if scroll < max_scroll():
             next_page_btn.draw(screen)
         
         # Message
@@ -1933,19 +4182,26 @@ def store_screen(player: Character):
             screen.blit(msg_bg, (50, 720))
             
             msg_color = GREEN if "Bought" in message else RED
-            msg_text = text_font.render(message, True, msg_color)
+            msg_text = text_cache.render(text_font, message, True, msg_color)
             screen.blit(msg_text, msg_text.get_rect(center=(SCREEN_WIDTH // 2, 750)))
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        profiler.draw_hud(screen)
+        profiler.lap("ui")
+        game_display.present()
+        profiler.lap("flip")
+        frame_ms = clock.tick(FPS)
+        quality.end_frame(clock.get_rawtime())
+        profiler.end_frame()
 
 def show_stats_screen(player: Character):
     """Character stats screen"""
     back_btn = Button(50, 800, 150, 60, "Back", GRAY)
     locations = get_world_locations()
     
+    dirty_rects.invalidate()
+    events = pygame.event.get()
     while True:
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1953,80 +4209,82 @@ def show_stats_screen(player: Character):
             if back_btn.handle_event(event):
                 return
         
-        draw_background()
-        
-        # Title
-        title_text = title_font.render("CHARACTER STATS", True, WHITE)
-        screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 50)))
-        
-        # Draw character
-        player.x = SCREEN_WIDTH // 2
-        player.y = 200
-        player.draw(screen)
-        
-        # Stats in two columns
-        left_stats = [
-            ("Name", player.name),
-            ("Class", player.char_type),
-            ("Health", f"{player.health}/{player.max_health}"),
-            ("Attack", str(player.attack)),
-            ("Defense", str(player.defense)),
-            ("Speed", str(player.speed))
-        ]
-        
-        right_stats = [
-            ("Weapon", player.weapon),
-            ("Special", player.special),
-            ("Dragon Shards", str(player.dragon_shards)),
-            ("Gold", str(player.gold)),
-            ("Total Victories", str(player.victories)),
-            ("Battle Rating", str(player.attack + player.defense + player.speed))
-        ]
-        
-        # Draw stats
-        for i, (label, value) in enumerate(left_stats):
-            label_text = text_font.render(f"{label}:", True, GOLD)
-            value_text = text_font.render(value, True, WHITE)
-            screen.blit(label_text, (100, 350 + i * 40))
-            screen.blit(value_text, (300, 350 + i * 40))
-        
-        for i, (label, value) in enumerate(right_stats):
-            label_text = text_font.render(f"{label}:", True, GOLD)
-            value_text = text_font.render(value, True, WHITE)
-            screen.blit(label_text, (700, 350 + i * 40))
-            screen.blit(value_text, (900, 350 + i * 40))
-        
-        # Location victories section
-        loc_title = button_font.render("Location Victories", True, TURQUOISE)
-        screen.blit(loc_title, loc_title.get_rect(center=(SCREEN_WIDTH // 2, 620)))
-        
-        # Draw location victory counts
-        x_offset = 0
-        y_offset = 0
-        for i, (loc_key, location) in enumerate(locations.items()):
-            loc_key_clean = loc_key.replace("_track", "")  # Handle "race" location
-            loc_victories = player.location_victories.get(loc_key_clean, 0)
-            
-            # Color based on if location is unlocked
-            has_victories = loc_victories > 0
-            color = GREEN if has_victories else GRAY
-            
-            # Position in a grid
-            x = 200 + (x_offset * 250)
-            y = 660 + (y_offset * 30)
-            
-            loc_text = small_font.render(f"{location.name}: {loc_victories}", True, color)
-            screen.blit(loc_text, (x, y))
-            
-            x_offset += 1
-            if x_offset >= 4:
-                x_offset = 0
-                y_offset += 1
+        if dirty_rects.begin_frame():
+            draw_background()
+            
+            # Title
+            title_text = text_cache.render(title_font, "CHARACTER STATS", True, WHITE)
+            screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 50)))
+            
+            # Draw character
+            player.x = SCREEN_WIDTH // 2
+            player.y = 200
+            player.draw(screen)
+            
+            # Stats in two columns
+            left_stats = [
+                ("Name", player.name),
+                ("Class", player.char_type),
+                ("Health", f"{player.health}/{player.max_health}"),
+                ("Attack", str(player.attack)),
+                ("Defense", str(player.defense)),
+                ("Speed", str(player.speed))
+            ]
+            
+            right_stats = [
+                ("Weapon", player.weapon),
+                ("Special", player.special),
+                ("Dragon Shards", str(player.dragon_shards)),
+                ("Gold", str(player.gold)),
+                ("Total Victories", str(player.victories)),
+                ("Battle Rating", str(player.attack + player.defense + player.speed))
+            ]
+            
+            # Draw stats
+            for i, (label, value) in enumerate(left_stats):
+                label_text = text_cache.render(text_font, f"{label}:", True, GOLD)
+                value_text = text_cache.render(text_font, value, True, WHITE)
+                screen.blit(label_text, (100, 350 + i * 40))
+                screen.blit(value_text, (300, 350 + i * 40))
+            
+            for i, (label, value) in enumerate(right_stats):
+                label_text = text_cache.render(text_font, f"{label}:", True, GOLD)
+                value_text = text_cache.render(text_font, value, True, WHITE)
+                screen.blit(label_text, (700, 350 + i * 40))
+                screen.blit(value_text, (900, 350 + i * 40))
+            
+            # Location victories section
+            loc_title = text_cache.render(button_font, "Location Victories", True, TURQUOISE)
+            screen.blit(loc_title, loc_title.get_rect(center=(SCREEN_WIDTH // 2, 620)))
+            
+            # Draw location victory counts
+            x_offset = 0
+            y_offset = 0
+            for i, (loc_key, location) in enumerate(locations.items()):
+                loc_key_clean = loc_key.replace("_track", "")  # Handle "race" location
+                loc_victories = player.location_victories.get(loc_key_clean, 0)
+            
+                # Color based on if location is unlocked
+                has_victories = loc_victories > 0
+                color = GREEN if has_victories else GRAY
+            
+                # Position in a grid
+                x = 200 + (x_offset * 250)
+                y = 660 + (y_offset * 30)
+            
+                loc_text = text_cache.render(small_font, f"{location.name}: {loc_victories}", True, color)
+                screen.blit(loc_text, (x, y))
+            
+                x_offset += 1
+                if x_offset >= 4:
+                    x_offset = 0
+                    y_offset += 1
+            dirty_rects.capture()
         
         back_btn.draw(screen)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        dirty_rects.present()
+        events = wait_for_events()
 
 def main_menu(player: Character):
     """Main game menu"""
@@ -2036,39 +4294,72 @@ def main_menu(player: Character):
     heal_btn = Button(450, 510, 500, 90, "😴 Rest & Heal", GREEN)
     quit_btn = Button(450, 620, 500, 90, "❌ Quit Game", GRAY)
     
+    assets.start_music("menu")
+    dirty_rects.invalidate()
+    events = pygame.event.get()
     while True:
-        for event in pygame.event.get():
+        profiler.begin_frame("main_menu")
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             
+            profiler.handle_event(event)
             if world_btn.handle_event(event):
                 world_map_screen(player)
+                assets.start_music("menu")
+                dirty_rects.invalidate()
             
             elif store_btn.handle_event(event):
                 store_screen(player)
+                assets.start_music("menu")
+                dirty_rects.invalidate()
             
             elif stats_btn.handle_event(event):
                 show_stats_screen(player)
+                dirty_rects.invalidate()
             
             elif heal_btn.handle_event(event):
                 player.health = player.max_health
                 assets.play_sound('heal')
+                dirty_rects.invalidate()
             
             elif quit_btn.handle_event(event):
+                autosaver.save(player)
+                autosaver.flush()
                 assets.stop_music()
                 pygame.quit()
                 sys.exit()
         
-        draw_background()
-        
-        # Title
-        title_text = title_font.render("BATTLE OF THE DRUIDS", True, WHITE)
-        screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 80)))
+        profiler.lap("events")
         
-        # Welcome
-        welcome_text = text_font.render(f"Welcome, {player.name} the {player.char_type}!", True, WHITE)
-        screen.blit(welcome_text, welcome_text.get_rect(center=(SCREEN_WIDTH // 2, 140)))
+        if dirty_rects.begin_frame():
+            draw_background()
+            
+            # Title
+            title_text = text_cache.render(title_font, "BATTLE OF THE DRUIDS", True, WHITE)
+            screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, 80)))
+            
+            # Welcome
+            welcome_text = text_cache.render(text_font, f"Welcome, {player.name} the {player.char_type}!", True, WHITE)
+            screen.blit(welcome_text, welcome_text.get_rect(center=(SCREEN_WIDTH // 2, 140)))
+            
+            # Low health warning
+            if player.health < 20:
+                warning_text = text_cache.render(text_font, "⚠️ Too injured to fight! Rest first!", True, RED)
+                screen.blit(warning_text, warning_text.get_rect(center=(SCREEN_WIDTH // 2, 750)))
+            
+            # Resources display
+            resources_text = text_cache.render(text_font, 
+                f"💎 Shards: {player.dragon_shards} | 🪙 Gold: {player.gold} | 🏆 Victories: {player.victories}", 
+                True, WHITE
+            )
+            screen.blit(resources_text, resources_text.get_rect(center=(SCREEN_WIDTH // 2, 780)))
+            
+            quality_text = text_cache.render(small_font, quality.label(), True, GRAY)
+            screen.blit(quality_text, (20, SCREEN_HEIGHT - 40))
+            dirty_rects.capture()
+        profiler.lap("background")
         
         # Draw all buttons - IMPORTANT: Make sure all buttons are drawn!
         world_btn.draw(screen)
@@ -2077,25 +4368,662 @@ def main_menu(player: Character):
         heal_btn.draw(screen)
         quit_btn.draw(screen)
         
-        # Low health warning
-        if player.health < 20:
-            warning_text = text_font.render("⚠️ Too injured to fight! Rest first!", True, RED)
-            screen.blit(warning_text, warning_text.get_rect(center=(SCREEN_WIDTH // 2, 750)))
+        profiler.draw_hud(screen)
+        profiler.lap("ui")
+        dirty_rects.present()
+        profiler.lap("flip")
+        events = wait_for_events()
+        profiler.end_frame()
+
+# ==================== BALANCE SIMULATOR ====================
+SIM_MAX_TURNS = 500  # Safety cap so a stalemate can never hang a worker
+
+def _pick_simulated_location(player: Character, locations: Dict[str, Location],
+                             attempts: Dict[str, int]) -> Tuple[str, Location]:
+    """Campaign policy: round-robin over the unlocked locations"""
+    unlocked = [(key, loc) for key, loc in locations.items() if is_location_unlocked(loc, player)]
+    return min(unlocked, key=lambda entry: attempts.get(entry[0], 0))
+
+def _simulate_purchases(player: Character, store_items: List[Dict], owned: set):
+    """Purchase policy: repeatedly buy the priciest affordable upgrade not owned yet"""
+    while True:
+        affordable = [item for item in store_items
+                      if item["name"] not in owned and "heal" not in item
+                      and player.dragon_shards >= item["cost_shards"] and player.gold >= item["cost_gold"]]
+        if not affordable:
+            return
+        item = max(affordable, key=lambda candidate: candidate["cost_shards"])
+        buy_item(player, item)
+        owned.add(item["name"])
+
+def _choose_simulated_action(player: Character) -> BattleAction:
+    """Battle policy: heal when low, otherwise use the special attack"""
+    if player.health < player.max_health * 0.3:
+        return BattleAction.HEAL
+    return BattleAction.SPECIAL
+
+def simulate_campaign(char_type: str, battles: int, results: Dict):
+    """Play one headless campaign and accumulate its numbers into results"""
+    player = Character(f"Hero {char_type}", char_type, 200, 400)
+    locations = get_world_locations()
+    store_items = get_store_items()
+    owned = set()
+    attempts = {}
+    
+    curve = results["curves"].setdefault(char_type, {"campaigns": 0, "shards": [0] * battles, "gold": [0] * battles})
+    curve["campaigns"] += 1
+    
+    for battle_index in range(battles):
+        _simulate_purchases(player, store_items, owned)
+        player.health = player.max_health  # Rest & Heal before every fight
+        
+        loc_key, location = _pick_simulated_location(player, locations, attempts)
+        attempts[loc_key] = attempts.get(loc_key, 0) + 1
+        battle = BattleState(player, create_encounter(player, location), location)
+        while not battle.is_over and battle.turn < SIM_MAX_TURNS:
+            battle.step(_choose_simulated_action(player))
         
-        # Resources display
-        resources_text = text_font.render(
-            f"💎 Shards: {player.dragon_shards} | 🪙 Gold: {player.gold} | 🏆 Victories: {player.victories}", 
-            True, WHITE
-        )
-        screen.blit(resources_text, resources_text.get_rect(center=(SCREEN_WIDTH // 2, 780)))
+        row = results["battles"].setdefault((char_type, loc_key), [0, 0, 0])
+        row[0] += 1
+        if battle.outcome == BattleOutcome.VICTORY:
+            row[1] += 1
+            row[2] += battle.turn
+        
+        curve["shards"][battle_index] += player.dragon_shards
+        curve["gold"][battle_index] += player.gold
+
+def _init_simulation_worker():
+    """Pool initializer: undo the SIGTERM handler pygame.init() installed on import
+    
+    Otherwise a worker can swallow the pool's terminate() and block the join forever.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def _simulate_chunk(task: Tuple[int, List[str], int]) -> Dict:
+    """Worker entry point: run a batch of campaigns with its own seeded RNG"""
+    seed, char_types, battles = task
+    random.seed(seed)
+    results = {"battles": {}, "curves": {}}
+    for char_type in char_types:
+        simulate_campaign(char_type, battles, results)
+    return results
+
+def _merge_results(total: Dict, part: Dict):
+    for key, (count, wins, turns) in part["battles"].items():
+        row = total["battles"].setdefault(key, [0, 0, 0])
+        row[0] += count
+        row[1] += wins
+        row[2] += turns
+    for char_type, curve in part["curves"].items():
+        merged = total["curves"].setdefault(char_type, {"campaigns": 0, "shards": [0] * len(curve["shards"]),
+                                                        "gold": [0] * len(curve["gold"])})
+        merged["campaigns"] += curve["campaigns"]
+        merged["shards"] = [a + b for a, b in zip(merged["shards"], curve["shards"])]
+        merged["gold"] = [a + b for a, b in zip(merged["gold"], curve["gold"])]
+
+def run_balance_simulation(campaigns: int, battles: int = 30, workers: Optional[int] = None,
+                           seed: int = 0, char_types: Optional[List[str]] = None,
+                           chunk_size: int = 50) -> Dict:
+    """Play many campaigns across worker processes and aggregate the results"""
+    char_types = char_types or [char_type.value for char_type in CHARACTER_PRESETS]
+    workers = workers or os.cpu_count() or 1
+    
+    # Campaigns cycle through the classes; each chunk gets its own seed so runs are reproducible
+    schedule = [char_types[i % len(char_types)] for i in range(campaigns)]
+    tasks = [(seed + index, schedule[start:start + chunk_size], battles)
+             for index, start in enumerate(range(0, campaigns, chunk_size))]
+    
+    results = {"battles": {}, "curves": {}}
+    if workers == 1:
+        for task in tasks:
+            _merge_results(results, _simulate_chunk(task))
+    else:
+        # Spawn fresh interpreters: forking after pygame.init() can inherit SDL's audio thread locks
+        with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_simulation_worker) as pool:
+            for part in pool.imap_unordered(_simulate_chunk, tasks):
+                _merge_results(results, part)
+            # Let the workers exit on their own rather than through terminate() on leaving the block
+            pool.close()
+            pool.join()
+    return results
+
+def print_balance_report(results: Dict):
+    """Print win rates, turns-to-kill and resource curves per class and location"""
+    print(f"{'Class':<10} {'Location':<12} {'Battles':>9} {'Win %':>7} {'Turns/Win':>10}")
+    for (char_type, loc_key), (count, wins, turns) in sorted(results["battles"].items()):
+        win_rate = 100 * wins / count if count else 0
+        turns_per_win = turns / wins if wins else 0
+        print(f"{char_type:<10} {loc_key:<12} {count:>9} {win_rate:>6.1f}% {turns_per_win:>10.2f}")
+    
+    print()
+    print("Average shards / gold after battle N:")
+    for char_type, curve in sorted(results["curves"].items()):
+        n = curve["campaigns"]
+        checkpoints = sorted({0, len(curve["shards"]) // 4, len(curve["shards"]) // 2, len(curve["shards"]) - 1})
+        points = ", ".join(f"#{i + 1}: {curve['shards'][i] / n:.0f}/{curve['gold'][i] / n:.0f}" for i in checkpoints)
+        print(f"  {char_type:<10} {points}")
+
+def _results_to_json(results: Dict) -> Dict:
+    """Convert tuple-keyed results into plain JSON-friendly structures"""
+    return {
+        "battles": [
+            {"class": char_type, "location": loc_key, "battles": count, "wins": wins,
+             "win_rate": wins / count if count else 0, "turns_per_win": turns / wins if wins else 0}
+            for (char_type, loc_key), (count, wins, turns) in sorted(results["battles"].items())
+        ],
+        "curves": {
+            char_type: {
+                "shards": [total / curve["campaigns"] for total in curve["shards"]],
+                "gold": [total / curve["campaigns"] for total in curve["gold"]],
+            }
+            for char_type, curve in results["curves"].items()
+        },
+    }
+
+# ==================== VECTORIZED DUELS ====================
+def sample_duel_inputs(char_type: str, location: Optional[Location], count: int, victories: int = 0) -> Dict[str, List]:
+    """Build duel columns from CHARACTER_PRESETS and count create_enemy() rolls (waves are not modelled)"""
+    player = Character(f"Hero {char_type}", char_type, 200, 400)
+    player.victories = victories
+    columns = {key: [] for key in ("player_attack", "player_defense", "player_health",
+                                   "enemy_attack", "enemy_defense", "enemy_health")}
+    for _ in range(count):
+        enemy = create_enemy(player, location)
+        columns["player_attack"].append(player.attack)
+        columns["player_defense"].append(player.defense)
+        columns["player_health"].append(player.max_health)
+        columns["enemy_attack"].append(enemy.attack)
+        columns["enemy_defense"].append(enemy.defense)
+        columns["enemy_health"].append(enemy.health)
+    return columns
+
+def resolve_duels_vectorized(player_attack, player_defense, player_health,
+                             enemy_attack, enemy_defense, enemy_health,
+                             special: bool = False, max_turns: int = SIM_MAX_TURNS,
+                             seed: Optional[int] = None) -> Dict:
+    """Resolve many independent 1v1 duels at once with NumPy
+    
+    Each turn the player hits (attack_enemy, or special_attack when special is set)
+    and the surviving enemies hit back with attack_enemy, using the same
+    randint(int(atk * lo), int(atk * hi)) - defense and max(1, ...) rules.
+    Location procs, enemy abilities and healing are not modelled.
+    """
+    if np is None:
+        raise RuntimeError("NumPy is required for vectorized duels - install it with 'pip install numpy'")
+    
+    rng = np.random.default_rng(seed)
+    p_def = np.asarray(player_defense, dtype=np.int64)
+    e_def = np.asarray(enemy_defense, dtype=np.int64)
+    p_hp = np.array(player_health, dtype=np.float64)
+    e_hp = np.array(enemy_health, dtype=np.float64)
+    
+    p_atk = np.asarray(player_attack, dtype=np.float64)
+    e_atk = np.asarray(enemy_attack, dtype=np.float64)
+    low_mult, high_mult = (1.2, 1.5) if special else (0.8, 1.2)
+    p_low = (p_atk * low_mult).astype(np.int64)
+    p_high = (p_atk * high_mult).astype(np.int64) + 1  # integers() excludes the upper bound
+    e_low = (e_atk * 0.8).astype(np.int64)
+    e_high = (e_atk * 1.2).astype(np.int64) + 1
+    
+    count = len(p_hp)
+    turns = np.full(count, max_turns, dtype=np.int64)
+    player_won = np.zeros(count, dtype=bool)
+    active = np.arange(count)
+    
+    for turn in range(1, max_turns + 1):
+        if active.size == 0:
+            break
+        
+        # Player strikes every still-running duel
+        damage = rng.integers(p_low[active], p_high[active])
+        e_hp[active] -= np.maximum(1, damage - e_def[active])
+        won = e_hp[active] <= 0
+        player_won[active[won]] = True
+        turns[active[won]] = turn
+        active = active[~won]
+        
+        # Surviving enemies strike back
+        damage = rng.integers(e_low[active], e_high[active])
+        p_hp[active] -= np.maximum(1, damage - p_def[active])
+        lost = p_hp[active] <= 0
+        turns[active[lost]] = turn
+        active = active[~lost]
+    
+    return {"player_won": player_won, "turns": turns, "player_hp": p_hp, "enemy_hp": e_hp}
+
+def resolve_duels_scalar(columns: Dict[str, List], special: bool = False,
+                         max_turns: int = SIM_MAX_TURNS) -> Dict[str, List]:
+    """Reference implementation of the same duels through Character combat methods"""
+    result = {"player_won": [], "turns": [], "player_hp": []}
+    for i in range(len(columns["player_attack"])):
+        player = Character("Player", "Enemy", 0, 0)
+        player.attack, player.defense = columns["player_attack"][i], columns["player_defense"][i]
+        player.health = columns["player_health"][i]
+        enemy = Character("Enemy", "Enemy", 0, 0)
+        enemy.attack, enemy.defense = columns["enemy_attack"][i], columns["enemy_defense"][i]
+        enemy.health = columns["enemy_health"][i]
+        
+        turn = 0
+        while player.health > 0 and enemy.health > 0 and turn < max_turns:
+            turn += 1
+            if special:
+                player.special_attack(enemy)
+            else:
+                player.attack_enemy(enemy)
+            if enemy.health > 0:
+                enemy.attack_enemy(player)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        result["player_won"].append(enemy.health <= 0)
+        result["turns"].append(turn)
+        result["player_hp"].append(player.health)
+    return result
+
+def summarize_duels(result: Dict) -> Dict[str, float]:
+    """Win rate plus turns-to-win and HP-remaining distributions"""
+    won = np.asarray(result["player_won"], dtype=bool)
+    turns = np.asarray(result["turns"], dtype=np.int64)
+    player_hp = np.asarray(result["player_hp"], dtype=np.float64)
+    summary = {"duels": int(won.size), "win_rate": float(won.mean()) if won.size else 0.0}
+    if won.any():
+        win_turns = turns[won]
+        win_hp = player_hp[won]
+        summary.update({
+            "turns_mean": float(win_turns.mean()),
+            "turns_std": float(win_turns.std()),
+            "turns_p10": float(np.percentile(win_turns, 10)),
+            "turns_p50": float(np.percentile(win_turns, 50)),
+            "turns_p90": float(np.percentile(win_turns, 90)),
+            "hp_left_mean": float(win_hp.mean()),
+            "hp_left_p10": float(np.percentile(win_hp, 10)),
+            "hp_left_p50": float(np.percentile(win_hp, 50)),
+            "hp_left_p90": float(np.percentile(win_hp, 90)),
+        })
+    return summary
+
+def duels_match(vector: Dict[str, float], scalar: Dict[str, float], sigmas: float = 4.0) -> bool:
+    """Check two duel summaries agree within a few standard errors"""
+    n_vec, n_sca = vector["duels"], scalar["duels"]
+    p = (vector["win_rate"] * n_vec + scalar["win_rate"] * n_sca) / (n_vec + n_sca)
+    win_se = math.sqrt(max(p * (1 - p), 1e-12) * (1 / n_vec + 1 / n_sca))
+    if abs(vector["win_rate"] - scalar["win_rate"]) > sigmas * win_se + 1e-9:
+        return False
+    if "turns_mean" in vector and "turns_mean" in scalar:
+        wins_vec = max(1, vector["win_rate"] * n_vec)
+        wins_sca = max(1, scalar["win_rate"] * n_sca)
+        turns_se = math.sqrt(vector["turns_std"] ** 2 / wins_vec + scalar["turns_std"] ** 2 / wins_sca)
+        if abs(vector["turns_mean"] - scalar["turns_mean"]) > sigmas * turns_se + 1e-9:
+            return False
+    return True
+
+def print_duel_summary(label: str, summary: Dict[str, float]):
+    print(f"{label}: {summary['duels']} duels, win rate {100 * summary['win_rate']:.1f}%")
+    if "turns_mean" in summary:
+        print(f"  turns to win  mean {summary['turns_mean']:.2f}  p10/p50/p90 "
+              f"{summary['turns_p10']:.0f}/{summary['turns_p50']:.0f}/{summary['turns_p90']:.0f}")
+        print(f"  HP remaining  mean {summary['hp_left_mean']:.1f}  p10/p50/p90 "
+              f"{summary['hp_left_p10']:.0f}/{summary['hp_left_p50']:.0f}/{summary['hp_left_p90']:.0f}")
+
+# ==================== SCREEN BENCHMARKS ====================
+BENCHMARK_BASELINE_FILE = "benchmark_baseline.json"
+BENCHMARK_WARMUP_FRAMES = 30
+
+class _BenchmarkDone(Exception):
+    """Raised from the benchmark clock to leave a screen loop after its last frame"""
+
+class BenchmarkClock:
+    """Stand-in for the global clock: never sleeps, counts frames and feeds scripted input
+    
+    Every screen loop ends with clock.tick(FPS), so this is the one hook that
+    sees each frame. script(frame) returns the events to post for the next frame.
+    Each frame reports exactly one simulation step, so gameplay advances the same
+    way on every machine however fast the frames are drawn.
+    """
+    
+    def __init__(self, frames: int, script=None, track_allocations: bool = False):
+        self.frames = frames
+        self.script = script
+        self.track_allocations = track_allocations
+        self.count = 0
+        self.start = 0.0
+        self.elapsed = 0.0
+        self.alloc_bytes = 0
+        self.frame_current = 0
+        self.start_blocks = 0
+        self.net_blocks = 0
+    
+    def tick(self, framerate: int = 0) -> float:
+        self.count += 1
+        if self.track_allocations:
+            # Bytes allocated on top of the frame's starting heap, at its peak
+            current, peak = tracemalloc.get_traced_memory()
+            if self.count > BENCHMARK_WARMUP_FRAMES:
+                self.alloc_bytes += max(0, peak - self.frame_current)
+            tracemalloc.reset_peak()
+            self.frame_current = current
+        if self.count == BENCHMARK_WARMUP_FRAMES:
+            self.start = time.perf_counter()
+            self.start_blocks = sys.getallocatedblocks()
+        elif self.count == BENCHMARK_WARMUP_FRAMES + self.frames:
+            self.elapsed = time.perf_counter() - self.start
+            self.net_blocks = sys.getallocatedblocks() - self.start_blocks
+            raise _BenchmarkDone()
+        if self.script:
+            for event in self.script(self.count):
+                pygame.event.post(event)
+        return 1000 / SIMULATION_HZ
+    
+    def get_rawtime(self) -> float:
+        return 0.0  # Quality is pinned while benchmarking
+
+def _benchmark_mouse_sweep(frame: int) -> List[pygame.event.Event]:
+    """Move the mouse across the screen so button hover states keep changing"""
+    pos = ((frame * 37) % SCREEN_WIDTH, (frame * 23) % SCREEN_HEIGHT)
+    return [pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0))]
+
+def _benchmark_battle_script(frame: int) -> List[pygame.event.Event]:
+    """Hover plus a Heal click every 40 frames, so effects and damage numbers are exercised"""
+    events = _benchmark_mouse_sweep(frame)
+    if frame % 40 == 0:
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(540, 630), button=1))
+    return events
+
+def _benchmark_player() -> Character:
+    """Tough player so scripted battles never end in the middle of a run"""
+    player = Character("Bench Knight", CharacterType.KNIGHT.value, 200, 400)
+    player.max_health = player.health = 100000
+    player.dragon_shards = player.gold = 1000
+    return player
+
+def get_benchmark_screens() -> Dict[str, Tuple]:
+    """Screen name -> (callable taking a fresh player, input script)"""
+    location = get_world_locations()["arena"]
+    return {
+        "character_selection": (lambda player: character_selection_screen(), _benchmark_mouse_sweep),
+        "world_map": (world_map_screen, _benchmark_mouse_sweep),
+        "battle": (lambda player: battle_screen(player, location), _benchmark_battle_script),
+        "wave_battle": (lambda player: battle_screen(player, get_world_locations()["bot_attack"]), _benchmark_battle_script),
+        "store": (store_screen, _benchmark_mouse_sweep),
+        "stats": (show_stats_screen, _benchmark_mouse_sweep),
+        "victory": (lambda player: show_victory_screen(player, create_enemy(player, location).name, location, (40, 20)),
+                    _benchmark_mouse_sweep),
+        "defeat": (show_defeat_screen, _benchmark_mouse_sweep),
+        "main_menu": (main_menu, _benchmark_mouse_sweep),
+    }
+
+def _run_screen(screen_func, script, frames: int, track_allocations: bool) -> BenchmarkClock:
+    """Run one screen until the benchmark clock stops it"""
+    global clock
+    bench_clock = BenchmarkClock(frames, script, track_allocations)
+    saved_clock, clock = clock, bench_clock
+    random.seed(0)
+    pygame.event.clear()
+    dirty_rects.invalidate()
+    try:
+        screen_func(_benchmark_player())
+    except _BenchmarkDone:
+        pass
+    finally:
+        clock = saved_clock
+    if bench_clock.count < BENCHMARK_WARMUP_FRAMES + frames:
+        raise RuntimeError(f"screen returned after {bench_clock.count} frames")
+    return bench_clock
+
+def run_screen_benchmarks(frames: int = 300, screens: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Run each screen loop uncapped for a fixed number of frames
+    
+    Timing and allocation tracking use separate passes, because tracemalloc
+    slows every allocation down.
+    """
+    results = {}
+    for name, (screen_func, script) in get_benchmark_screens().items():
+        if screens and name not in screens:
+            continue
+        timed = _run_screen(screen_func, script, frames, False)
+        tracemalloc.start()
+        try:
+            traced = _run_screen(screen_func, script, frames, True)
+        finally:
+            tracemalloc.stop()
+        results[name] = {
+            "fps": frames / timed.elapsed,
+            "ms_per_frame": timed.elapsed * 1000 / frames,
+            "alloc_kb_per_frame": traced.alloc_bytes / 1024 / frames,
+            "net_blocks_per_frame": timed.net_blocks / frames,
+        }
+    return results
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        tolerance: float) -> List[str]:
+    """Names of screens whose frame time grew by more than tolerance (a fraction)"""
+    return [name for name, row in results.items()
+            if name in baseline and row["ms_per_frame"] > baseline[name]["ms_per_frame"] * (1 + tolerance)]
+
+def print_benchmark_report(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    """Per-screen FPS, frame time and allocations, with the change against a baseline"""
+    print(f"\n{'Screen':<20}{'FPS':>9}{'ms/frame':>10}{'alloc KB':>10}{'blocks':>8}{'vs base':>9}")
+    for name, row in results.items():
+        change = ""
+        if baseline and name in baseline:
+            change = f"{(row['ms_per_frame'] / baseline[name]['ms_per_frame'] - 1) * 100:+.0f}%"
+        print(f"{name:<20}{row['fps']:>9.0f}{row['ms_per_frame']:>10.2f}"
+              f"{row['alloc_kb_per_frame']:>10.1f}{row['net_blocks_per_frame']:>8.1f}{change:>9}")
+
+def run_benchmark_command(args: argparse.Namespace):
+    """--benchmark: time every screen loop and check it against the saved baseline"""
+    assets.load_startup_assets()
+    dirty_rects.enabled = args.dirty_rects
+    # Measure at a fixed level so runs stay comparable
+    quality.set_override("high" if args.quality == "auto" else args.quality)
+    results = run_screen_benchmarks(args.benchmark, args.screens)
+    
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["screens"]
+    print_benchmark_report(results, baseline)
+    
+    if args.save_baseline or baseline is None:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"frames": args.benchmark, "dirty_rects": args.dirty_rects, "screens": results}, f, indent=2)
+        print(f"\n✅ Saved baseline to {args.baseline}")
+        return
+    
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n⚠️  Slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\n✅ All screens within {args.tolerance:.0%} of {args.baseline}")
 
 # ==================== MAIN GAME LOOP ====================
+def _window_size(text: str) -> Tuple[int, int]:
+    """argparse type for WIDTHxHEIGHT"""
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got '{text}'")
+    if width < 320 or height < 200:
+        raise argparse.ArgumentTypeError("window must be at least 320x200")
+    return width, height
+
+def _positive_int(text: str) -> int:
+    """argparse type for counts that must be at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a whole number, got '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Battle of the Druids")
+    display = parser.add_argument_group("display")
+    display.add_argument("--build-atlas", action="store_true",
+                         help=f"pack the character sprites into {ATLAS_IMAGE_FILE} and exit")
+    display.add_argument("--profile-trace", metavar="PATH",
+                         help="record per-frame timings from startup and write them to PATH (.csv or .json) on exit, "
+                              "e.g. run.trace.csv (git ignores *.trace.csv and *.trace.json)")
+    display.add_argument("--dirty-rects", action="store_true",
+                         help="only push changed screen regions (much lower CPU with software rendering)")
+    display.add_argument("--window", type=_window_size, metavar="WxH",
+                         help="window size, the game is scaled to fit (default: 1400x900, shrunk to fit the desktop)")
+    display.add_argument("--fullscreen", action="store_true", help="scale the game to fill the screen")
+    display.add_argument("--render-scale", type=float, default=1.0, metavar="SCALE",
+                         help="internal resolution as a fraction of 1400x900, e.g. 0.5 on weak machines (default: 1.0)")
+    display.add_argument("--quality", choices=("auto",) + QUALITY_LEVELS, default="auto",
+                         help="pin the visual quality level instead of adapting it to frame time (default: auto)")
+    display.add_argument("--fps", type=int, default=FPS,
+                         help=f"render frame rate cap, gameplay runs at {SIMULATION_HZ} steps/s regardless (default: {FPS})")
+    sound = parser.add_argument_group("audio")
+    sound.add_argument("--audio-buffer", type=int, default=AUDIO_BUFFER, metavar="SAMPLES",
+                       help=f"mixer buffer size, smaller means less sound delay but risks crackling (default: {AUDIO_BUFFER})")
+    sound.add_argument("--audio-stats", action="store_true",
+                       help="print audio latency and dropped sound counts on exit")
+    
+    sim = parser.add_argument_group("balance simulator")
+    sim.add_argument("--simulate", type=_positive_int, metavar="CAMPAIGNS",
+                     help="play CAMPAIGNS headless campaigns and print balance statistics")
+    sim.add_argument("--battles", type=_positive_int, default=30, help="battles per simulated campaign (default: 30)")
+    sim.add_argument("--workers", type=_positive_int, default=None, help="worker processes (default: all cores)")
+    sim.add_argument("--seed", type=int, default=0, help="base RNG seed for the simulator (default: 0)")
+    sim.add_argument("--classes", nargs="+", choices=[char_type.value for char_type in CHARACTER_PRESETS],
+                     help="only simulate these character classes")
+    sim.add_argument("--json", metavar="PATH", help="also write simulator results as JSON")
+    
+    replays = parser.add_argument_group("battle replays")
+    replays.add_argument("--replay", metavar="PATH", help="watch a recorded battle (from the replays folder)")
+    replays.add_argument("--verify-replay", nargs="+", metavar="PATH",
+                         help="re-run replay files or folders headless and report any whose outcome changed")
+    
+    saves = parser.add_argument_group("save games")
+    saves.add_argument("--export-save", type=int, metavar="SLOT", choices=range(1, SAVE_SLOTS + 1),
+                       help="print a save slot as JSON and exit")
+    
+    bench = parser.add_argument_group("screen benchmarks")
+    bench.add_argument("--benchmark", type=_positive_int, metavar="FRAMES", nargs="?", const=300,
+                       help="run every screen loop headless and uncapped for FRAMES frames (default: 300)")
+    bench.add_argument("--screens", nargs="+", choices=list(get_benchmark_screens()),
+                       help="only benchmark these screens")
+    bench.add_argument("--baseline", default=BENCHMARK_BASELINE_FILE,
+                       help=f"baseline file to compare against (default: {BENCHMARK_BASELINE_FILE})")
+    bench.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    bench.add_argument("--tolerance", type=float, default=0.15,
+                       help="allowed frame-time slowdown before a screen counts as a regression (default: 0.15)")
+    
+    duel = parser.add_argument_group("vectorized duels (requires NumPy)")
+    duel.add_argument("--duels", type=_positive_int, metavar="COUNT", help="resolve COUNT independent duels in one vectorized call")
+    duel.add_argument("--duel-class", default=CharacterType.KNIGHT.value,
+                      choices=[char_type.value for char_type in CHARACTER_PRESETS], help="player class (default: Knight)")
+    duel.add_argument("--duel-location", default="arena", help="location key from the world map (default: arena)")
+    duel.add_argument("--duel-victories", type=int, default=0, help="player victories used for enemy scaling")
+    duel.add_argument("--special", action="store_true", help="player uses special_attack every turn")
+    duel.add_argument("--check", type=_positive_int, metavar="COUNT", nargs="?", const=20000,
+                      help="also run COUNT duels through Character methods and compare statistically")
+    return parser.parse_args(argv)
+
+def run_duel_command(args: argparse.Namespace):
+    """--duels: vectorized duel sweep, optionally cross-checked against the scalar path"""
+    if np is None:
+        print("⚠️  NumPy is not installed. Install it with 'pip install numpy' to use --duels.")
+        sys.exit(1)
+    
+    random.seed(args.seed)
+    location = get_world_locations().get(args.duel_location)
+    columns = sample_duel_inputs(args.duel_class, location, args.duels, args.duel_victories)
+    
+    start = time.perf_counter()
+    result = resolve_duels_vectorized(special=args.special, seed=args.seed, **columns)
+    elapsed = time.perf_counter() - start
+    vector_summary = summarize_duels(result)
+    print_duel_summary("Vectorized", vector_summary)
+    print(f"✅ Resolved {args.duels} duels in {elapsed:.2f}s")
+    
+    if args.check is not None:
+        sample = {key: values[:args.check] for key, values in columns.items()}
+        scalar_summary = summarize_duels(resolve_duels_scalar(sample, args.special))
+        print_duel_summary("Scalar", scalar_summary)
+        if duels_match(vector_summary, scalar_summary):
+            print("✅ Vectorized resolver matches the scalar combat rules")
+        else:
+            print("⚠️  Vectorized resolver disagrees with the scalar combat rules!")
+            sys.exit(1)
+
 def main():
     """Main game entry point"""
-    player = character_selection_screen()
+    global FPS, screen
+    args = parse_args()
+    
+    if args.simulate is not None:
+        start = time.perf_counter()
+        results = run_balance_simulation(args.simulate, args.battles, args.workers, args.seed, args.classes)
+        elapsed = time.perf_counter() - start
+        print_balance_report(results)
+        total = sum(row[0] for row in results["battles"].values())
+        print(f"\n✅ Simulated {total} battles in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} battles/s)")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(_results_to_json(results), f, indent=2)
+        return
+    
+    if args.duels is not None:
+        run_duel_command(args)
+        return
+    
+    if args.benchmark is not None:
+        run_benchmark_command(args)
+        return
+    
+    if args.verify_replay:
+        run_verify_replays_command(args)
+        return
+    
+    if args.export_save:
+        try:
+            player, saved_at = read_save(save_path(args.export_save))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read save slot {args.export_save}: {e}")
+            sys.exit(1)
+        print(json.dumps(dict(player_to_dict(player), saved_at=saved_at), indent=2, ensure_ascii=False))
+        return
+    
+    if args.build_atlas:
+        count = build_character_atlas()
+        print(f"✅ Packed {count} character sprites into {ATLAS_IMAGE_FILE} ({ATLAS_INDEX_FILE})")
+        return
+    
+    # Read the replay before opening the window so a bad path fails cleanly
+    replay = None
+    if args.replay:
+        try:
+            replay = read_replay(args.replay)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read replay {args.replay}: {e}")
+            sys.exit(1)
+    
+    if args.window or args.fullscreen or args.render_scale != 1.0:
+        screen = game_display.open(args.window, args.fullscreen, args.render_scale)
+    dirty_rects.enabled = args.dirty_rects
+    FPS = max(1, args.fps)
+    quality.set_override(args.quality)
+    atexit.register(profiler.stop_recording)
+    if args.profile_trace:
+        profiler.start_recording(args.profile_trace)
+    atexit.register(autosaver.flush)
+    if args.audio_buffer != AUDIO_BUFFER:
+        audio.open(args.audio_buffer)
+    if args.audio_stats:
+        atexit.register(lambda: print(audio.report()))
+    loading_screen()
+    if replay is not None:
+        player, location = replay.restore()
+        battle_screen(player, location, replay)
+        return
+    player = load_game_screen()
+    if player is None:
+        autosaver.slot = first_free_slot()
+        player = character_selection_screen()
+        autosaver.save(player)
     main_menu(player)
 
 if __name__ == "__main__":